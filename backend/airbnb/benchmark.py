@@ -0,0 +1,341 @@
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+import logging
+
+from driver_pool import _proc_rss_bytes, create_driver, quit_driver, driver_rss_bytes
+from filter_listings import filter_snapshot
+from replay_server import ReplayServer
+from scraper import scrape_airbnb_with_got_it
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; fall back to /proc on Linux
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json")
+DEFAULT_THRESHOLD = 0.15
+
+# Direction of each reported metric; a regression is a move the wrong way by more
+# than the threshold (relative) and more than the noise floor (absolute)
+LOWER_IS_BETTER = {
+    "launch_seconds": 0.05,
+    "scrape_seconds": 0.05,
+    "wait_seconds": 0.05,
+    "webdriver_seconds": 0.05,
+    "save_seconds": 0.01,
+    "filter_seconds": 0.01,
+    "webdriver_calls": 2,
+    "peak_browser_rss_mb": 20,
+    "peak_python_rss_mb": 5
+}
+HIGHER_IS_BETTER = {
+    "listings_per_sec": 1,
+    "filter_listings_per_sec": 100
+}
+
+def instrument_driver(driver):
+    """
+    Count and time every WebDriver command the driver sends.
+
+    Element methods (click, text, get_attribute, ...) go through the parent
+    driver's execute(), so wrapping it on the instance catches every round-trip.
+
+    Returns:
+        tuple: (calls, seconds) Counters keyed by WebDriver command name
+    """
+    calls = Counter()
+    seconds = Counter()
+    execute = driver.execute
+
+    def counted_execute(driver_command, params=None):
+        start = time.perf_counter()
+        try:
+            return execute(driver_command, params)
+        finally:
+            calls[driver_command] += 1
+            seconds[driver_command] += time.perf_counter() - start
+
+    driver.execute = counted_execute
+    return calls, seconds
+
+class _SingleDriver:
+    """Minimal pool stand-in that hands scrape_airbnb_with_got_it an already launched driver."""
+
+    # The driver is never contended, so there is nothing to wait for
+    checkout_timeout = 0
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    @contextmanager
+    def driver(self, timeout=None):
+        yield self._driver
+
+class _NoDriver:
+    """Pool stand-in for the "http" mode: a fallback to Selenium fails the run instead of launching Chrome."""
+
+    checkout_timeout = 0
+
+    def driver(self, timeout=None):
+        raise RuntimeError("The HTTP fast path fell back to Selenium")
+
+class _RssSampler:
+    """
+    Background thread recording peak resident memory during one run.
+
+    Samples the current RSS of the browser process tree (when there is a driver)
+    and of this Python process, so every run reports its own peak rather than
+    the process lifetime's.
+    """
+
+    def __init__(self, driver=None, interval=0.05):
+        self.driver = driver
+        self.interval = interval
+        self.peak = 0
+        self.python_peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        if self.driver is not None:
+            rss = driver_rss_bytes(self.driver)
+            if rss:
+                self.peak = max(self.peak, rss)
+        self.python_peak = max(self.python_peak, _python_rss_bytes())
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+def _python_rss_bytes():
+    """Current resident memory of this process, or 0 if it cannot be measured."""
+    if psutil is not None:
+        try:
+            return psutil.Process().memory_info().rss
+        except psutil.Error:
+            return 0
+    try:
+        return _proc_rss_bytes(os.getpid())
+    except OSError:
+        return 0
+
+def run_once(server, extraction_mode, workdir, min_rating=4.5, min_reviews=30):
+    """
+    Scrape the replay server once, then filter the saved snapshot.
+
+    The "http" mode uses the browserless fast path; every other mode scrapes
+    with a fresh driver and the fast path turned off.
+
+    Returns:
+        dict: Metrics for this run
+    """
+    with _RssSampler() as sampler:
+        run = _measure_run(server, extraction_mode, workdir, min_rating, min_reviews)
+    run["peak_python_rss_mb"] = round(sampler.python_peak / (1024 * 1024), 1)
+    return run
+
+def _measure_run(server, extraction_mode, workdir, min_rating, min_reviews):
+    if extraction_mode == "http":
+        calls, command_seconds = Counter(), Counter()
+        launch_seconds = peak_browser_rss = 0
+        browser_version = None
+        start = time.perf_counter()
+        result = scrape_airbnb_with_got_it(
+            "Replay", "2030-01-10", "2030-01-13", 2, feature=None,
+            pool=_NoDriver(), base_url=server.base_url, tracing=True
+        )
+        scrape_seconds = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        driver = create_driver()
+        launch_seconds = time.perf_counter() - start
+        calls, command_seconds = instrument_driver(driver)
+        try:
+            with _RssSampler(driver) as sampler:
+                start = time.perf_counter()
+                result = scrape_airbnb_with_got_it(
+                    "Replay", "2030-01-10", "2030-01-13", 2, feature=None,
+                    extraction_mode=extraction_mode, pool=_SingleDriver(driver),
+                    base_url=server.base_url, tracing=True, fast_path=False
+                )
+                scrape_seconds = time.perf_counter() - start
+            browser_version = driver.capabilities.get("browserVersion")
+        finally:
+            quit_driver(driver)
+        peak_browser_rss = sampler.peak
+
+    snapshot = os.path.join(workdir, f"airbnb_listings_replay_{extraction_mode}.json")
+    start = time.perf_counter()
+    with open(snapshot, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+    save_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = filter_snapshot(snapshot, min_rating, min_reviews)
+    filter_seconds = time.perf_counter() - start
+
+    metadata = result.get("metadata") or {}
+    listings = len(result.get("listings") or [])
+    return {
+        "listings": listings,
+        "filtered": summary["filtered_count"],
+        "extraction_source": (metadata.get("extraction") or {}).get("source", "dom"),
+        "launch_seconds": round(launch_seconds, 4),
+        "scrape_seconds": round(scrape_seconds, 4),
+        "wait_seconds": (metadata.get("waits") or {}).get("total_seconds", 0.0),
+        "webdriver_seconds": round(sum(command_seconds.values()), 4),
+        "save_seconds": round(save_seconds, 4),
+        "filter_seconds": round(filter_seconds, 4),
+        "webdriver_calls": sum(calls.values()),
+        "webdriver_calls_by_command": dict(calls),
+        "phases": (metadata.get("trace") or {}).get("phases", {}),
+        "peak_browser_rss_mb": round(peak_browser_rss / (1024 * 1024), 1),
+        "listings_per_sec": round(listings / scrape_seconds, 2) if scrape_seconds else 0.0,
+        "filter_listings_per_sec": round(listings / filter_seconds, 1) if filter_seconds else 0.0,
+        "browser_version": browser_version
+    }
+
+def _median_metrics(runs):
+    summary = {}
+    for name in list(LOWER_IS_BETTER) + list(HIGHER_IS_BETTER) + ["listings", "filtered"]:
+        summary[name] = round(statistics.median(run[name] for run in runs), 4)
+    summary["extraction_source"] = runs[-1]["extraction_source"]
+    summary["webdriver_calls_by_command"] = runs[-1]["webdriver_calls_by_command"]
+    summary["phases"] = runs[-1]["phases"]
+    return summary
+
+def run_benchmark(cards=90, modes=("batch", "network", "http"), repeats=3, recordings_dir=None):
+    """
+    Run the scrape + filter pipeline against a local replay server.
+
+    Args:
+        cards (int): Listing cards on the synthetic results page
+        modes (iterable): Extraction modes to benchmark (see scrape_airbnb_with_got_it),
+            plus "http" for the browserless fast path
+        repeats (int): Runs per mode; reported metrics are medians
+        recordings_dir (str, optional): Recorded search responses to serve instead of
+            synthetic ones (cards is then ignored)
+
+    Returns:
+        dict: config, environment, per-mode median results and the raw runs
+    """
+    runs = {mode: [] for mode in modes}
+    with ReplayServer(recordings_dir, page_size=cards, total=cards) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        for mode in modes:
+            for i in range(repeats):
+                run = run_once(server, mode, workdir)
+                logger.info(
+                    f"[{mode} {i + 1}/{repeats}] {run['listings']} listings in {run['scrape_seconds']}s, "
+                    f"{run['webdriver_calls']} WebDriver calls, peak browser RSS {run['peak_browser_rss_mb']} MB"
+                )
+                runs[mode].append(run)
+
+    browser_version = next((r["browser_version"] for mode_runs in runs.values() for r in mode_runs), None)
+    return {
+        "created": datetime.now().isoformat(),
+        "config": {"cards": cards, "modes": list(modes), "repeats": repeats, "recordings_dir": recordings_dir},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "browser_version": browser_version
+        },
+        "results": {mode: _median_metrics(mode_runs) for mode, mode_runs in runs.items()},
+        "runs": runs
+    }
+
+def compare_to_baseline(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find metrics that regressed against a saved baseline.
+
+    Returns:
+        list: One dict per regression with mode, metric, baseline, current and change
+    """
+    regressions = []
+    for mode, current in report["results"].items():
+        previous = baseline.get("results", {}).get(mode)
+        if not previous:
+            continue
+        for metric, floor in list(LOWER_IS_BETTER.items()) + list(HIGHER_IS_BETTER.items()):
+            if metric not in previous or not previous[metric]:
+                continue
+            before, after = previous[metric], current[metric]
+            change = (after - before) / before
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            if worse and abs(after - before) > floor:
+                regressions.append({
+                    "mode": mode,
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                    "change": round(change, 3)
+                })
+    return regressions
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Benchmark the scraper pipeline against a local replay server.")
+    parser.add_argument("--cards", type=int, default=90)
+    parser.add_argument("--modes", nargs="+", default=["batch", "network", "http"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--recordings", default=None, help="Directory of recorded search responses to serve")
+    parser.add_argument("--output", default=None, help="Write the full report to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change that counts as a regression (default 0.15)")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.cards, args.modes, args.repeats, args.recordings)
+    for mode, metrics in report["results"].items():
+        print(f"\n{mode} ({metrics['extraction_source']}):")
+        for name in list(LOWER_IS_BETTER) + list(HIGHER_IS_BETTER) + ["listings"]:
+            print(f"  {name:<26}{metrics[name]}")
+    if args.output:
+        save_report(report, args.output)
+
+    if args.save_baseline:
+        save_report(report, args.baseline)
+        print(f"\nBaseline saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        sys.exit(0)
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(report, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%}:")
+        for r in regressions:
+            print(f"  {r['mode']}.{r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.1%})")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
@@ -0,0 +1,281 @@
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.util import Finalize
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+from datetime import datetime
+import base64
+import json
+import os
+import time
+import logging
+
+from driver_pool import create_driver, quit_driver, driver_is_alive, standalone_driver
+from scraper import (
+    DEFAULT_FEATURE, LISTING_CARD_SELECTOR, extract_listings_batch, extract_listings_network,
+    load_filtered_search, scroll_page
+)
+from waits import WaitEngine
+from resource_blocking import ResourceBlocker
+from listing_batch import ListingBatch, room_id_from_url
+from prices import nights_between
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PAGES = 15
+DEFAULT_PAGE_SIZE = 18  # Airbnb renders 18 results per search page
+
+# Collects the links and numeric labels of the pagination bar
+PAGINATION_JS = """
+const nav = document.querySelector('nav[aria-label*="pagination" i]') ||
+            document.querySelector('[data-testid="pagination"]');
+if (!nav) return [];
+return Array.from(nav.querySelectorAll('a[href]')).map(a => [a.href, (a.innerText || '').trim()]);
+"""
+
+def _decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.b64decode(padded).decode("utf-8"))
+
+def _encode_cursor(payload):
+    return base64.b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+def _with_params(url, **params):
+    parts = urlparse(url)
+    query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    query.update({k: v for k, v in params.items() if v is not None})
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+def discover_page_urls(driver, max_pages=DEFAULT_MAX_PAGES, page_cursors=None):
+    """
+    Work out the URL of every results page from the pagination bar of page 1.
+
+    The bar only links a handful of pages ("1 2 3 ... 15"), so the offset scheme
+    is read from those links and extended to the last page number. Airbnb uses
+    either a base64 JSON `cursor` parameter or a plain `items_offset` parameter.
+    When the search API response was captured, its page cursors are used as is.
+
+    Args:
+        driver: Selenium WebDriver instance on results page 1
+        max_pages (int): Maximum number of result pages
+        page_cursors (list, optional): paginationInfo.pageCursors from the search API
+
+    Returns:
+        list: URLs for pages 2..N (page 1 is the driver's current page)
+    """
+    if page_cursors:
+        return [_with_params(driver.current_url, cursor=cursor) for cursor in page_cursors[1:max_pages]]
+
+    links = driver.execute_script(PAGINATION_JS) or []
+    page_numbers = [int(label) for _, label in links if label.isdigit()]
+    last_page = min(max(page_numbers, default=1), max_pages)
+    if last_page < 2:
+        return []
+
+    current_url = driver.current_url
+    offsets = []
+    template = None
+    for href, _ in links:
+        params = parse_qs(urlparse(href).query)
+        if "cursor" in params:
+            try:
+                payload = _decode_cursor(params["cursor"][0])
+            except (ValueError, UnicodeDecodeError):
+                continue
+            template = ("cursor", payload)
+            offsets.append(int(payload.get("items_offset", 0)))
+        elif "items_offset" in params:
+            template = ("items_offset", None)
+            offsets.append(int(params["items_offset"][0]))
+
+    positive = sorted(o for o in set(offsets) if o > 0)
+    page_size = positive[0] if positive else DEFAULT_PAGE_SIZE
+
+    urls = []
+    for page in range(2, last_page + 1):
+        offset = (page - 1) * page_size
+        if template and template[0] == "cursor":
+            payload = dict(template[1], items_offset=offset)
+            urls.append(_with_params(current_url, cursor=_encode_cursor(payload)))
+        else:
+            urls.append(_with_params(current_url, items_offset=offset))
+    return urls
+
+# One driver per worker process, created on first use and quit when the process exits
+_worker_driver = None
+
+def _get_worker_driver():
+    global _worker_driver
+    if _worker_driver is not None and not driver_is_alive(_worker_driver):
+        quit_driver(_worker_driver)
+        _worker_driver = None
+    if _worker_driver is None:
+        _worker_driver = create_driver()
+        Finalize(None, quit_driver, args=(_worker_driver,), exitpriority=10)
+    return _worker_driver
+
+def scrape_page(url, wait_timeouts=None, block_profile="default", extraction_mode="batch",
+                checkin=None, checkout=None):
+    """
+    Worker task: load one results page and extract its cards.
+
+    With extraction_mode="network" the page's search API response is decoded and
+    the DOM is only scrolled and read if none was captured. checkin and checkout
+    give the length of stay, so total prices decode to nightly ones as on page 1.
+
+    Returns:
+        dict: {"url", "listings", "seconds", "error"}
+    """
+    started = time.perf_counter()
+    try:
+        driver = _get_worker_driver()
+        waits = WaitEngine(driver, timeouts=wait_timeouts)
+        blocker = ResourceBlocker(block_profile)
+        blocker.apply(driver)
+        driver.get(url)
+        listings = []
+        if extraction_mode == "network":
+            listings, _ = extract_listings_network(
+                driver, waits, {"checkin": checkin, "checkout": checkout}, blocker
+            )
+        if not listings:
+            waits.element("listing_cards", By.CSS_SELECTOR, LISTING_CARD_SELECTOR, clickable=False)
+            scroll_page(driver, waits)
+            listings = extract_listings_batch(driver)
+        error = None
+    except TimeoutException:
+        listings, error = [], "Listing cards did not appear"
+    except Exception as e:
+        listings, error = [], str(e)
+    return {
+        "url": url,
+        "listings": listings,
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": error
+    }
+
+def merge_listings(pages):
+    """Merge page results in page order, keeping the first occurrence of each room id."""
+    seen = set()
+    merged = []
+    for listings in pages:
+        for listing in listings:
+            key = room_id_from_url(listing.get("url")) or listing.get("url")
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(listing)
+    return merged
+
+def crawl_airbnb(destination, checkin, checkout, guests, feature=DEFAULT_FEATURE, budget=None,
+                 max_pages=DEFAULT_MAX_PAGES, max_parallel=None, wait_timeouts=None,
+                 block_profile="default", extraction_mode="batch", base_url=None, compact=False):
+    """
+    Crawl every results page of a search, spreading pages across worker processes.
+
+    Page 1 is loaded (with filters applied) to discover the pagination scheme;
+    the remaining pages are scraped in parallel, each worker process with its own
+    driver, and merged with room-id dedupe.
+
+    Args:
+        destination, checkin, checkout, guests, feature, budget: Same as scrape_airbnb_with_got_it
+        max_pages (int): Maximum number of result pages to crawl
+        max_parallel (int, optional): Worker processes (defaults to the CPU count)
+        wait_timeouts (dict, optional): Per-step timeout overrides for the WaitEngine
+        block_profile (str, optional): Resource blocking profile for every page
+        extraction_mode (str, optional): "network" decodes search API responses and takes
+            page URLs from their cursors, falling back to the DOM per page; "batch" reads cards
+        base_url (str, optional): Search root, e.g. a local replay server
+        compact (bool): Hold each page as a ListingBatch as soon as it arrives and
+            return the merged ListingBatch as listings (save it with
+            listing_batch.write_snapshot); meant for crawls too large for dicts
+
+    Returns:
+        dict: Dictionary containing listings and metadata
+    """
+    max_parallel = max_parallel or os.cpu_count() or 1
+    search = {
+        "destination": destination,
+        "checkin": checkin,
+        "checkout": checkout,
+        "guests": guests,
+        "feature": feature,
+        "budget": budget,
+        "base_url": base_url
+    }
+    started = time.perf_counter()
+    nights = nights_between(checkin, checkout)
+
+    with standalone_driver() as driver:
+        waits = WaitEngine(driver, timeouts=wait_timeouts)
+        blocker = ResourceBlocker(block_profile)
+        blocker.apply(driver)
+        filter_path = load_filtered_search(driver, waits, search)
+        first_page, page_cursors = [], None
+        if extraction_mode == "network":
+            first_page, info = extract_listings_network(driver, waits, search, blocker)
+            page_cursors = (info["pagination"] or {}).get("page_cursors")
+        if not first_page:
+            try:
+                waits.element("listing_cards", By.CSS_SELECTOR, LISTING_CARD_SELECTOR, clickable=False)
+            except TimeoutException:
+                logger.warning("Listing cards did not appear. Possibly blocked or wrong URL/selectors.")
+                return {"metadata": {}, "listings": []}
+            scroll_page(driver, waits)
+            first_page = extract_listings_batch(driver)
+        page_urls = discover_page_urls(driver, max_pages, page_cursors)
+
+    logger.info(f"Crawling {len(page_urls) + 1} pages with {max_parallel} workers")
+    results = {}
+    failed_pages = []
+    if page_urls:
+        workers = min(max_parallel, len(page_urls))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(scrape_page, url, wait_timeouts, block_profile, extraction_mode,
+                                checkin, checkout): page
+                for page, url in enumerate(page_urls, start=2)
+            }
+            for future in as_completed(futures):
+                page = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # A crashed worker fails the pages still pending; pages already
+                    # scraped are kept
+                    result = {"url": page_urls[page - 2], "listings": [], "seconds": 0.0,
+                              "error": f"Worker process died: {e}"}
+                if result["error"]:
+                    logger.warning(f"Page {page} failed: {result['error']}")
+                    failed_pages.append(page)
+                else:
+                    logger.info(f"Page {page}: {len(result['listings'])} listings in {result['seconds']}s")
+                if compact:
+                    results[page] = ListingBatch.from_listings(result["listings"], destination, feature, nights)
+                else:
+                    results[page] = result["listings"]
+
+    ordered = [first_page] + [results.get(page, []) for page in range(2, len(page_urls) + 2)]
+    if compact:
+        listings = ListingBatch(destination, feature, nights)
+        for page_listings in ordered:
+            listings.extend(page_listings, unique=True)
+    else:
+        listings = merge_listings(ordered)
+
+    metadata = {
+        "destination": destination,
+        "checkin": checkin,
+        "checkout": checkout,
+        "guests": guests,
+        "feature": feature,
+        "timestamp": datetime.now().isoformat(),
+        "total_listings": len(listings),
+        "filter_path": filter_path,
+        "pages_crawled": len(page_urls) + 1,
+        "failed_pages": sorted(failed_pages),
+        "max_parallel": max_parallel,
+        "crawl_seconds": round(time.perf_counter() - started, 3)
+    }
+    return {"metadata": metadata, "listings": listings}
@@ -0,0 +1,374 @@
+import json
+import math
+import time
+import logging
+from array import array
+from datetime import date, datetime, timedelta
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
+
+from driver_pool import standalone_driver
+from http_fetch import fetch_listings_http, path_stats
+from listing_batch import Listing, ListingBatch
+from resilience import as_deadline
+from resource_blocking import ResourceBlocker
+from scraper import (
+    AIRBNB_FEATURES, LISTING_CARD_SELECTOR, _get_within_deadline, extract_listings_batch,
+    extract_listings_network, load_filtered_search, scroll_page
+)
+from search_query import BASE_URL, build_search_url
+from waits import WaitEngine
+
+logger = logging.getLogger(__name__)
+
+NAN = float("nan")
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def stay_combinations(checkin_from, checkin_to=None, min_nights=1, max_nights=None):
+    """
+    Every (checkin, checkout) pair of a flexible-date search.
+
+    Args:
+        checkin_from (str or date): First check-in date (YYYY-MM-DD)
+        checkin_to (str or date, optional): Last check-in date (defaults to checkin_from)
+        min_nights, max_nights (int): Stay lengths tried from each check-in
+
+    Returns:
+        list: (checkin, checkout) tuples of YYYY-MM-DD strings, by check-in then length
+    """
+    first = _as_date(checkin_from)
+    last = _as_date(checkin_to) if checkin_to else first
+    max_nights = max_nights if max_nights is not None else min_nights
+    if last < first:
+        raise ValueError("checkin_to is before checkin_from")
+    if min_nights < 1 or max_nights < min_nights:
+        raise ValueError("Stay lengths must satisfy 1 <= min_nights <= max_nights")
+    combinations = []
+    for offset in range((last - first).days + 1):
+        checkin = first + timedelta(days=offset)
+        for nights in range(min_nights, max_nights + 1):
+            combinations.append((checkin.isoformat(), (checkin + timedelta(days=nights)).isoformat()))
+    return combinations
+
+class PriceMatrix:
+    """
+    Nightly prices of many listings across many stay dates.
+
+    Listings are identified by room id. The first date a listing appears on
+    stores its record (title, URL, rating, ...) once in a ListingBatch; every
+    date after that only writes its nightly price. Each date is one typed
+    column with a slot per listing (NaN where it was not offered), so the
+    matrix costs 8 bytes per cell on top of one record per listing.
+    """
+
+    def __init__(self, destination=None, feature=None):
+        self.listings = ListingBatch(destination, feature)
+        self.dates = []
+        self.columns = []
+        self._rows = {}
+        self._currency = None
+
+    def __len__(self):
+        return len(self.listings)
+
+    def add(self, checkin, checkout, listings):
+        """
+        Record the listings found for one stay.
+
+        Args:
+            checkin, checkout (str): The stay (YYYY-MM-DD)
+            listings (list): Listing dicts in the scraper's output shape
+
+        Returns:
+            int: Listings not seen on any earlier date
+        """
+        nights = (_as_date(checkout) - _as_date(checkin)).days
+        prices = []
+        added = 0
+        for listing in listings:
+            record = Listing.from_dict(listing, nights=nights)
+            if record.room_id is None:
+                # Without a room id there is nothing to match it against on other dates
+                continue
+            row = self._rows.get(record.room_id)
+            if row is None:
+                row = self._rows[record.room_id] = len(self.listings)
+                self.listings.append(record)
+                added += 1
+            self._currency = self._currency or record.currency
+            prices.append((row, record.nightly))
+
+        column = array('d', [NAN]) * len(self.listings)
+        for row, nightly in prices:
+            if nightly is not None:
+                column[row] = nightly
+        self.dates.append((checkin, checkout))
+        self.columns.append(column)
+        return added
+
+    def nightly(self, room_id, checkin, checkout):
+        """Nightly price of a listing for a stay, or None."""
+        row = self._rows.get(int(room_id))
+        if row is None or (checkin, checkout) not in self.dates:
+            return None
+        return self._cell(self.dates.index((checkin, checkout)), row)
+
+    def _cell(self, column, row):
+        values = self.columns[column]
+        # Columns recorded before a listing first appeared stop short of its row
+        value = values[row] if row < len(values) else NAN
+        return None if math.isnan(value) else value
+
+    def row(self, room_id):
+        """Nightly prices of one listing, one per date (None where not offered)."""
+        row = self._rows[int(room_id)]
+        return [self._cell(column, row) for column in range(len(self.dates))]
+
+    def cheapest(self, room_id):
+        """
+        Returns:
+            dict or None: checkin, checkout, nightly and total of the listing's cheapest stay
+        """
+        best = None
+        for (checkin, checkout), nightly in zip(self.dates, self.row(room_id)):
+            if nightly is not None and (best is None or nightly < best["nightly"]):
+                nights = (_as_date(checkout) - _as_date(checkin)).days
+                best = {"checkin": checkin, "checkout": checkout, "nightly": nightly,
+                        "total": round(nightly * nights, 2)}
+        return best
+
+    def to_dict(self):
+        """
+        The matrix in a JSON-friendly shape.
+
+        Returns:
+            dict: dates ([checkin, checkout] pairs), currency, listings (records in
+                the scraper's output shape, as first seen) and nightly (one row per listing, one
+                entry per date, None where not offered)
+        """
+        return {
+            "destination": self.listings.destination,
+            "feature": self.listings.feature,
+            "currency": self._currency,
+            "dates": [list(stay) for stay in self.dates],
+            "listings": list(self.listings.to_dicts()),
+            "nightly": [
+                [self._cell(column, row) for column in range(len(self.dates))]
+                for row in range(len(self.listings))
+            ]
+        }
+
+class SearchSession:
+    """
+    One browser session reused for many searches of the same destination.
+
+    The first search sets the session up the usual way (load_filtered_search:
+    popup, category tag discovery, UI filters where needed). Later searches
+    only navigate to their URL, since the popup is gone and the feature's
+    category tag has been learned by then. If a filter could only be applied
+    through the UI, every search goes through load_filtered_search again, on
+    the same driver.
+    """
+
+    def __init__(self, pool=None, wait_timeouts=None, block_profile="default", extraction_mode="network",
+                 deadline=None):
+        """
+        Args:
+            pool (DriverPool, optional): Pool to borrow the driver from; a one-off driver otherwise
+            wait_timeouts (dict, optional): Per-step timeout overrides for the WaitEngine
+            block_profile (str, optional): Resource blocking profile, applied once
+            extraction_mode (str): "network" decodes the search API responses (falling back
+                to the DOM per page); "batch" reads the cards
+            deadline (Deadline, optional): Overall budget shared by every search
+        """
+        self.pool = pool
+        self.wait_timeouts = wait_timeouts
+        self.block_profile = block_profile
+        self.extraction_mode = extraction_mode
+        self.deadline = as_deadline(deadline)
+        self.page_loads = 0
+        self.driver = None
+        self._context = None
+        self._url_only = False
+        self._filter_path = {}
+
+    def _open(self):
+        if self.pool is not None:
+            self._context = self.pool.driver(self.deadline.clamp(self.pool.checkout_timeout))
+        else:
+            self._context = standalone_driver()
+        self.driver = self._context.__enter__()
+        self.waits = WaitEngine(self.driver, timeouts=self.wait_timeouts, deadline=self.deadline)
+        self.blocker = ResourceBlocker(self.block_profile)
+        self.blocker.apply(self.driver)
+
+    def search(self, search):
+        """
+        Load one search in the session and extract its listings.
+
+        Returns:
+            tuple: (listings, filter_path)
+        """
+        if self.driver is None:
+            self._open()
+        self.page_loads += 1
+        # The blocker keeps the whole session's network events; only this stay's are decoded,
+        # so earlier responses are neither re-read nor mistaken for this stay's prices
+        cursor = len(self.blocker.collect(self.driver))
+        if self._url_only:
+            feature = search["feature"] if search["feature"] in AIRBNB_FEATURES else None
+            url, _ = build_search_url(
+                search["destination"], search["checkin"], search["checkout"], search["guests"],
+                budget=search["budget"], feature=feature, base_url=search.get("base_url") or BASE_URL
+            )
+            _get_within_deadline(self.driver, url, self.deadline)
+            filter_path = self._filter_path
+        else:
+            filter_path = load_filtered_search(self.driver, self.waits, search)
+            # Only URL-encoded filters survive a plain navigation to the next date
+            self._url_only = "ui" not in filter_path.values()
+            self._filter_path = filter_path
+
+        if self.extraction_mode == "network":
+            listings, _ = extract_listings_network(self.driver, self.waits, search, self.blocker, cursor)
+            if listings:
+                return listings, filter_path
+        try:
+            self.waits.element("listing_cards", By.CSS_SELECTOR, LISTING_CARD_SELECTOR, clickable=False)
+        except TimeoutException:
+            if not self.deadline.expired():
+                logger.warning(f"No listing cards for {search['checkin']}..{search['checkout']}")
+                return [], filter_path
+        scroll_page(self.driver, self.waits)
+        return extract_listings_batch(self.driver), filter_path
+
+    def close(self, exc_type=None, exc=None, tb=None):
+        """Release the driver (to the pool, or quit it); an exception marks a pooled driver as failed."""
+        if self._context is not None:
+            context, self._context, self.driver = self._context, None, None
+            context.__exit__(exc_type, exc, tb)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc_type, exc, tb)
+
+def search_date_matrix(destination, checkin_from, checkin_to=None, min_nights=1, max_nights=None, guests=1,
+                       feature=None, budget=None, pool=None, wait_timeouts=None, block_profile="default",
+                       extraction_mode="network", base_url=None, fast_path=True, deadline=None):
+    """
+    Price every listing of a destination across a window of check-in dates and stay lengths.
+
+    Each stay is first read over plain HTTP (see http_fetch); stays that need a
+    browser share one SearchSession, so the browser is launched and set up at
+    most once and every further stay costs one page load. Listings are merged
+    into a PriceMatrix by room id.
+
+    Args:
+        destination (str): The destination to search for
+        checkin_from, checkin_to, min_nights, max_nights: The stays to search (see stay_combinations)
+        guests (int): Number of guests
+        feature, budget, pool, wait_timeouts, block_profile, base_url, fast_path: Same as
+            scrape_airbnb_with_got_it
+        extraction_mode (str): "network" or "batch", for stays loaded in the browser
+        deadline (float or Deadline, optional): Seconds for the whole matrix; stays not
+            reached in time are skipped and the result is marked partial
+
+    Returns:
+        dict: {"metadata", "matrix"} where matrix is PriceMatrix.to_dict()
+    """
+    started = time.perf_counter()
+    deadline = as_deadline(deadline)
+    stays = stay_combinations(checkin_from, checkin_to, min_nights, max_nights)
+    matrix = PriceMatrix(destination, feature)
+    paths = {"http": 0, "selenium": 0}
+    empty = []
+    filter_path = {}
+    fast_path_feature = feature if feature in AIRBNB_FEATURES else None
+
+    with SearchSession(pool, wait_timeouts, block_profile, extraction_mode, deadline) as session:
+        for checkin, checkout in stays:
+            if not deadline.check(f"stay {checkin}..{checkout}"):
+                continue
+            search = {
+                "destination": destination,
+                "checkin": checkin,
+                "checkout": checkout,
+                "guests": guests,
+                "feature": feature,
+                "budget": budget,
+                "base_url": base_url
+            }
+            listings = []
+            if fast_path:
+                listings, info = fetch_listings_http(dict(search, feature=fast_path_feature), deadline=deadline)
+                if listings:
+                    path_stats.record("http")
+                    paths["http"] += 1
+                    filter_path = {"feature": "url"} if fast_path_feature else {}
+                    if budget:
+                        filter_path["price"] = "url"
+                else:
+                    path_stats.record("selenium", info.get("fallback_reason"))
+            if not listings:
+                listings, filter_path = session.search(search)
+                paths["selenium"] += 1
+            if not listings:
+                empty.append([checkin, checkout])
+            added = matrix.add(checkin, checkout, listings)
+            logger.info(f"{checkin}..{checkout}: {len(listings)} listings ({added} new)")
+        page_loads = session.page_loads
+        browser_started = session.driver is not None
+
+    metadata = {
+        "destination": destination,
+        "checkin_from": stays[0][0],
+        "checkin_to": stays[-1][0],
+        "min_nights": min_nights,
+        "max_nights": max_nights if max_nights is not None else min_nights,
+        "guests": guests,
+        "feature": feature,
+        "timestamp": datetime.now().isoformat(),
+        "stays": len(stays),
+        "stays_searched": len(matrix.dates),
+        "empty_stays": empty,
+        "total_listings": len(matrix),
+        "filter_path": filter_path,
+        "fetch_paths": paths,
+        "browser_page_loads": page_loads,
+        "browser_sessions": 1 if browser_started else 0,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+    deadline.mark(metadata)
+    return {"metadata": metadata, "matrix": matrix.to_dict()}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Airbnb listing x stay date price matrix.")
+    parser.add_argument("destination")
+    parser.add_argument("checkin_from")
+    parser.add_argument("checkin_to", nargs="?", default=None)
+    parser.add_argument("--nights", type=int, nargs=2, default=(3, 3), metavar=("MIN", "MAX"))
+    parser.add_argument("--guests", type=int, default=1)
+    parser.add_argument("--feature", default=None)
+    parser.add_argument("--budget", type=int, default=None)
+    parser.add_argument("--base-url", default=None, help="Search root, e.g. a local replay server")
+    parser.add_argument("--deadline", type=float, default=None, help="Seconds for the whole matrix")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    result = search_date_matrix(args.destination, args.checkin_from, args.checkin_to, args.nights[0], args.nights[1],
+                                args.guests, args.feature, args.budget, base_url=args.base_url,
+                                deadline=args.deadline)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output = args.output or f"airbnb_dates_{args.destination.lower().replace(' ', '_')}_{timestamp}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+    metadata = result["metadata"]
+    print(f"{metadata['total_listings']} listings x {metadata['stays_searched']} stays "
+          f"({metadata['browser_page_loads']} browser page loads) saved to {output}")
@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import logging
+from datetime import datetime
+
+from listing_batch import listing_key
+from scrape_cache import search_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+# Fold the deltas into a new full snapshot after this many runs...
+DEFAULT_COMPACT_EVERY = 10
+# ...or once they hold this many records per listing in the base snapshot
+DEFAULT_COMPACT_RATIO = 0.5
+
+# price_details is derived from price_text; the thumbnail fields change with the
+# image CDN parameters and with whether the image cache rewrote them, not with the listing
+HASH_EXCLUDED_FIELDS = frozenset({"price_details", "thumbnail", "thumbnail_source", "thumbnail_variants"})
+
+STATE_FILE = "state.json"
+
+def content_hash(listing):
+    """
+    Short hash of what a scrape reports about a listing.
+
+    The url is hashed without its query string, which carries search and tracking
+    parameters that differ between runs for the same room.
+    """
+    content = {k: v for k, v in listing.items() if k not in HASH_EXCLUDED_FIELDS}
+    content["room_id"] = listing_key(listing)
+    if isinstance(content.get("url"), str):
+        content["url"] = content["url"].split("?", 1)[0].split("#", 1)[0]
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+def search_directory(destination, checkin, checkout, guests, feature=None, root=DEFAULT_SNAPSHOT_DIR, **extra):
+    """Directory holding the snapshots of one recurring search, e.g. .snapshots/lisbon_3f2a9c0d1e4b."""
+    key = search_key(destination, checkin, checkout, guests, feature, **extra)
+    slug = re.sub(r"[^a-z0-9]+", "_", destination.strip().lower()).strip("_") or "search"
+    return os.path.join(root, f"{slug}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}")
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _view_metadata(metadata):
+    """A run's metadata without its per-run change counts."""
+    return {k: v for k, v in metadata.items() if k not in ("added", "changed", "removed")}
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class DeltaStore:
+    """
+    History of one recurring search as a full snapshot plus the deltas since.
+
+    Each run is compared against a content hash per room id, and only new,
+    changed and removed listings are written, so a run costs storage in
+    proportion to churn rather than inventory. The deltas are periodically
+    compacted into a new full snapshot so reconstructing the current view
+    never replays a long chain.
+
+    Layout of `directory`:
+        state.json          sequence numbers, file names and the room id -> hash index
+        base_<seq>.json     full snapshot in the scraper's {"metadata", "listings"} shape
+        delta_<seq>.json    {"metadata", "added", "changed", "removed"} for one run
+    """
+
+    def __init__(self, directory, compact_every=DEFAULT_COMPACT_EVERY, compact_ratio=DEFAULT_COMPACT_RATIO):
+        """
+        Args:
+            directory (str): Where this search's snapshots live (see search_directory)
+            compact_every (int): Deltas kept before compacting
+            compact_ratio (float): Delta records per base listing that also trigger compaction
+        """
+        self.directory = directory
+        self.compact_every = compact_every
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        try:
+            self.state = _read_json(os.path.join(directory, STATE_FILE))
+        except (OSError, ValueError):
+            self.state = {
+                "sequence": 0,
+                "base": None,
+                "base_sequence": 0,
+                "base_listings": 0,
+                "deltas": [],
+                "delta_records": 0,
+                "hashes": {}
+            }
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _save_state(self):
+        _write_json(self._path(STATE_FILE), self.state)
+
+    def diff(self, listings, partial=False):
+        """
+        Compare a scrape against the current view without storing anything.
+
+        Args:
+            listings (iterable): The scrape's listings
+            partial (bool): The scrape was cut short, so listings it did not reach are
+                kept instead of reported as removed
+
+        Returns:
+            tuple: (added, changed, removed, hashes) where removed is a list of room
+                ids and hashes is the room id -> content hash index after this scrape
+        """
+        previous = self.state["hashes"]
+        hashes = {}
+        added = []
+        changed = []
+        for listing in listings:
+            key = listing_key(listing)
+            if key in hashes:
+                continue
+            digest = content_hash(listing)
+            hashes[key] = digest
+            if key not in previous:
+                added.append(listing)
+            elif previous[key] != digest:
+                changed.append(listing)
+        if partial:
+            for key, digest in previous.items():
+                hashes.setdefault(key, digest)
+            return added, changed, [], hashes
+        removed = [key for key in previous if key not in hashes]
+        return added, changed, removed, hashes
+
+    def apply(self, result):
+        """
+        Record a scrape result, storing only what changed since the last run.
+
+        The first run stores a full snapshot (and reports every listing as added).
+        A run with no listings is ignored, since it usually means the scrape was
+        blocked rather than that every listing disappeared. A partial run
+        (metadata["partial"], e.g. the deadline ran out) records additions and
+        changes but no removals.
+
+        Returns:
+            dict or None: The delta ({"metadata", "added", "changed", "removed"}), or
+                None if the result had no listings
+        """
+        listings = result.get("listings") or []
+        metadata = dict(result.get("metadata") or {})
+        if not listings:
+            logger.warning("Scrape returned no listings; not recording it as a delta")
+            return None
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            added, changed, removed, hashes = self.diff(listings, partial=bool(metadata.get("partial")))
+            sequence = self.state["sequence"] + 1
+            metadata.update({
+                "sequence": sequence,
+                "total_listings": len(hashes),
+                "added": len(added),
+                "changed": len(changed),
+                "removed": len(removed)
+            })
+            delta = {"metadata": metadata, "added": added, "changed": changed, "removed": removed}
+
+            self.state["sequence"] = sequence
+            self.state["hashes"] = hashes
+            if self.state["base"] is None:
+                self._write_base(sequence, metadata, listings)
+            elif added or changed or removed:
+                name = f"delta_{sequence:06d}.json"
+                _write_json(self._path(name), delta)
+                self.state["deltas"].append(name)
+                self.state["delta_records"] += len(added) + len(changed) + len(removed)
+            self.state["last_run"] = metadata.get("timestamp") or datetime.now().isoformat()
+            # A run without changes writes no delta, so the view's metadata is kept here
+            self.state["metadata"] = _view_metadata(metadata)
+
+            if self._needs_compaction():
+                self._compact()
+            self._save_state()
+
+        logger.info(
+            f"Run {sequence}: {len(added)} added, {len(changed)} changed, {len(removed)} removed "
+            f"of {len(hashes)} listings"
+        )
+        return delta
+
+    def _needs_compaction(self):
+        deltas = len(self.state["deltas"])
+        if not deltas:
+            return False
+        return (deltas >= self.compact_every
+                or self.state["delta_records"] > self.compact_ratio * max(self.state["base_listings"], 1))
+
+    def _write_base(self, sequence, metadata, listings):
+        """Caller holds the lock. Replace the base snapshot and drop the deltas it covers."""
+        name = f"base_{sequence:06d}.json"
+        _write_json(self._path(name), {"metadata": _view_metadata(metadata), "listings": listings})
+        old_files = self.state["deltas"] + ([self.state["base"]] if self.state["base"] else [])
+        self.state.update({
+            "base": name,
+            "base_sequence": sequence,
+            "base_listings": len(listings),
+            "deltas": [],
+            "delta_records": 0
+        })
+        # Point the state at the new base before the files it replaces go away
+        self._save_state()
+        for old in old_files:
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+
+    def _compact(self):
+        """Caller holds the lock."""
+        view = self._current_view()
+        self._write_base(self.state["sequence"], view["metadata"], view["listings"])
+        logger.info(f"Compacted {self.directory} into {self.state['base']} ({len(view['listings'])} listings)")
+
+    def compact(self):
+        """Fold the deltas into a new full snapshot now."""
+        with self._lock:
+            if self.state["deltas"]:
+                self._compact()
+
+    def _current_view(self):
+        if self.state["base"] is None:
+            return {"metadata": {}, "listings": []}
+        base = _read_json(self._path(self.state["base"]))
+        metadata = base["metadata"]
+        current = {listing_key(listing): listing for listing in base["listings"]}
+        for name in self.state["deltas"]:
+            delta = _read_json(self._path(name))
+            for key in delta["removed"]:
+                current.pop(key, None)
+            # Changed listings keep their position, new ones are appended
+            for listing in delta["changed"] + delta["added"]:
+                current[listing_key(listing)] = listing
+            metadata = delta["metadata"]
+        metadata = _view_metadata(self.state.get("metadata") or metadata)
+        metadata["total_listings"] = len(current)
+        return {"metadata": metadata, "listings": list(current.values())}
+
+    def current_view(self):
+        """
+        Reconstruct the latest full result from the base snapshot and the deltas.
+
+        Returns:
+            dict: {"metadata", "listings"} in the same shape as a scrape result
+        """
+        with self._lock:
+            return self._current_view()
+
+    def iter_current_view(self):
+        """
+        Yields:
+            tuple: ("metadata", dict) and then ("listing", dict) for each listing,
+                like filter_listings.iter_snapshot
+        """
+        view = self.current_view()
+        yield "metadata", view["metadata"]
+        for listing in view["listings"]:
+            yield "listing", listing
+
+    def deltas(self, since=0):
+        """
+        Deltas recorded after sequence number `since`, oldest first.
+
+        Consumers that remember the last sequence they processed only need to
+        handle these instead of re-reading the whole view.
+
+        Raises:
+            ValueError: If deltas after `since` were already compacted away; the
+                consumer has to start over from current_view()
+        """
+        with self._lock:
+            names = list(self.state["deltas"])
+            base_sequence = self.state["base_sequence"]
+        if since < base_sequence:
+            raise ValueError(f"Deltas up to run {base_sequence} were compacted; read the current view instead")
+        deltas = []
+        for name in names:
+            delta = _read_json(self._path(name))
+            if delta["metadata"]["sequence"] > since:
+                deltas.append(delta)
+        return deltas
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "sequence": self.state["sequence"],
+                "base": self.state["base"],
+                "deltas": len(self.state["deltas"]),
+                "delta_records": self.state["delta_records"],
+                "listings": len(self.state["hashes"]),
+                "last_run": self.state.get("last_run")
+            }
+
+def scrape_incremental(destination, checkin, checkout, guests, feature=None, root=DEFAULT_SNAPSHOT_DIR,
+                       compact_every=DEFAULT_COMPACT_EVERY, **scrape_kwargs):
+    """
+    Re-scrape a search and record only what changed since its last run.
+
+    Args:
+        destination, checkin, checkout, guests, feature: As for scrape_airbnb_with_got_it
+        root (str): Directory holding one subdirectory per search
+        compact_every (int): Deltas kept before compacting into a full snapshot
+        **scrape_kwargs: Passed through to scrape_airbnb_with_got_it (pool, budget, ...)
+
+    Returns:
+        dict or None: The delta for this run (see DeltaStore.apply)
+    """
+    from scraper import scrape_airbnb_with_got_it
+
+    result = scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=feature, **scrape_kwargs)
+    directory = search_directory(destination, checkin, checkout, guests, feature, root,
+                                 budget=scrape_kwargs.get("budget"))
+    return DeltaStore(directory, compact_every=compact_every).apply(result)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incremental Airbnb scrapes stored as deltas.")
+    parser.add_argument("destination")
+    parser.add_argument("checkin")
+    parser.add_argument("checkout")
+    parser.add_argument("guests", type=int)
+    parser.add_argument("--feature", default=None)
+    parser.add_argument("--budget", type=int, default=None)
+    parser.add_argument("--root", default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument("--compact-every", type=int, default=DEFAULT_COMPACT_EVERY)
+    parser.add_argument("--compact", action="store_true", help="Compact the stored deltas instead of scraping")
+    args = parser.parse_args()
+
+    directory = search_directory(args.destination, args.checkin, args.checkout, args.guests, args.feature,
+                                 args.root, budget=args.budget)
+    if args.compact:
+        store = DeltaStore(directory)
+        store.compact()
+        print(json.dumps(store.stats(), indent=2))
+    else:
+        delta = scrape_incremental(args.destination, args.checkin, args.checkout, args.guests, args.feature,
+                                   args.root, args.compact_every, budget=args.budget)
+        if delta:
+            print(f"Run {delta['metadata']['sequence']}: {len(delta['added'])} added, "
+                  f"{len(delta['changed'])} changed, {len(delta['removed'])} removed")
+        print(f"Current view in {directory} (filter it with filter_listings.py --view {directory})")
@@ -0,0 +1,324 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from contextlib import contextmanager
+import atexit
+import os
+import queue
+import threading
+import time
+import logging
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; fall back to /proc on Linux
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+def build_chrome_options():
+    """Build the headless Chrome options used for every scrape."""
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")  # Use new headless mode
+    chrome_options.add_argument("--disable-gpu")  # Disable GPU acceleration
+    chrome_options.add_argument("--window-size=1920,1080")  # Set window size
+    chrome_options.add_argument("--no-sandbox")  # Bypass OS security model
+    chrome_options.add_argument("--disable-dev-shm-usage")  # Overcome limited resource problems
+    chrome_options.add_argument("--disable-extensions")  # Disable extensions
+    chrome_options.add_argument("--disable-notifications")  # Disable notifications
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")  # Set user agent
+    # Network events in the performance log feed the resource blocking report
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    return chrome_options
+
+def create_driver(options_factory=build_chrome_options):
+    """Launch a new headless Chrome driver."""
+    logger.info("Starting Chrome in headless mode")
+    return webdriver.Chrome(options=options_factory())
+
+def quit_driver(driver):
+    """Quit a driver, ignoring errors from a browser that is already gone."""
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning(f"Error while quitting driver: {e}")
+
+@contextmanager
+def standalone_driver(options_factory=build_chrome_options):
+    """Launch a one-off driver and always quit it, whatever happens inside the block."""
+    driver = create_driver(options_factory)
+    try:
+        yield driver
+    finally:
+        quit_driver(driver)
+
+def _proc_rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def _proc_children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) == pid:
+                children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+def driver_rss_bytes(driver):
+    """
+    Resident memory of a driver's chromedriver process and every browser process under it.
+
+    Returns:
+        int or None: Bytes, or None if it cannot be measured on this platform
+    """
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + proc.children(recursive=True)
+            total = 0
+            for p in procs:
+                try:
+                    total += p.memory_info().rss
+                except psutil.Error:
+                    continue
+            return total
+        except psutil.Error:
+            return None
+
+    if not os.path.isdir("/proc"):
+        return None
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            total += _proc_rss_bytes(current)
+        except OSError:
+            continue
+        pending.extend(_proc_children(current))
+    return total
+
+def driver_is_alive(driver):
+    """Cheap liveness probe: a crashed browser or dead session raises here."""
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+class DriverPool:
+    """
+    Bounded pool of pre-launched headless Chrome drivers.
+
+    Drivers are checked out with the driver() context manager. A driver is
+    recycled after max_pages checkouts or once its process tree passes
+    max_rss_mb, and it is replaced if it crashed or the block raised, so a
+    failure in one scrape never leaks a browser or poisons the next one.
+    """
+
+    def __init__(self, size=2, max_pages=50, max_rss_mb=1500, prelaunch=True,
+                 checkout_timeout=120, options_factory=build_chrome_options):
+        """
+        Args:
+            size (int): Maximum number of live drivers
+            max_pages (int): Checkouts served before a driver is recycled
+            max_rss_mb (int, optional): Memory ceiling per driver in MB (None disables the check)
+            prelaunch (bool): Launch all drivers up front instead of on first use
+            checkout_timeout (float): Seconds to wait for a free driver before raising
+            options_factory (callable): Returns the Chrome Options for new drivers
+        """
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.checkout_timeout = checkout_timeout
+        self.options_factory = options_factory
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "recycled_pages": 0,
+            "recycled_memory": 0,
+            "replaced_crashed": 0,
+            "discarded_on_error": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+        atexit.register(self.close)
+        if prelaunch:
+            for _ in range(size):
+                self._idle.put(self._launch())
+
+    def _launch(self):
+        driver = create_driver(self.options_factory)
+        with self._lock:
+            self._pages[id(driver)] = 0
+            self._stats["created"] += 1
+        return driver
+
+    def _discard(self, driver, reason):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            self._stats[reason] += 1
+        quit_driver(driver)
+
+    def checkout(self, timeout=None):
+        """
+        Take a healthy driver from the pool, launching one if none is idle.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free driver instead of checkout_timeout
+
+        Raises:
+            TimeoutError: If every driver stays busy for the timeout
+        """
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._stats["checkout_timeouts"] += 1
+            raise TimeoutError(f"No driver available after {timeout}s")
+        waited = time.perf_counter() - start
+
+        try:
+            driver = None
+            while driver is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self._launch()
+                    break
+                if driver_is_alive(candidate):
+                    driver = candidate
+                else:
+                    logger.warning("Replacing crashed driver")
+                    self._discard(candidate, "replaced_crashed")
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+        return driver
+
+    def checkin(self, driver, failed=False):
+        """
+        Return a driver to the pool, recycling it if it is worn out, bloated or broken.
+
+        Args:
+            driver: Driver obtained from checkout()
+            failed (bool): The caller hit an error; the driver is quit rather than reused
+        """
+        try:
+            with self._lock:
+                self._stats["in_use"] -= 1
+                pages = self._pages.get(id(driver), 0) + 1
+                self._pages[id(driver)] = pages
+
+            if self._closed:
+                self._discard(driver, "closed")
+            elif failed:
+                self._discard(driver, "discarded_on_error")
+            elif not driver_is_alive(driver):
+                self._discard(driver, "replaced_crashed")
+            elif pages >= self.max_pages:
+                logger.info(f"Recycling driver after {pages} pages")
+                self._discard(driver, "recycled_pages")
+            elif self._over_memory(driver):
+                self._discard(driver, "recycled_memory")
+            else:
+                try:
+                    # Drop the previous page so an idle driver holds no DOM
+                    driver.get("about:blank")
+                    self._idle.put(driver)
+                except Exception:
+                    self._discard(driver, "replaced_crashed")
+        finally:
+            self._slots.release()
+
+    def _over_memory(self, driver):
+        if not self.max_rss_mb:
+            return False
+        rss = driver_rss_bytes(driver)
+        if rss is None:
+            return False
+        if rss > self.max_rss_mb * 1024 * 1024:
+            logger.info(f"Recycling driver using {rss / 1024 / 1024:.0f} MB")
+            return True
+        return False
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Check out a driver for the duration of a with-block (see checkout)."""
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        except GeneratorExit:
+            # A streaming caller stopped early; the driver itself is fine
+            self.checkin(driver)
+            raise
+        except BaseException:
+            self.checkin(driver, failed=True)
+            raise
+        else:
+            self.checkin(driver)
+
+    def stats(self):
+        """Snapshot of pool counters for sizing and monitoring."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self.size
+        stats["idle"] = self._idle.qsize()
+        stats["avg_wait_seconds"] = (
+            stats["total_wait_seconds"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        )
+        return stats
+
+    def close(self):
+        """Quit every idle driver; drivers still checked out are quit when returned."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver, "closed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
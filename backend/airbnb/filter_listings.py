@@ -1,7 +1,16 @@
 import json
 import re
+import os
+import glob
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; thresholds fall back to a plain loop
+    np = None
+
 def extract_rating_and_reviews(rating_text):
     """Extract rating and review count from the rating text."""
     if rating_text == "No rating":
@@ -11,10 +20,10 @@ def extract_rating_and_reviews(rating_text):
     
     # Try different patterns for rating formats
     patterns = [
-        r"(\d+\.\d+)(?:\s+out of \d+)?\s*\((\d+)[^\d]*\)",  # "4.95 (124 reviews)" or "4.8 out of 5 (124)"
-        r"(\d+\.\d+)\s+\((\d+)\)",  # "4.95 (124)"
-        r"(\d+\.\d+)\s+out of \d+\s+\((\d+)\s+reviews\)",  # "4.95 out of 5 (124 reviews)"
-        r"(\d+\.\d+).*?(\d+)\s+reviews"  # "4.95 · 124 reviews"
+        r"(\d+\.\d+)(?:\s+out of \d+)?\s*\((\d[\d,]*)[^\d]*\)",  # "4.95 (124 reviews)" or "4.8 out of 5 (124)"
+        r"(\d+\.\d+)\s+\((\d[\d,]*)\)",  # "4.95 (124)"
+        r"(\d+\.\d+)\s+out of \d+\s+\((\d[\d,]*)\s+reviews\)",  # "4.95 out of 5 (124 reviews)"
+        r"(\d+\.\d+).*?(\d[\d,]*)\s+reviews"  # "4.95 · 1,024 reviews"
     ]
     
     for pattern in patterns:
@@ -22,7 +31,7 @@ def extract_rating_and_reviews(rating_text):
         if match:
             try:
                 rating = float(match.group(1))
-                reviews = int(match.group(2))
+                reviews = int(match.group(2).replace(",", ""))
                 print(f"Extracted: rating = {rating}, reviews = {reviews}")
                 return rating, reviews
             except (ValueError, IndexError) as e:
@@ -32,12 +41,283 @@ def extract_rating_and_reviews(rating_text):
     print(f"No pattern matched for: {rating_text}")
     return 0, 0
 
+# The four patterns above folded into one alternation so batch mode scans each
+# rating string once: "(N)" after the rating covers the first three, "N reviews"
+# anywhere later covers the last. Review counts may carry thousands separators ("1,024").
+RATING_PATTERN = re.compile(
+    r"(\d+\.\d+)(?:(?:\s+out of \d+)?\s*\((\d[\d,]*)[^\d]*\)|.*?(\d[\d,]*)\s+reviews)"
+)
+
+def parse_rating(rating_text):
+    """Silent single-pass version of extract_rating_and_reviews for batch processing."""
+    if not rating_text or rating_text == "No rating":
+        return 0.0, 0
+    match = RATING_PATTERN.search(rating_text)
+    if not match:
+        return 0.0, 0
+    reviews = match.group(2) or match.group(3)
+    return float(match.group(1)), int(reviews.replace(",", ""))
+
+def listing_rating(listing):
+    """Rating and review count of a listing, skipping the text parse when it was decoded from the search API."""
+    if listing.get('rating_value') is not None and listing.get('reviews') is not None:
+        return float(listing['rating_value']), int(listing['reviews'])
+    return parse_rating(listing.get('rating'))
+
+_WHITESPACE = " \t\r\n"
+
+class _StreamReader:
+    """Incremental JSON reader over a text file, decoding one value at a time."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop consumed text so memory stays bounded by one value plus one chunk
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace, non-comma character (None at end of file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE + ",":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_snapshot(input_file, chunk_size=1 << 16):
+    """
+    Stream a scrape snapshot without loading it all at once.
+
+    Yields:
+        tuple: ("metadata", dict) and then ("listing", dict) for each listing,
+            in file order (any other top-level keys are yielded by name)
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        reader = _StreamReader(f, chunk_size)
+        reader.expect("{")
+        while reader.peek() != "}":
+            key = reader.value()
+            reader.expect(":")
+            if key == "listings":
+                reader.expect("[")
+                while reader.peek() != "]":
+                    yield "listing", reader.value()
+                reader.expect("]")
+            else:
+                yield key, reader.value()
+
+def iter_records(input_path):
+    """
+    iter_snapshot for a snapshot file, or the reconstructed current view of a
+    delta_store.DeltaStore directory (base snapshot plus deltas).
+    """
+    if os.path.isdir(input_path):
+        from delta_store import DeltaStore
+        return DeltaStore(input_path).iter_current_view()
+    return iter_snapshot(input_path)
+
+def threshold_mask(ratings, reviews, min_rating, min_reviews):
+    """Boolean keep-mask for typed rating/review columns."""
+    if np is not None and len(ratings):
+        rating_col = np.frombuffer(ratings, dtype=np.float64)
+        review_col = np.frombuffer(reviews, dtype=np.int64)
+        return ((rating_col >= min_rating) & (review_col >= min_reviews)).tolist()
+    return [r >= min_rating and n >= min_reviews for r, n in zip(ratings, reviews)]
+
+# Listings thresholded together in filter_snapshot; bounds its memory whatever the snapshot size
+FILTER_CHUNK_SIZE = 4096
+
+def filter_snapshot(input_file, min_rating=4.8, min_reviews=50, output_dir=None):
+    """
+    Batch-mode filter for one snapshot: streaming parse, numeric columns, no console output.
+
+    Args:
+        input_file (str): Path to an airbnb_listings_*.json snapshot, or a delta store
+            directory to filter its current view
+        min_rating (float): Minimum rating to keep
+        min_reviews (int): Minimum review count to keep
+        output_dir (str, optional): Write filtered_<name>.json here when given
+
+    Returns:
+        dict: Per-file summary with counts, output path and any error
+    """
+    try:
+        metadata = {}
+        # Listings are thresholded a chunk at a time and only the ones that pass are
+        # kept, and only when there is an output file to write them to
+        keep_rows = output_dir is not None
+        kept = []
+        chunk = []
+        ratings = array('d')
+        reviews = array('q')
+        counts = {"original": 0, "kept": 0}
+
+        def flush():
+            mask = threshold_mask(ratings, reviews, min_rating, min_reviews)
+            counts["original"] += len(mask)
+            counts["kept"] += sum(mask)
+            if keep_rows:
+                kept.extend(listing for listing, keep in zip(chunk, mask) if keep)
+            chunk.clear()
+            del ratings[:]
+            del reviews[:]
+
+        for kind, value in iter_records(input_file):
+            if kind == "listing":
+                rating, review_count = listing_rating(value)
+                if keep_rows:
+                    chunk.append(value)
+                ratings.append(rating)
+                reviews.append(review_count)
+                if len(ratings) >= FILTER_CHUNK_SIZE:
+                    flush()
+            elif kind == "metadata":
+                metadata = value
+        flush()
+
+        output_file = None
+        if output_dir is not None:
+            metadata['filtered_count'] = counts["kept"]
+            metadata['filter_criteria'] = {
+                'min_rating': min_rating,
+                'min_reviews': min_reviews
+            }
+            name = os.path.basename(os.path.normpath(input_file))
+            if os.path.isdir(input_file):
+                name += ".json"
+            output_file = os.path.join(output_dir, f"filtered_{name}")
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump({"metadata": metadata, "listings": kept}, f, ensure_ascii=False)
+
+        return {
+            "input_file": input_file,
+            "original_count": counts["original"],
+            "filtered_count": counts["kept"],
+            "output_file": output_file,
+            "error": None
+        }
+    except Exception as e:
+        return {
+            "input_file": input_file,
+            "original_count": 0,
+            "filtered_count": 0,
+            "output_file": None,
+            "error": str(e)
+        }
+
+def filter_snapshots_batch(pattern="airbnb_listings_*.json", min_rating=4.8, min_reviews=50,
+                           output_dir=None, workers=None):
+    """
+    Filter many snapshot files in parallel worker processes.
+
+    Args:
+        pattern (str or list): Glob pattern or explicit list of snapshot paths
+        min_rating (float): Minimum rating to keep
+        min_reviews (int): Minimum review count to keep
+        output_dir (str, optional): Directory for filtered_<name>.json outputs
+        workers (int, optional): Worker processes (defaults to the CPU count)
+
+    Returns:
+        list: filter_snapshot summaries, in input order
+    """
+    files = sorted(glob.glob(pattern)) if isinstance(pattern, str) else list(pattern)
+    if not files:
+        return []
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    if len(files) == 1 or workers == 1:
+        return [filter_snapshot(f, min_rating, min_reviews, output_dir) for f in files]
+
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            filter_snapshot, files,
+            [min_rating] * len(files), [min_reviews] * len(files), [output_dir] * len(files),
+            chunksize=max(1, len(files) // (workers * 4))
+        ))
+
+def filter_changes(directory, since, min_rating=4.8, min_reviews=50):
+    """
+    Update a filtered result from the deltas of an incremental scrape only.
+
+    Args:
+        directory (str): delta_store.DeltaStore directory
+        since (int): Last run sequence the caller has already processed
+
+    Returns:
+        dict: sequence (the latest run processed), kept (added or changed listings
+            that pass the filter, keyed by room id) and dropped (room ids to take out
+            of a previously filtered set: removed, or updated and now failing)
+
+    Raises:
+        ValueError: If the deltas since `since` were compacted; filter the whole
+            directory with filter_snapshot instead
+    """
+    from delta_store import DeltaStore
+    from listing_batch import listing_key
+
+    kept = {}
+    dropped = set()
+    sequence = since
+    for delta in DeltaStore(directory).deltas(since):
+        sequence = delta["metadata"]["sequence"]
+        for key in delta["removed"]:
+            kept.pop(key, None)
+            dropped.add(key)
+        for listing in delta["added"] + delta["changed"]:
+            key = listing_key(listing)
+            rating, reviews = listing_rating(listing)
+            if rating >= min_rating and reviews >= min_reviews:
+                kept[key] = listing
+                dropped.discard(key)
+            else:
+                kept.pop(key, None)
+                dropped.add(key)
+    return {"sequence": sequence, "kept": kept, "dropped": sorted(dropped)}
+
 def filter_listings(input_file, min_rating=4.8, min_reviews=50):
     """Filter listings based on minimum rating and review count."""
     try:
-        # Read the input JSON file
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Read the input JSON file, or rebuild the current view of an incremental scrape
+        if os.path.isdir(input_file):
+            from delta_store import DeltaStore
+            data = DeltaStore(input_file).current_view()
+        else:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
         
         original_count = len(data['listings'])
         filtered_listings = []
@@ -84,11 +364,97 @@ def filter_listings(input_file, min_rating=4.8, min_reviews=50):
         print(f"Error processing file: {str(e)}")
         return None
 
+def filter_listings_from_store(destination, min_rating=4.8, min_reviews=50, since=None,
+                               max_price=None, db_path=None):
+    """
+    Filter listings with an indexed ListingStore query instead of rescanning JSON snapshots.
+
+    Args:
+        destination (str): Destination as searched
+        min_rating (float): Minimum rating to keep
+        min_reviews (int): Minimum review count to keep
+        since (str, optional): Only listings scraped at or after this ISO timestamp
+        max_price (float, optional): Maximum parsed price
+        db_path (str, optional): Store location (defaults to listings.db next to this module)
+
+    Returns:
+        str: Path of the filtered_listings_<timestamp>.json output, as filter_listings does
+    """
+    from listing_store import DEFAULT_DB_PATH, ListingStore
+
+    with ListingStore(db_path or DEFAULT_DB_PATH) as store:
+        listings = store.query(destination=destination, min_rating=min_rating,
+                               min_reviews=min_reviews, since=since, max_price=max_price)
+
+    data = {
+        "metadata": {
+            "destination": destination,
+            "source": "listing_store",
+            "since": since,
+            "filtered_count": len(listings),
+            "filter_criteria": {
+                'min_rating': min_rating,
+                'min_reviews': min_reviews,
+                'max_price': max_price
+            }
+        },
+        "listings": listings
+    }
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = f"filtered_listings_{timestamp}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    
+    print(f"Filtered listings: {len(listings)}")
+    print(f"Filtered results saved to: {output_file}")
+    return output_file
+
 if __name__ == "__main__":
-    # Get the most recent airbnb_listings file in the current directory
-    import glob
-    import os
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Filter scraped Airbnb listings by rating and reviews.")
+    parser.add_argument("--batch", metavar="PATTERN",
+                        help="Filter every snapshot matching PATTERN in parallel, without per-listing output")
+    parser.add_argument("--min-rating", type=float, default=4.5)
+    parser.add_argument("--min-reviews", type=int, default=30)
+    parser.add_argument("--output-dir", default="filtered")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--store", metavar="DESTINATION",
+                        help="Query the indexed listing store for DESTINATION instead of a JSON file")
+    parser.add_argument("--since", help="With --store, only listings scraped at or after this ISO timestamp")
+    parser.add_argument("--max-price", type=float, default=None)
+    parser.add_argument("--view", metavar="DIRECTORY",
+                        help="Filter the current view of an incremental scrape (see delta_store.py)")
+    parser.add_argument("--changes-since", type=int, default=None, metavar="RUN",
+                        help="With --view, only process the deltas recorded after RUN")
+    args = parser.parse_args()
+    
+    if args.view:
+        if args.changes_since is not None:
+            changes = filter_changes(args.view, args.changes_since, args.min_rating, args.min_reviews)
+            print(f"Up to run {changes['sequence']}: {len(changes['kept'])} listings entered or updated, "
+                  f"{len(changes['dropped'])} left the filtered set")
+        else:
+            filter_listings(args.view, min_rating=args.min_rating, min_reviews=args.min_reviews)
+        exit(0)
     
+    if args.store:
+        filter_listings_from_store(args.store, args.min_rating, args.min_reviews,
+                                   since=args.since, max_price=args.max_price)
+        exit(0)
+    
+    if args.batch:
+        summaries = filter_snapshots_batch(args.batch, args.min_rating, args.min_reviews,
+                                           args.output_dir, args.workers)
+        failed = [s for s in summaries if s["error"]]
+        print(f"Filtered {len(summaries) - len(failed)} files: "
+              f"{sum(s['original_count'] for s in summaries)} listings -> "
+              f"{sum(s['filtered_count'] for s in summaries)} kept")
+        for summary in failed:
+            print(f"Error processing {summary['input_file']}: {summary['error']}")
+        exit(0)
+    
+    # Get the most recent airbnb_listings file in the current directory
     listing_files = glob.glob("airbnb_listings_*.json")
     if not listing_files:
         print("No listing files found!")
@@ -99,4 +465,4 @@ if __name__ == "__main__":
     print(f"Processing most recent file: {latest_file}")
     
     # Filter the listings with updated criteria
-    filter_listings(latest_file, min_rating=4.5, min_reviews=30)  # Updated to more lenient criteria 
\ No newline at end of file
+    filter_listings(latest_file, min_rating=args.min_rating, min_reviews=args.min_reviews)  # Updated to more lenient criteria 
\ No newline at end of file
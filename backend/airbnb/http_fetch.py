@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+import logging
+
+import httpx
+from lxml import etree, html as lxml_html
+
+from driver_pool import USER_AGENT
+from network_capture import listings_from_responses
+from search_query import BASE_URL, build_search_url, url_filters_applied
+from tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_MAX_CONNECTIONS = 20
+
+# Same browser identity as the Selenium path, so both see the same markup
+DEFAULT_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9"
+}
+
+# Server-rendered state: the search page ships its first results page as JSON in
+# script tags (data-deferred-state-N on the current site) that the client hydrates from
+EMBEDDED_STATE_XPATH = '//script[@type="application/json" or starts-with(@id, "data-deferred-state")]'
+
+class HttpSearchClient:
+    """
+    Pooled HTTP client for fetching search pages without a browser.
+
+    One httpx.Client keeps connections alive across searches and is safe to
+    share between worker threads; a request costs a few MB of memory instead
+    of a Chrome renderer.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_connections=DEFAULT_MAX_CONNECTIONS, headers=None):
+        """
+        Args:
+            timeout (float): Seconds allowed per request
+            max_connections (int): Connections kept in the pool
+            headers (dict, optional): Extra headers sent with every request
+        """
+        self._client = httpx.Client(
+            timeout=timeout,
+            follow_redirects=True,
+            headers={**DEFAULT_HEADERS, **(headers or {})},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    def fetch(self, url, timeout=None):
+        """
+        Args:
+            url (str): Page to load
+            timeout (float, optional): Seconds allowed instead of the client's timeout
+
+        Returns:
+            httpx.Response: The response after redirects
+
+        Raises:
+            httpx.HTTPError: On connection errors and timeouts
+        """
+        if timeout is not None:
+            return self._client.get(url, timeout=timeout)
+        return self._client.get(url)
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def embedded_payloads(page_html):
+    """
+    Parse the JSON state embedded in a search page.
+
+    Only scripts that mention searchResults are decoded; the page carries many
+    unrelated JSON blobs (translations, feature flags) that are not worth parsing.
+
+    Returns:
+        list: Parsed JSON documents, in page order
+    """
+    try:
+        document = lxml_html.fromstring(page_html)
+    except (ValueError, etree.ParserError):
+        return []
+    payloads = []
+    for script in document.xpath(EMBEDDED_STATE_XPATH):
+        text = script.text
+        if not text or "searchResults" not in text:
+            continue
+        try:
+            payloads.append(json.loads(text))
+        except ValueError:
+            logger.info(f"Embedded script {script.get('id')} is not valid JSON")
+    return payloads
+
+class FetchPathStats:
+    """Thread-safe count of searches served by the HTTP fast path vs. Selenium, with fallback reasons."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}
+        self._reasons = {}
+
+    def record(self, path, reason=None):
+        with self._lock:
+            self._paths[path] = self._paths.get(path, 0) + 1
+            if reason:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        metrics.inc("airbnb_fetch_path_total", path=path)
+        if reason:
+            metrics.inc("airbnb_fetch_fallbacks_total", reason=reason)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Searches per path, the share served over plain HTTP and fallback reasons
+        """
+        with self._lock:
+            paths = dict(self._paths)
+            reasons = dict(self._reasons)
+        total = sum(paths.values())
+        return {
+            "paths": paths,
+            "http_share": round(paths.get("http", 0) / total, 3) if total else 0.0,
+            "fallback_reasons": reasons
+        }
+
+path_stats = FetchPathStats()
+metrics.describe("airbnb_fetch_path_total", "Searches served, by path (http or selenium)")
+metrics.describe("airbnb_fetch_fallbacks_total", "Searches the HTTP fast path handed to Selenium, by reason")
+
+def fetch_listings_http(search, client=None, deadline=None):
+    """
+    Scrape one search from the server-rendered page, without a browser.
+
+    Only searches whose filters all fit in the URL qualify: a feature without a
+    learned category tag needs the category bar, so it goes straight to Selenium.
+
+    Args:
+        search (dict): destination, checkin, checkout, guests, feature, budget and
+            optionally base_url and extra_params (map bounds, cursors), as built by
+            scrape_airbnb_with_got_it
+        client (HttpSearchClient, optional): Defaults to the shared client
+        deadline (Deadline, optional): Caps the request timeout at the time the scrape has left
+
+    Returns:
+        tuple: (listings, info) where listings is empty if Selenium is needed and
+            info has the source, url, status, size, timing, pagination and, on
+            failure, the fallback_reason
+    """
+    start = time.perf_counter()
+    client = client or default_client()
+    feature = search.get("feature")
+    budget = search.get("budget")
+    url, feature_in_url = build_search_url(
+        search["destination"], search["checkin"], search["checkout"], search["guests"],
+        budget=budget, feature=feature, base_url=search.get("base_url") or BASE_URL,
+        extra_params=search.get("extra_params")
+    )
+    info = {"source": "http", "url": url}
+
+    def fallback(reason):
+        info["fallback_reason"] = reason
+        info["seconds"] = round(time.perf_counter() - start, 4)
+        logger.info(f"HTTP fast path not usable ({reason}), falling back to Selenium")
+        return [], info
+
+    if not feature_in_url:
+        return fallback("feature_needs_ui")
+    if deadline is not None and deadline.expired():
+        return fallback("deadline")
+    try:
+        response = client.fetch(url, deadline.clamp(DEFAULT_TIMEOUT) if deadline is not None else None)
+    except httpx.HTTPError as e:
+        logger.info(f"Search page request failed: {e}")
+        return fallback("request_failed")
+    info["status"] = response.status_code
+    info["bytes"] = len(response.content)
+    if response.status_code != 200:
+        return fallback(f"http_{response.status_code}")
+
+    # The site redirects away filters it does not accept; Selenium re-applies them through the UI
+    price_applied, feature_applied = url_filters_applied(str(response.url))
+    if (budget and not price_applied) or (feature and not feature_applied):
+        return fallback("filters_dropped")
+
+    payloads = embedded_payloads(response.text)
+    if not payloads:
+        return fallback("no_embedded_state")
+    listings, pagination = listings_from_responses([(url, payload) for payload in payloads], search)
+    if not listings:
+        return fallback("no_listings")
+    info["pagination"] = pagination
+    info["seconds"] = round(time.perf_counter() - start, 4)
+    logger.info(f"Fetched {len(listings)} listings over HTTP in {info['seconds']}s")
+    return listings, info
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def default_client():
+    """Process-wide HttpSearchClient, created on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpSearchClient()
+        return _default_client
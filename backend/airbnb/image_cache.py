@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+import httpx
+
+from driver_pool import USER_AGENT
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it only the originals are cached
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".image_cache")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 20.0
+# Widths of the resized variants; cards render at roughly 300px, retina at twice that
+VARIANT_WIDTHS = (320, 640)
+VARIANT_QUALITY = 80
+DEFAULT_PUBLIC_BASE = "/images"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    content_type TEXT,
+    bytes INTEGER NOT NULL,
+    variants TEXT NOT NULL DEFAULT '',
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES objects(digest)
+);
+CREATE INDEX IF NOT EXISTS idx_objects_last_access ON objects (last_access);
+CREATE INDEX IF NOT EXISTS idx_urls_digest ON urls (digest);
+"""
+
+class ImageCache:
+    """
+    Content-addressed disk cache for listing images, with LRU eviction.
+
+    Images are stored once per SHA-256 of their bytes (the CDN serves the same
+    picture under several URLs), next to resized JPEG variants when Pillow is
+    installed. A SQLite index maps source URLs to digests and tracks size and
+    last access; once the cache grows past max_bytes the least recently used
+    images are evicted with their variants.
+    """
+
+    def __init__(self, directory=DEFAULT_IMAGE_DIR, max_bytes=DEFAULT_MAX_BYTES, widths=VARIANT_WIDTHS):
+        """
+        Args:
+            directory (str): Cache root; files go under objects/<2 hex chars>/
+            max_bytes (int): Total size of originals and variants to keep
+            widths (tuple): Widths of the resized variants
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.widths = tuple(widths) if Image is not None else ()
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def path(self, digest, width=None):
+        """File holding an original (width None) or one of its variants."""
+        name = digest if width is None else f"{digest}_w{width}.jpg"
+        return os.path.join(self.directory, "objects", digest[:2], name)
+
+    def lookup(self, url):
+        """Digest of a cached source URL, or None. Counts as an access for LRU purposes."""
+        with self._lock:
+            row = self.conn.execute("SELECT digest FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE objects SET last_access = ? WHERE digest = ?", (time.time(), row[0]))
+            return row[0]
+
+    def get(self, digest, width=None):
+        """
+        Returns:
+            tuple or None: (path, content type) of the original, or of the variant
+                closest to `width` without going under it (the original if none is)
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT content_type, variants FROM objects WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE objects SET last_access = ? WHERE digest = ?", (time.time(), digest))
+        content_type, variants = row
+        if width:
+            available = sorted(int(w) for w in variants.split(",") if w)
+            wide_enough = [w for w in available if w >= width]
+            if wide_enough:
+                return self.path(digest, wide_enough[0]), "image/jpeg"
+        return self.path(digest), content_type
+
+    def _variants(self, data):
+        """Resized JPEG bytes per width (widths at or above the original's are skipped)."""
+        if not self.widths:
+            return {}
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                variants = {}
+                for width in self.widths:
+                    if width >= image.width:
+                        continue
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.convert("RGB").resize((width, height), Image.LANCZOS)
+                    buffer = io.BytesIO()
+                    resized.save(buffer, "JPEG", quality=VARIANT_QUALITY, optimize=True)
+                    variants[width] = buffer.getvalue()
+                return variants
+        except Exception as e:
+            logger.info(f"Could not resize image: {e}")
+            return {}
+
+    def put(self, url, data, content_type=None):
+        """
+        Store an image fetched from `url` and its variants.
+
+        Returns:
+            str: The image's digest
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            known = self.conn.execute("SELECT 1 FROM objects WHERE digest = ?", (digest,)).fetchone()
+        if not known:
+            variants = self._variants(data)
+            os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+            files = [(self.path(digest), data)] + [(self.path(digest, w), v) for w, v in variants.items()]
+            for path, content in files:
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            size = sum(len(content) for _, content in files)
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)",
+                    (digest, content_type, size, ",".join(str(w) for w in sorted(variants)), time.time())
+                )
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, digest))
+        return digest
+
+    def evict(self):
+        """
+        Drop least recently used images until the cache fits in max_bytes.
+
+        Returns:
+            int: Images evicted
+        """
+        evicted = 0
+        with self._lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM objects").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            rows = self.conn.execute("SELECT digest, bytes, variants FROM objects ORDER BY last_access").fetchall()
+            with self.conn:
+                for digest, size, variants in rows:
+                    if total <= self.max_bytes:
+                        break
+                    for width in [None] + [int(w) for w in variants.split(",") if w]:
+                        try:
+                            os.remove(self.path(digest, width))
+                        except OSError:
+                            pass
+                    self.conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+                    self.conn.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+                    total -= size
+                    evicted += 1
+        logger.info(f"Evicted {evicted} images from {self.directory}")
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            images, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM objects").fetchone()
+            urls = self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        return {"images": images, "urls": urls, "bytes": total, "max_bytes": self.max_bytes,
+                "variant_widths": list(self.widths)}
+
+async def prefetch_images(urls, cache, concurrency=DEFAULT_CONCURRENCY, client=None):
+    """
+    Download every image not cached yet, at most `concurrency` at a time.
+
+    Args:
+        urls (iterable): Image URLs; duplicates and None are skipped
+        cache (ImageCache): Where the images go
+        concurrency (int): Simultaneous downloads
+        client (httpx.AsyncClient, optional): Pooled client to reuse; a private
+            one is created and closed otherwise
+
+    Returns:
+        tuple: ({url: digest or None}, counts of cached, fetched and failed URLs)
+    """
+    unique = list(dict.fromkeys(url for url in urls if url))
+    digests = {}
+    counts = {"cached": 0, "fetched": 0, "failed": 0}
+    missing = []
+    for url in unique:
+        digest = cache.lookup(url)
+        if digest:
+            digests[url] = digest
+            counts["cached"] += 1
+        else:
+            missing.append(url)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(http, url):
+        async with semaphore:
+            try:
+                response = await http.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.info(f"Could not fetch image {url}: {e}")
+                digests[url] = None
+                counts["failed"] += 1
+                return
+        content_type = response.headers.get("content-type", "application/octet-stream").split(";")[0]
+        # Hashing and resizing are CPU-bound; keep them off the event loop
+        digests[url] = await asyncio.to_thread(cache.put, url, response.content, content_type)
+        counts["fetched"] += 1
+
+    if missing:
+        own_client = client is None
+        if own_client:
+            client = httpx.AsyncClient(
+                timeout=DEFAULT_TIMEOUT,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            )
+        try:
+            await asyncio.gather(*(fetch(client, url) for url in missing))
+        finally:
+            if own_client:
+                await client.aclose()
+        await asyncio.to_thread(cache.evict)
+    return digests, counts
+
+def cached_image_url(digest, public_base=DEFAULT_PUBLIC_BASE, width=None):
+    """URL under which the service serves a cached image (see main.py /images)."""
+    url = f"{public_base.rstrip('/')}/{digest}"
+    return f"{url}?w={width}" if width else url
+
+def rewrite_listings(listings, digests, public_base=DEFAULT_PUBLIC_BASE, widths=VARIANT_WIDTHS):
+    """
+    Point listing thumbnails at the cached copies, in place.
+
+    The CDN URL moves to thumbnail_source, thumbnail becomes the cached original
+    and thumbnail_variants maps each width to its resized copy. Listings whose
+    image could not be fetched keep their CDN URL.
+
+    Returns:
+        int: Listings rewritten
+    """
+    rewritten = 0
+    for listing in listings:
+        source = listing.get("thumbnail_source") or listing.get("thumbnail")
+        digest = digests.get(source)
+        if not digest:
+            continue
+        listing["thumbnail_source"] = source
+        listing["thumbnail"] = cached_image_url(digest, public_base)
+        listing["thumbnail_variants"] = {str(w): cached_image_url(digest, public_base, w) for w in widths}
+        rewritten += 1
+    return rewritten
+
+def prefetch_result(result, cache=None, public_base=DEFAULT_PUBLIC_BASE, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Prefetch the thumbnails of a scrape result and rewrite its listings to the cached copies.
+
+    Blocking wrapper around prefetch_images for the scraper's worker threads.
+
+    Returns:
+        dict: Counts of cached, fetched, failed and rewritten thumbnails (also
+            stored in result["metadata"]["thumbnails"])
+    """
+    cache = cache or default_image_cache()
+    listings = result.get("listings") or []
+    urls = [listing.get("thumbnail_source") or listing.get("thumbnail") for listing in listings]
+    digests, counts = asyncio.run(prefetch_images(urls, cache, concurrency))
+    counts["rewritten"] = rewrite_listings(listings, digests, public_base, cache.widths)
+    if result.get("metadata") is not None:
+        result["metadata"]["thumbnails"] = counts
+    return counts
+
+def prefetch_feature_images(cache=None, public_base=DEFAULT_PUBLIC_BASE, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Cache the category images of AIRBNB_FEATURES.
+
+    Returns:
+        dict: Feature name -> cached image URL (the CDN URL if the fetch failed)
+    """
+    from scraper import AIRBNB_FEATURES
+
+    cache = cache or default_image_cache()
+    digests, _ = asyncio.run(prefetch_images(AIRBNB_FEATURES.values(), cache, concurrency))
+    return {
+        name: cached_image_url(digests[url], public_base) if digests.get(url) else url
+        for name, url in AIRBNB_FEATURES.items()
+    }
+
+_default_image_cache = None
+_default_image_cache_lock = threading.Lock()
+
+def default_image_cache():
+    """Process-wide ImageCache in DEFAULT_IMAGE_DIR, created on first use."""
+    global _default_image_cache
+    with _default_image_cache_lock:
+        if _default_image_cache is None:
+            _default_image_cache = ImageCache()
+        return _default_image_cache
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Prefetch the thumbnails of a scrape snapshot into the image cache.")
+    parser.add_argument("snapshot", nargs="?", help="airbnb_listings_*.json file to prefetch and rewrite in place")
+    parser.add_argument("--features", action="store_true", help="Also cache the AIRBNB_FEATURES category images")
+    parser.add_argument("--public-base", default=DEFAULT_PUBLIC_BASE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.snapshot:
+        with open(args.snapshot, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        counts = prefetch_result(snapshot, public_base=args.public_base, concurrency=args.concurrency)
+        with open(args.snapshot, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2, ensure_ascii=False)
+        print(f"Thumbnails: {counts}")
+    if args.features:
+        print(json.dumps(prefetch_feature_images(public_base=args.public_base,
+                                                 concurrency=args.concurrency), indent=2))
+    print(json.dumps(default_image_cache().stats(), indent=2))
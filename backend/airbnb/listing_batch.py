@@ -0,0 +1,418 @@
+import hashlib
+import json
+import re
+import sys
+from array import array
+
+from filter_listings import iter_records, listing_rating, threshold_mask
+from prices import nights_between, parse_price
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder produces the same JSON
+    orjson = None
+
+ROOM_ID_PATTERN = re.compile(r"/rooms/(?:plus/)?(\d+)")
+
+# Placeholder strings the extractors write for missing card fields; stored as None
+SENTINELS = {
+    "title": "No title",
+    "price_text": "No price",
+    "rating": "No rating",
+    "url": "No URL"
+}
+NO_ROOM_ID = -1
+LISTING_URL_TEMPLATE = "https://www.airbnb.com/rooms/{}"
+
+# Flags for text a batch rebuilds from its numeric columns instead of storing
+URL_DERIVED = 1
+RATING_DERIVED_SHORT = 2   # "4.9 out of 5 average rating, 12 reviews"
+RATING_DERIVED_FIXED = 4   # "4.90 out of 5 average rating, 12 reviews"
+RATING_TEMPLATES = (
+    (RATING_DERIVED_SHORT, "{:g} out of 5 average rating, {} reviews"),
+    (RATING_DERIVED_FIXED, "{:.2f} out of 5 average rating, {} reviews")
+)
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _text(value, sentinel):
+    return None if value is None or value == sentinel else value
+
+def room_id_from_url(url):
+    """Return the numeric room id from a listing URL as a string, or None (also for "No URL")."""
+    if not url:
+        return None
+    match = ROOM_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+def listing_room_id(listing):
+    """
+    Room id of a listing dict as a string, or None.
+
+    The decoder's room_id field wins; otherwise the id is read from the url.
+    """
+    room_id = listing.get("room_id")
+    if room_id is not None and str(room_id).isdigit():
+        return str(room_id)
+    return room_id_from_url(listing.get("url"))
+
+def listing_key(listing):
+    """
+    Key a listing dict is tracked by across runs and stores.
+
+    The room id where there is one. Cards without a room URL fall back to their
+    url, then their title, then a short hash of their text, so they neither
+    share one key through the "No URL" placeholder nor get dropped.
+    """
+    room_id = listing_room_id(listing)
+    if room_id is not None:
+        return room_id
+    url = _text(listing.get("url"), SENTINELS["url"])
+    if url:
+        return url.split("?", 1)[0]
+    title = _text(listing.get("title"), SENTINELS["title"])
+    if title:
+        return f"title:{title}"
+    content = [listing.get(name) for name in ("price_text", "rating", "thumbnail")]
+    return "card:" + hashlib.sha1(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _room_id(listing):
+    """listing_room_id as an int, for the typed room_ids column."""
+    room_id = listing_room_id(listing)
+    return int(room_id) if room_id is not None else None
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False)
+
+class Listing:
+    """
+    One scraped listing with typed fields instead of a dict of strings.
+
+    Missing fields are None rather than the "No title"-style placeholders, and
+    strings that repeat across listings (destination, feature, currency, price
+    lines) are interned so every record shares one copy.
+    """
+
+    __slots__ = ("room_id", "title", "price_text", "rating_text", "url", "thumbnail",
+                 "rating", "reviews", "nightly", "currency", "destination", "feature")
+
+    def __init__(self, room_id=None, title=None, price_text=None, rating_text=None, url=None, thumbnail=None,
+                 rating=None, reviews=0, nightly=None, currency=None, destination=None, feature=None):
+        self.room_id = room_id
+        self.title = title
+        self.price_text = _intern(price_text)
+        self.rating_text = rating_text
+        self.url = url
+        self.thumbnail = thumbnail
+        self.rating = rating
+        self.reviews = reviews
+        self.nightly = nightly
+        self.currency = _intern(currency)
+        self.destination = _intern(destination)
+        self.feature = _intern(feature)
+
+    @classmethod
+    def from_dict(cls, listing, destination=None, feature=None, nights=None):
+        """
+        Args:
+            listing (dict): Listing in the scraper's output shape
+            destination (str, optional), feature (str, optional): The search it came from
+            nights (int, optional): Length of stay, for parsing total prices
+        """
+        rating_text = _text(listing.get("rating"), SENTINELS["rating"])
+        rating, reviews = listing_rating(listing)
+        price_text = _text(listing.get("price_text"), SENTINELS["price_text"])
+        details = listing.get("price_details")
+        if not isinstance(details, dict):
+            details = parse_price(price_text, nights)
+        return cls(
+            room_id=_room_id(listing),
+            title=_text(listing.get("title"), SENTINELS["title"]),
+            price_text=price_text,
+            rating_text=rating_text,
+            url=_text(listing.get("url"), SENTINELS["url"]),
+            thumbnail=listing.get("thumbnail"),
+            rating=rating if rating_text is not None or listing.get("rating_value") is not None else None,
+            reviews=reviews,
+            nightly=details["nightly"],
+            currency=details["currency"],
+            destination=destination,
+            feature=feature
+        )
+
+    def to_dict(self):
+        """
+        The listing in the scraper's output shape, with the placeholders restored.
+
+        room_id, rating_value and reviews are included as the network decoder
+        writes them; price_details is left out since it is derived from price_text.
+        """
+        listing = {
+            "title": self.title if self.title is not None else SENTINELS["title"],
+            "price_text": self.price_text if self.price_text is not None else SENTINELS["price_text"],
+            "rating": self.rating_text if self.rating_text is not None else SENTINELS["rating"],
+            "url": self.url if self.url is not None else SENTINELS["url"],
+            "thumbnail": self.thumbnail
+        }
+        if self.room_id is not None:
+            listing["room_id"] = str(self.room_id)
+        if self.rating is not None:
+            listing["rating_value"] = self.rating
+            listing["reviews"] = self.reviews
+        return listing
+
+    def __repr__(self):
+        return f"Listing(room_id={self.room_id!r}, title={self.title!r}, rating={self.rating!r}, nightly={self.nightly!r})"
+
+class ListingBatch:
+    """
+    Columnar store for many listings from one search.
+
+    Numbers live in typed arrays (room id, rating, review count, nightly price),
+    text in one list per field, and destination and feature once per batch.
+    Room URLs and rating lines that match the site's usual wording are rebuilt
+    from the numeric columns on access rather than stored, so a large crawl
+    costs a fraction of the memory of one dict per listing.
+    Slicing returns a view over the same columns without copying, and rating,
+    review and price filters run on the typed columns.
+    """
+
+    NUMERIC_COLUMNS = ("room_ids", "ratings", "reviews", "nightly", "derived")
+    TEXT_COLUMNS = ("titles", "price_texts", "rating_texts", "urls", "thumbnails", "currencies")
+
+    def __init__(self, destination=None, feature=None, nights=None):
+        """
+        Args:
+            destination (str, optional), feature (str, optional): The search the listings came from
+            nights (int, optional): Length of stay, for parsing total prices of appended dicts
+        """
+        self.destination = _intern(destination)
+        self.feature = _intern(feature)
+        self.nights = nights
+        self.room_ids = array('q')
+        self.ratings = array('d')
+        self.reviews = array('q')
+        self.nightly = array('d')
+        self.derived = array('B')
+        self.titles = []
+        self.price_texts = []
+        self.rating_texts = []
+        self.urls = []
+        self.thumbnails = []
+        self.currencies = []
+        self._start = 0
+        self._stop = None
+        self._view = False
+
+    @classmethod
+    def from_listings(cls, listings, destination=None, feature=None, nights=None):
+        batch = cls(destination, feature, nights)
+        batch.extend(listings)
+        return batch
+
+    @classmethod
+    def from_result(cls, result):
+        """Batch from a scrape result dict ({"metadata", "listings"})."""
+        metadata = result.get("metadata") or {}
+        return cls.from_listings(
+            result.get("listings") or [], metadata.get("destination"), metadata.get("feature"),
+            nights_between(metadata.get("checkin"), metadata.get("checkout"))
+        )
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """
+        Load a snapshot file (or delta store directory) one listing at a time.
+
+        Returns:
+            tuple: (metadata, batch)
+        """
+        metadata = {}
+        batch = None
+        for kind, value in iter_records(path):
+            if kind == "metadata":
+                metadata = value
+            elif kind == "listing":
+                if batch is None:
+                    batch = cls(metadata.get("destination"), metadata.get("feature"),
+                                nights_between(metadata.get("checkin"), metadata.get("checkout")))
+                batch.append(value)
+        if batch is None:
+            batch = cls(metadata.get("destination"), metadata.get("feature"))
+        return metadata, batch
+
+    def __len__(self):
+        stop = len(self.room_ids) if self._stop is None else self._stop
+        return stop - self._start
+
+    def _index(self, i):
+        length = len(self)
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError("listing index out of range")
+        return self._start + i
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise TypeError("ListingBatch slices must be contiguous")
+            view = object.__new__(ListingBatch)
+            view.__dict__.update(self.__dict__)
+            view._start = self._start + start
+            view._stop = self._start + max(start, stop)
+            view._view = True
+            return view
+        i = self._index(key)
+        room_id = self.room_ids[i]
+        derived = self.derived[i]
+        rating_text = self.rating_texts[i]
+        for flag, template in RATING_TEMPLATES:
+            if derived & flag:
+                rating_text = template.format(self.ratings[i], self.reviews[i])
+        has_rating = rating_text is not None or self.ratings[i] > 0
+        nightly = self.nightly[i]
+        return Listing(
+            room_id=room_id if room_id != NO_ROOM_ID else None,
+            title=self.titles[i],
+            price_text=self.price_texts[i],
+            rating_text=rating_text,
+            url=LISTING_URL_TEMPLATE.format(room_id) if derived & URL_DERIVED else self.urls[i],
+            thumbnail=self.thumbnails[i],
+            rating=self.ratings[i] if has_rating else None,
+            reviews=self.reviews[i],
+            nightly=nightly if nightly == nightly else None,
+            currency=self.currencies[i],
+            destination=self.destination,
+            feature=self.feature
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, name):
+        """
+        Zero-copy view of a numeric column (room_ids, ratings, reviews, nightly or derived).
+
+        Release the memoryview (or let it go out of scope) before appending to
+        the batch; arrays cannot grow while a view of them is held.
+        """
+        if name not in self.NUMERIC_COLUMNS:
+            raise KeyError(name)
+        stop = len(self.room_ids) if self._stop is None else self._stop
+        return memoryview(getattr(self, name))[self._start:stop]
+
+    def append(self, listing):
+        """Add a listing dict (or Listing record)."""
+        if self._view:
+            raise TypeError("Cannot append to a ListingBatch slice")
+        if isinstance(listing, dict):
+            listing = Listing.from_dict(listing, nights=self.nights)
+        rating = listing.rating or 0.0
+        reviews = listing.reviews or 0
+        # Canonical room URLs and rating lines are rebuilt on access, not stored
+        derived = 0
+        url = listing.url
+        if listing.room_id is not None and url == LISTING_URL_TEMPLATE.format(listing.room_id):
+            derived |= URL_DERIVED
+            url = None
+        rating_text = listing.rating_text
+        if rating_text is not None and listing.rating is not None:
+            for flag, template in RATING_TEMPLATES:
+                if rating_text == template.format(rating, reviews):
+                    derived |= flag
+                    rating_text = None
+                    break
+        self.room_ids.append(listing.room_id if listing.room_id is not None else NO_ROOM_ID)
+        self.ratings.append(rating)
+        self.reviews.append(reviews)
+        self.nightly.append(listing.nightly if listing.nightly is not None else float("nan"))
+        self.derived.append(derived)
+        self.titles.append(listing.title)
+        self.price_texts.append(listing.price_text)
+        self.rating_texts.append(rating_text)
+        self.urls.append(url)
+        self.thumbnails.append(listing.thumbnail)
+        self.currencies.append(listing.currency)
+
+    def extend(self, listings, unique=False):
+        """
+        Add many listings; with unique=True, room ids already in the batch are skipped.
+
+        Returns:
+            int: Listings added
+        """
+        seen = {room_id for room_id in self.room_ids if room_id != NO_ROOM_ID} if unique else None
+        added = 0
+        for listing in listings:
+            if unique:
+                room_id = listing.room_id if isinstance(listing, Listing) else _room_id(listing)
+                if room_id is not None:
+                    if room_id in seen:
+                        continue
+                    seen.add(room_id)
+            self.append(listing)
+            added += 1
+        return added
+
+    def mask(self, min_rating=None, min_reviews=None, max_price=None):
+        """Boolean keep-mask computed on the typed columns."""
+        mask = threshold_mask(self.column("ratings"), self.column("reviews"),
+                              min_rating or 0.0, min_reviews or 0)
+        if max_price is not None:
+            # NaN compares false, so listings without a parsable price drop out
+            mask = [keep and price <= max_price for keep, price in zip(mask, self.column("nightly"))]
+        return mask
+
+    def select(self, mask):
+        """New batch with the rows where mask is true."""
+        selected = ListingBatch(self.destination, self.feature, self.nights)
+        for name in self.NUMERIC_COLUMNS + self.TEXT_COLUMNS:
+            source = getattr(self, name)
+            target = getattr(selected, name)
+            values = (source[self._start + i] for i, keep in enumerate(mask) if keep)
+            target.extend(values)
+        return selected
+
+    def filter(self, min_rating=4.8, min_reviews=50, max_price=None):
+        """filter_listings-style threshold filter, returning a new batch."""
+        return self.select(self.mask(min_rating, min_reviews, max_price))
+
+    def to_dicts(self):
+        """Yield each listing in the scraper's output shape (see Listing.to_dict)."""
+        for listing in self:
+            yield listing.to_dict()
+
+    def to_result(self, metadata=None):
+        return {"metadata": metadata or {}, "listings": list(self.to_dicts())}
+
+    def dump(self, path, metadata=None):
+        """
+        Write the batch as a snapshot file in the usual {"metadata", "listings"} shape.
+
+        Listings are encoded one at a time (with orjson when installed), so the
+        dict form of the whole batch never exists at once.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"metadata": ')
+            f.write(_dumps(metadata or {}))
+            f.write(', "listings": [')
+            for i, listing in enumerate(self.to_dicts()):
+                if i:
+                    f.write(", ")
+                f.write(_dumps(listing))
+            f.write("]}")
+
+def write_snapshot(path, result):
+    """Save a scrape result whose listings are a list of dicts or a ListingBatch."""
+    listings = result.get("listings")
+    if isinstance(listings, ListingBatch):
+        listings.dump(path, result.get("metadata"))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
@@ -0,0 +1,324 @@
+import glob
+import os
+import sqlite3
+import logging
+from datetime import datetime
+
+from filter_listings import iter_snapshot, listing_rating
+from listing_batch import listing_key
+from prices import nights_between, parse_price
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "listings.db")
+
+# Columns query() may sort by; order_by is checked against these rather than trusted as SQL
+ORDER_BY_COLUMNS = frozenset({
+    "room_id", "scraped_at", "destination", "checkin", "checkout", "title", "price", "rating", "reviews"
+})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    destination TEXT NOT NULL,
+    checkin TEXT,
+    checkout TEXT,
+    guests INTEGER,
+    feature TEXT,
+    scraped_at TEXT NOT NULL,
+    total_listings INTEGER,
+    source_file TEXT UNIQUE
+);
+CREATE TABLE IF NOT EXISTS listings (
+    room_id TEXT NOT NULL,
+    scraped_at TEXT NOT NULL,
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    destination TEXT NOT NULL,
+    checkin TEXT,
+    checkout TEXT,
+    title TEXT,
+    price_text TEXT,
+    price REAL,
+    rating_text TEXT,
+    rating REAL,
+    reviews INTEGER,
+    url TEXT,
+    thumbnail TEXT,
+    PRIMARY KEY (room_id, scraped_at)
+);
+CREATE INDEX IF NOT EXISTS idx_listings_destination ON listings (destination, scraped_at);
+CREATE INDEX IF NOT EXISTS idx_listings_dates ON listings (checkin, checkout);
+CREATE INDEX IF NOT EXISTS idx_listings_rating ON listings (rating);
+CREATE INDEX IF NOT EXISTS idx_listings_reviews ON listings (reviews);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+CREATE INDEX IF NOT EXISTS idx_listings_scraped_at ON listings (scraped_at);
+"""
+
+def _normalise_destination(destination):
+    return (destination or "").strip().lower()
+
+def _order_by(order_by):
+    """Rebuild an ORDER BY clause from whitelisted column names and directions."""
+    terms = []
+    for term in order_by.split(","):
+        words = term.split()
+        if not words or len(words) > 2 or words[0].lower() not in ORDER_BY_COLUMNS:
+            raise ValueError(f"Unsupported order_by term: {term.strip()!r}")
+        direction = words[1].upper() if len(words) == 2 else "ASC"
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"Unsupported sort direction: {words[1]!r}")
+        terms.append(f"{words[0].lower()} {direction}")
+    return ", ".join(terms)
+
+class ListingStore:
+    """
+    SQLite store of scraped listings, keyed by room id and snapshot time.
+
+    Replaces rescanning timestamped JSON dumps: snapshots are bulk-inserted in
+    one transaction each, and queries over destination, dates, rating, review
+    count and price hit indexes.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _rows(self, snapshot_id, metadata, scraped_at, listings):
+        destination = _normalise_destination(metadata.get("destination"))
+        nights = nights_between(metadata.get("checkin"), metadata.get("checkout"))
+        repeats = {}
+        for listing in listings:
+            room_id = listing_key(listing)
+            if not room_id.isdigit():
+                # Cards without a room id can share a fallback key (two untitled cards);
+                # number the repeats so INSERT OR REPLACE does not collapse them into one row
+                count = repeats[room_id] = repeats.get(room_id, 0) + 1
+                if count > 1:
+                    room_id = f"{room_id}#{count}"
+            rating, reviews = listing_rating(listing)
+            details = listing.get("price_details")
+            if not isinstance(details, dict):
+                details = parse_price(listing.get("price_text"), nights)
+            yield (
+                room_id,
+                scraped_at,
+                snapshot_id,
+                destination,
+                metadata.get("checkin"),
+                metadata.get("checkout"),
+                listing.get("title"),
+                listing.get("price_text"),
+                details["nightly"],
+                listing.get("rating"),
+                rating,
+                reviews,
+                listing.get("url"),
+                listing.get("thumbnail")
+            )
+
+    def add_snapshot(self, metadata, listings, source_file=None):
+        """
+        Insert one scrape result in a single transaction.
+
+        Args:
+            metadata (dict): The result's metadata (destination, dates, timestamp, ...)
+            listings (iterable): Listing dicts; may be a generator
+            source_file (str, optional): Snapshot file the data came from; importing
+                the same file twice is a no-op
+
+        Returns:
+            int or None: Snapshot id, or None if source_file was already imported
+        """
+        scraped_at = metadata.get("timestamp") or datetime.now().isoformat()
+        with self.conn:
+            if source_file is not None:
+                existing = self.conn.execute(
+                    "SELECT id FROM snapshots WHERE source_file = ?", (source_file,)
+                ).fetchone()
+                if existing:
+                    return None
+            cursor = self.conn.execute(
+                "INSERT INTO snapshots (destination, checkin, checkout, guests, feature, "
+                "scraped_at, total_listings, source_file) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _normalise_destination(metadata.get("destination")),
+                    metadata.get("checkin"),
+                    metadata.get("checkout"),
+                    metadata.get("guests"),
+                    metadata.get("feature"),
+                    scraped_at,
+                    metadata.get("total_listings"),
+                    source_file
+                )
+            )
+            snapshot_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._rows(snapshot_id, metadata, scraped_at, listings)
+            )
+        return snapshot_id
+
+    def add_result(self, result, source_file=None):
+        """Insert a scrape_airbnb_with_got_it result dict."""
+        return self.add_snapshot(result.get("metadata") or {}, result.get("listings") or [], source_file)
+
+    def import_file(self, path):
+        """
+        Import one airbnb_listings_*.json snapshot, streaming its listings.
+
+        Returns:
+            int or None: Snapshot id, or None if the file was already imported or empty
+        """
+        source_file = os.path.abspath(path)
+        entries = iter_snapshot(path)
+        kind, metadata = next(entries, (None, None))
+        if kind != "metadata":
+            logger.warning(f"{path} has no metadata block first; skipping")
+            return None
+        if not metadata.get("destination"):
+            return None
+        return self.add_snapshot(
+            metadata, (value for kind, value in entries if kind == "listing"), source_file
+        )
+
+    def import_files(self, pattern="airbnb_listings_*.json"):
+        """
+        Import every snapshot matching a glob pattern (already imported files are skipped).
+
+        Returns:
+            dict: Counts of imported, skipped and failed files
+        """
+        counts = {"imported": 0, "skipped": 0, "failed": 0}
+        for path in sorted(glob.glob(pattern)):
+            try:
+                if self.import_file(path) is None:
+                    counts["skipped"] += 1
+                else:
+                    counts["imported"] += 1
+            except Exception as e:
+                logger.error(f"Error importing {path}: {e}")
+                counts["failed"] += 1
+        return counts
+
+    def query(self, destination=None, min_rating=None, min_reviews=None, min_price=None,
+              max_price=None, checkin=None, checkout=None, since=None, until=None,
+              latest_only=True, order_by="rating DESC, reviews DESC", limit=None):
+        """
+        Find listings matching the given filters.
+
+        Args:
+            destination (str, optional): Destination as searched (case-insensitive)
+            min_rating (float, optional): Minimum numeric rating
+            min_reviews (int, optional): Minimum review count
+            min_price, max_price (float, optional): Bounds on the parsed price
+            checkin, checkout (str, optional): Exact search dates
+            since, until (str, optional): ISO timestamps bounding when the listing was scraped
+            latest_only (bool): Return only the most recent sighting of each room
+            order_by (str): ORDER BY clause, e.g. "price ASC, rating DESC", over the
+                columns in ORDER_BY_COLUMNS
+            limit (int, optional): Maximum rows to return
+
+        Returns:
+            list: Listing dicts with the scraped fields plus room_id, price, rating_value,
+                reviews and scraped_at
+
+        Raises:
+            ValueError: If order_by names an unknown column or direction
+        """
+        # Which sightings are considered: the newest sighting per room is picked
+        # among these before the listing attributes below are filtered on
+        scope = []
+        params = []
+        if destination is not None:
+            scope.append("destination = ?")
+            params.append(_normalise_destination(destination))
+        if checkin is not None:
+            scope.append("checkin = ?")
+            params.append(checkin)
+        if checkout is not None:
+            scope.append("checkout = ?")
+            params.append(checkout)
+        if since is not None:
+            scope.append("scraped_at >= ?")
+            params.append(since)
+        if until is not None:
+            scope.append("scraped_at <= ?")
+            params.append(until)
+
+        clauses = []
+        if min_rating is not None:
+            clauses.append("rating >= ?")
+            params.append(min_rating)
+        if min_reviews is not None:
+            clauses.append("reviews >= ?")
+            params.append(min_reviews)
+        if min_price is not None:
+            clauses.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append("price <= ?")
+            params.append(max_price)
+
+        if latest_only:
+            # Partition before filtering, so a room whose newest sighting no longer
+            # matches is dropped rather than served from an older one
+            sql = (
+                "SELECT * FROM (SELECT *, ROW_NUMBER() OVER "
+                "(PARTITION BY room_id ORDER BY scraped_at DESC) AS sighting "
+                f"FROM listings WHERE {' AND '.join(scope) or '1'}) "
+                f"WHERE {' AND '.join(['sighting = 1'] + clauses)}"
+            )
+        else:
+            sql = f"SELECT * FROM listings WHERE {' AND '.join(scope + clauses) or '1'}"
+        sql += f" ORDER BY {_order_by(order_by)}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return [self._to_listing(row) for row in self.conn.execute(sql, params)]
+
+    @staticmethod
+    def _to_listing(row):
+        return {
+            "title": row["title"],
+            "price_text": row["price_text"],
+            "rating": row["rating_text"],
+            "url": row["url"],
+            "thumbnail": row["thumbnail"],
+            "room_id": row["room_id"],
+            "price": row["price"],
+            "rating_value": row["rating"],
+            "reviews": row["reviews"],
+            "destination": row["destination"],
+            "scraped_at": row["scraped_at"]
+        }
+
+    def stats(self):
+        """Row counts for the store."""
+        snapshots = self.conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+        rows = self.conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+        rooms = self.conn.execute("SELECT COUNT(DISTINCT room_id) FROM listings").fetchone()[0]
+        return {"snapshots": snapshots, "listing_rows": rows, "rooms": rooms}
+
+if __name__ == "__main__":
+    import sys
+
+    pattern = sys.argv[1] if len(sys.argv) > 1 else "airbnb_listings_*.json"
+    with ListingStore() as store:
+        counts = store.import_files(pattern)
+        print(f"Imported {counts['imported']} snapshots "
+              f"({counts['skipped']} already imported, {counts['failed']} failed)")
+        print(store.stats())
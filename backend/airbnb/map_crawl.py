@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+import httpx
+
+from http_fetch import default_client, embedded_payloads, fetch_listings_http
+from listing_batch import ListingBatch, listing_key, write_snapshot
+from prices import nights_between
+from search_query import BASE_URL, build_search_url
+from tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tiles")
+# The site serves at most this many result pages per search; a tile that fills
+# all of them may hide more listings and is split into four
+MAX_RESULT_PAGES = 15
+# Eight levels split a city-sized box into tiles of a few hundred metres
+DEFAULT_MAX_DEPTH = 8
+DEFAULT_MAX_WORKERS = 8
+
+BOUNDS_PARAMS = ("sw_lat", "sw_lng", "ne_lat", "ne_lng")
+
+metrics.describe("airbnb_map_tiles_total", "Map tiles searched, by outcome (leaf, split, failed)")
+
+def tile_params(bounds):
+    """Query parameters for a search restricted to the map box (sw_lat, sw_lng, ne_lat, ne_lng)."""
+    params = {name: f"{value:.6f}" for name, value in zip(BOUNDS_PARAMS, bounds)}
+    params["search_by_map"] = "true"
+    params["search_type"] = "user_map_move"
+    return params
+
+def subdivide(bounds):
+    """Split a box into its four quadrants (south-west, south-east, north-west, north-east)."""
+    sw_lat, sw_lng, ne_lat, ne_lng = bounds
+    mid_lat, mid_lng = (sw_lat + ne_lat) / 2, (sw_lng + ne_lng) / 2
+    return [
+        (sw_lat, sw_lng, mid_lat, mid_lng),
+        (sw_lat, mid_lng, mid_lat, ne_lng),
+        (mid_lat, sw_lng, ne_lat, mid_lng),
+        (mid_lat, mid_lng, ne_lat, ne_lng)
+    ]
+
+def index_path(destination, feature=None, budget=None, root=DEFAULT_TILE_DIR):
+    """
+    Tile index file for a destination and filter set, e.g. .tiles/lisbon_3f2a9c0d1e4b.json.
+
+    Dates and guests are left out of the key: which parts of a city are dense
+    barely changes between stays, so every later crawl of it can start from the
+    same tiles.
+    """
+    key = json.dumps([destination.strip().lower(), feature, budget])
+    slug = re.sub(r"[^a-z0-9]+", "_", destination.strip().lower()).strip("_") or "search"
+    return os.path.join(root, f"{slug}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}.json")
+
+class TileIndex:
+    """
+    Persisted result of a quadtree crawl: the searched area and the tiles it ended up split into.
+
+    Leaves are the tiles that were searched to the last page (under the result
+    cap, at the depth limit, or failed); dense tiles are the ones that hit the
+    cap and were split. A later crawl starts from the leaves, so it skips the
+    searches that would only rediscover the split.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {"bounds": None, "leaves": [], "dense": [], "updated": None}
+
+    @property
+    def bounds(self):
+        return tuple(self.data["bounds"]) if self.data.get("bounds") else None
+
+    def frontier(self):
+        """
+        Returns:
+            list: (bounds, depth) of every leaf tile from the last crawl
+        """
+        return [(tuple(tile["bounds"]), tile["depth"]) for tile in self.data["leaves"]]
+
+    def save(self, bounds, leaves, dense):
+        with self._lock:
+            self.data = {
+                "bounds": list(bounds),
+                "leaves": leaves,
+                "dense": dense,
+                "updated": datetime.now().isoformat()
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+def _find_map_bounds(node):
+    if isinstance(node, dict):
+        found = node.get("mapBounds")
+        if isinstance(found, dict) and all(name in found for name in BOUNDS_PARAMS):
+            return tuple(float(found[name]) for name in BOUNDS_PARAMS)
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _find_map_bounds(child)
+        if found is not None:
+            return found
+    return None
+
+def resolve_bounds(search, client=None):
+    """
+    Map box of a destination, read from its search page.
+
+    The site moves the map to the destination and reports the box either in
+    the URL it redirects to (ne_lat/ne_lng/sw_lat/sw_lng) or as mapBounds in
+    the embedded search state.
+
+    Returns:
+        tuple: (sw_lat, sw_lng, ne_lat, ne_lng)
+
+    Raises:
+        ValueError: If the page does not give the box; pass bounds explicitly then
+    """
+    client = client or default_client()
+    url, _ = build_search_url(
+        search["destination"], search["checkin"], search["checkout"], search["guests"],
+        base_url=search.get("base_url") or BASE_URL
+    )
+    try:
+        response = client.fetch(url)
+    except httpx.HTTPError as e:
+        raise ValueError(f"Could not load {url} to find the map bounds: {e}")
+    params = parse_qs(urlparse(str(response.url)).query)
+    if all(name in params for name in BOUNDS_PARAMS):
+        return tuple(float(params[name][0]) for name in BOUNDS_PARAMS)
+    for payload in embedded_payloads(response.text):
+        bounds = _find_map_bounds(payload)
+        if bounds:
+            return bounds
+    raise ValueError(f"No map bounds for {search['destination']}; pass them explicitly")
+
+def search_tile(search, bounds, depth, max_depth=DEFAULT_MAX_DEPTH, client=None):
+    """
+    Search one map tile over HTTP.
+
+    A tile whose first page already shows the result cap is not paged any
+    further when it is going to be split, since its quadrants will find those
+    listings again; every other tile is read to its last page.
+
+    Returns:
+        dict: bounds, depth, listings, saturated (the tile hit the cap), requests
+            and error (None on success)
+    """
+    params = tile_params(bounds)
+    tile = {"bounds": bounds, "depth": depth, "listings": [], "saturated": False, "requests": 1, "error": None}
+    listings, info = fetch_listings_http(dict(search, extra_params=params), client)
+    if not listings:
+        reason = info.get("fallback_reason")
+        # An empty stretch of the map (water, parks) is a valid, finished tile
+        if reason != "no_listings":
+            tile["error"] = reason
+        return tile
+
+    cursors = (info.get("pagination") or {}).get("page_cursors") or []
+    tile["listings"] = listings
+    tile["saturated"] = len(cursors) >= MAX_RESULT_PAGES
+    if tile["saturated"] and depth < max_depth:
+        return tile
+    for cursor in cursors[1:]:
+        page, page_info = fetch_listings_http(dict(search, extra_params={**params, "cursor": cursor}), client)
+        tile["requests"] += 1
+        if not page:
+            tile["error"] = page_info.get("fallback_reason")
+            break
+        tile["listings"].extend(page)
+    return tile
+
+def crawl_map(destination, checkin, checkout, guests, feature=None, budget=None, bounds=None,
+              max_depth=DEFAULT_MAX_DEPTH, max_workers=DEFAULT_MAX_WORKERS, base_url=None,
+              index_root=DEFAULT_TILE_DIR, reuse_index=True, compact=False, client=None):
+    """
+    Crawl a destination as map tiles to get past the per-search result cap.
+
+    The destination's map box is searched with bounding-box queries, and every
+    tile that fills the site's result pages is split into four, recursively,
+    until each tile's listings fit under the cap or max_depth is reached.
+    Tiles are searched in parallel over the HTTP fast path and merged with
+    room-id dedupe. The final tiles are persisted per destination, so the
+    next crawl starts from the known dense areas instead of the whole box.
+
+    Args:
+        destination, checkin, checkout, guests, feature, budget: Same as scrape_airbnb_with_got_it;
+            the feature has to have a learned category tag, since tiles are URL-only
+        bounds (tuple, optional): (sw_lat, sw_lng, ne_lat, ne_lng); taken from the
+            tile index or the destination's search page if omitted
+        max_depth (int): Deepest subdivision; tiles there are paged to the cap and reported as truncated
+        max_workers (int): Tiles searched at once
+        base_url (str, optional): Search root, e.g. a local replay server
+        index_root (str): Directory of tile indexes
+        reuse_index (bool): Start from the tiles of the last crawl of this destination
+        compact (bool): Return the listings as a ListingBatch (see crawl_airbnb)
+        client (HttpSearchClient, optional): Defaults to the shared client
+
+    Returns:
+        dict: Dictionary containing listings and metadata
+    """
+    started = time.perf_counter()
+    client = client or default_client()
+    search = {
+        "destination": destination,
+        "checkin": checkin,
+        "checkout": checkout,
+        "guests": guests,
+        "feature": feature,
+        "budget": budget,
+        "base_url": base_url
+    }
+    index = TileIndex(index_path(destination, feature, budget, index_root))
+    reused = reuse_index and bool(index.data["leaves"]) and (bounds is None or tuple(bounds) == index.bounds)
+    if reused:
+        bounds = index.bounds
+        frontier = index.frontier()
+    else:
+        bounds = tuple(bounds) if bounds else resolve_bounds(search, client)
+        frontier = [(bounds, 0)]
+    logger.info(f"Crawling {destination} map {bounds} from {len(frontier)} tiles"
+                f"{' (reused index)' if reused else ''}")
+
+    merged = ListingBatch(destination, feature, nights_between(checkin, checkout)) if compact else {}
+    leaves, dense, failed, truncated = [], [], [], []
+    requests = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(search_tile, search, tile, depth, max_depth, client) for tile, depth in frontier}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                tile = future.result()
+                requests += tile["requests"]
+                if compact:
+                    merged.extend(tile["listings"], unique=True)
+                else:
+                    for listing in tile["listings"]:
+                        merged.setdefault(listing_key(listing), listing)
+                record = {
+                    "bounds": list(tile["bounds"]),
+                    "depth": tile["depth"],
+                    "listings": len(tile["listings"]),
+                    "saturated": tile["saturated"]
+                }
+                if tile["saturated"] and tile["depth"] < max_depth:
+                    metrics.inc("airbnb_map_tiles_total", outcome="split")
+                    dense.append(record)
+                    for child in subdivide(tile["bounds"]):
+                        pending.add(executor.submit(search_tile, search, child, tile["depth"] + 1, max_depth, client))
+                    continue
+                if tile["error"]:
+                    metrics.inc("airbnb_map_tiles_total", outcome="failed")
+                    logger.warning(f"Tile {tile['bounds']} failed: {tile['error']}")
+                    record["error"] = tile["error"]
+                    failed.append(record["bounds"])
+                else:
+                    metrics.inc("airbnb_map_tiles_total", outcome="leaf")
+                if tile["saturated"]:
+                    truncated.append(record["bounds"])
+                leaves.append(record)
+
+    # Failed tiles stay leaves, so the next crawl retries them. A reused crawl only
+    # splits tiles that got denser since, so the splits found before are kept
+    history = index.data.get("dense", []) if reused else []
+    split_now = {tuple(record["bounds"]) for record in dense}
+    index.save(bounds, leaves, [record for record in history if tuple(record["bounds"]) not in split_now] + dense)
+    listings = merged if compact else list(merged.values())
+    metadata = {
+        "destination": destination,
+        "checkin": checkin,
+        "checkout": checkout,
+        "guests": guests,
+        "feature": feature,
+        "timestamp": datetime.now().isoformat(),
+        "total_listings": len(listings),
+        "bounds": list(bounds),
+        "tile_index": index.path,
+        "reused_index": reused,
+        "tiles_searched": len(leaves) + len(dense),
+        "tiles_split": len(dense),
+        "max_depth_reached": max((tile["depth"] for tile in leaves), default=0),
+        "failed_tiles": failed,
+        "truncated_tiles": truncated,
+        "requests": requests,
+        "crawl_seconds": round(time.perf_counter() - started, 3)
+    }
+    logger.info(f"Map crawl found {len(listings)} listings in {metadata['tiles_searched']} tiles "
+                f"({requests} requests, {metadata['crawl_seconds']}s)")
+    return {"metadata": metadata, "listings": listings}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Crawl an Airbnb destination as quadtree map tiles.")
+    parser.add_argument("destination")
+    parser.add_argument("checkin")
+    parser.add_argument("checkout")
+    parser.add_argument("guests", type=int)
+    parser.add_argument("--feature", default=None)
+    parser.add_argument("--budget", type=int, default=None)
+    parser.add_argument("--bounds", type=float, nargs=4, metavar=("SW_LAT", "SW_LNG", "NE_LAT", "NE_LNG"))
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH)
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--base-url", default=None, help="Search root, e.g. a local replay server")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the tile index of earlier crawls")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    result = crawl_map(args.destination, args.checkin, args.checkout, args.guests, args.feature, args.budget,
+                       bounds=args.bounds, max_depth=args.max_depth, max_workers=args.workers,
+                       base_url=args.base_url, reuse_index=not args.fresh, compact=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output = args.output or f"airbnb_map_{args.destination.lower().replace(' ', '_')}_{timestamp}.json"
+    write_snapshot(output, result)
+    metadata = result["metadata"]
+    print(f"{metadata['total_listings']} listings from {metadata['tiles_searched']} tiles "
+          f"({metadata['requests']} requests) saved to {output}")
@@ -0,0 +1,261 @@
+import base64
+import binascii
+import glob
+import json
+import os
+import re
+import logging
+
+from filter_listings import parse_rating
+from prices import nights_between, parse_price
+from resource_blocking import network_events
+
+logger = logging.getLogger(__name__)
+
+# Search API operations whose responses carry the result list
+SEARCH_API_PATTERNS = [
+    re.compile(r"/api/v3/StaysSearch"),
+    re.compile(r"/api/v3/ExploreSearch"),
+    re.compile(r"/api/v3/StaysMapS2Search")
+]
+
+LISTING_URL_TEMPLATE = "https://www.airbnb.com/rooms/{room_id}"
+
+# "4.92 (120)" as rendered in avgRatingLocalized
+LOCALIZED_RATING_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*\((\d[\d,]*)\)")
+# Relay ids are base64 strings such as "DemandStayListing:12345"
+RELAY_ID_PATTERN = re.compile(r":(\d+)$")
+
+def is_search_api_url(url):
+    """True if the URL is one of the search API operations decoded here."""
+    return any(pattern.search(url or "") for pattern in SEARCH_API_PATTERNS)
+
+def capture_search_responses(driver, events=None):
+    """
+    Collect the JSON bodies of search API responses the page has fetched.
+
+    Request ids come from Chrome's performance log; each body is then read with
+    Network.getResponseBody. Bodies Chrome has already evicted are skipped.
+
+    Args:
+        driver: Selenium WebDriver instance with the performance log enabled
+        events (list, optional): (method, params) tuples already drained from the
+            log (see resource_blocking.network_events); read from the driver if omitted
+
+    Returns:
+        list: (url, payload) tuples in the order the responses finished
+    """
+    if events is None:
+        events = network_events(driver)
+
+    urls = {}
+    finished = []
+    for method, params in events:
+        request_id = params.get("requestId")
+        if method == "Network.responseReceived":
+            url = params.get("response", {}).get("url", "")
+            if is_search_api_url(url):
+                urls[request_id] = url
+        elif method == "Network.loadingFinished" and request_id in urls:
+            finished.append(request_id)
+
+    responses = []
+    for request_id in finished:
+        try:
+            body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception as e:
+            logger.info(f"Response body for {urls[request_id]} unavailable: {e}")
+            continue
+        text = body.get("body", "")
+        if body.get("base64Encoded"):
+            text = base64.b64decode(text).decode("utf-8", errors="replace")
+        try:
+            responses.append((urls[request_id], json.loads(text)))
+        except ValueError:
+            logger.info(f"Response from {urls[request_id]} is not JSON")
+    return responses
+
+def _find_key(node, key):
+    """Depth-first search for the first value stored under `key`."""
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+def _get(node, *path):
+    for key in path:
+        if isinstance(node, dict):
+            node = node.get(key)
+        elif isinstance(node, list) and isinstance(key, int) and -len(node) <= key < len(node):
+            node = node[key]
+        else:
+            return None
+    return node
+
+def _room_id(result):
+    for candidate in (
+        _get(result, "listing", "id"),
+        _get(result, "demandStayListing", "id"),
+        _get(result, "propertyId")
+    ):
+        if candidate is None:
+            continue
+        candidate = str(candidate)
+        if candidate.isdigit():
+            return candidate
+        try:
+            decoded = base64.b64decode(candidate + "=" * (-len(candidate) % 4)).decode("utf-8")
+        except (binascii.Error, UnicodeDecodeError):
+            continue
+        match = RELAY_ID_PATTERN.search(decoded)
+        if match:
+            return match.group(1)
+    return None
+
+def _title(result):
+    for candidate in (
+        _get(result, "title"),
+        _get(result, "listing", "title"),
+        _get(result, "nameLocalized", "localizedStringWithTranslationPreference"),
+        _get(result, "demandStayListing", "description", "name", "localizedStringWithTranslationPreference"),
+        _get(result, "listing", "name")
+    ):
+        if candidate:
+            return candidate
+    return None
+
+def _price_text(result):
+    """Rebuild the card's price line, e.g. "$150 $120 night · $480 total"."""
+    display = _get(result, "structuredDisplayPrice") or _get(result, "pricingQuote", "structuredStayDisplayPrice")
+    if not display:
+        return None
+    primary = display.get("primaryLine") or {}
+    qualifier = primary.get("qualifier") or ""
+    original = primary.get("originalPrice")
+    current = primary.get("discountedPrice") or primary.get("price")
+    if not current:
+        return primary.get("accessibilityLabel")
+    parts = [original, current] if original else [current]
+    text = " ".join(parts + ([qualifier] if qualifier else []))
+    secondary = _get(display, "secondaryLine", "price")
+    if secondary:
+        text += f" · {secondary}"
+    return text
+
+def _rating(result):
+    """
+    Returns:
+        tuple: (rating text in the DOM card wording, rating, reviews)
+    """
+    label = _get(result, "avgRatingA11yLabel")
+    localized = _get(result, "avgRatingLocalized") or _get(result, "listing", "avgRatingLocalized")
+    match = LOCALIZED_RATING_PATTERN.search(localized or "") or LOCALIZED_RATING_PATTERN.search(label or "")
+    if match:
+        rating = float(match.group(1).replace(",", "."))
+        reviews = int(match.group(2).replace(",", ""))
+    else:
+        rating, reviews = parse_rating(label)
+    if not label and rating:
+        label = f"{rating} out of 5 average rating, {reviews} reviews"
+    return label, rating, reviews
+
+def _thumbnail(result):
+    pictures = _get(result, "contextualPictures") or _get(result, "listing", "contextualPictures") or []
+    return _get(pictures, 0, "picture")
+
+def decode_search_payload(payload, nights=None):
+    """
+    Decode one search API response into listing dicts.
+
+    The dicts have the same shape as the DOM extractors' (title, price_text, rating,
+    url, thumbnail) so everything downstream keeps working, plus the numeric fields
+    the DOM only offers as text: room_id, rating_value, reviews and price_details.
+
+    Args:
+        payload (dict): Parsed JSON body of a search API response
+        nights (int, optional): Length of stay, used when parsing total prices
+
+    Returns:
+        tuple: (listings, pagination) where pagination has next_cursor and page_cursors
+    """
+    results = _find_key(payload, "searchResults") or []
+    listings = []
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        room_id = _room_id(result)
+        if room_id is None:
+            # Ads and promotional inserts have no listing behind them
+            continue
+        price_text = _price_text(result)
+        rating_text, rating, reviews = _rating(result)
+        listings.append({
+            "title": _title(result) or "No title",
+            "price_text": price_text or "No price",
+            "rating": rating_text or "No rating",
+            "url": LISTING_URL_TEMPLATE.format(room_id=room_id),
+            "thumbnail": _thumbnail(result),
+            "room_id": room_id,
+            "rating_value": rating,
+            "reviews": reviews,
+            "price_details": parse_price(price_text, nights)
+        })
+
+    pagination_info = _find_key(payload, "paginationInfo") or {}
+    pagination = {
+        "next_cursor": pagination_info.get("nextPageCursor"),
+        "page_cursors": list(pagination_info.get("pageCursors") or [])
+    }
+    return listings, pagination
+
+def listings_from_responses(responses, search=None):
+    """
+    Decode the most recent search response that has results.
+
+    Filter changes on the page (the Filters modal, the category bar) each trigger
+    a new search request, so the last response reflects the final filter state.
+
+    Returns:
+        tuple: (listings, pagination), or ([], None) if no response had results
+    """
+    search = search or {}
+    nights = nights_between(search.get("checkin"), search.get("checkout"))
+    for _, payload in reversed(responses):
+        listings, pagination = decode_search_payload(payload, nights)
+        if listings:
+            return listings, pagination
+    return [], None
+
+def save_responses(responses, directory):
+    """
+    Record captured responses as numbered JSON files for the replay server.
+
+    Returns:
+        list: Paths written
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, (url, payload) in enumerate(responses, start=1):
+        path = os.path.join(directory, f"search_response_{i:03d}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"url": url, "payload": payload}, f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+def load_responses(directory):
+    """Load responses recorded by save_responses, in file order."""
+    responses = []
+    for path in sorted(glob.glob(os.path.join(directory, "search_response_*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+        responses.append((recorded["url"], recorded["payload"]))
+    return responses
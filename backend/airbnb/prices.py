@@ -0,0 +1,209 @@
+import re
+from array import array
+from datetime import date
+
+from search_query import budget_window
+
+# Longest symbols first so "CA$" is not read as "$"
+CURRENCY_SYMBOLS = {
+    "US$": "USD",
+    "CA$": "CAD",
+    "A$": "AUD",
+    "NZ$": "NZD",
+    "HK$": "HKD",
+    "MX$": "MXN",
+    "R$": "BRL",
+    "$": "USD",
+    "€": "EUR",
+    "£": "GBP",
+    "¥": "JPY",
+    "₹": "INR",
+    "₩": "KRW",
+    "₺": "TRY",
+    "฿": "THB",
+    "₱": "PHP",
+    "zł": "PLN",
+    "Kč": "CZK",
+    "kr": "SEK"
+}
+
+_SYMBOLS = "|".join(re.escape(s) for s in sorted(CURRENCY_SYMBOLS, key=len, reverse=True))
+# Space-grouped thousands ("1 234") first, then plain or punctuated numbers
+_NUMBER = r"\d{1,3}(?: \d{3})+(?:[.,]\d+)?|\d[\d.,]*\d|\d"
+AMOUNT_PATTERN = re.compile(
+    rf"(?P<pre>{_SYMBOLS})\s?(?P<amount>{_NUMBER})|(?P<amount2>{_NUMBER})\s?(?P<post>{_SYMBOLS})"
+)
+FOR_NIGHTS_PATTERN = re.compile(r"for\s+(\d+)\s+nights?")
+ORIGINAL_PATTERN = re.compile(r"(originally|was|previous price|before discount)\s*:?\s*$")
+
+def _to_number(text):
+    """Parse "1,234", "1.234,56", "1,234.56", "1 234" or "95,5" into a float."""
+    text = text.replace(" ", "")
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        # A trailing group of exactly three digits is a thousands separator
+        if re.search(r",\d{3}$", text):
+            text = text.replace(",", "")
+        else:
+            text = text.replace(",", ".")
+    elif re.search(r"\.\d{3}$", text):
+        text = text.replace(".", "")
+    return float(text)
+
+def nights_between(checkin, checkout):
+    """Number of nights between two YYYY-MM-DD dates, or None."""
+    try:
+        nights = (date.fromisoformat(str(checkout)) - date.fromisoformat(str(checkin))).days
+    except (TypeError, ValueError):
+        return None
+    return nights if nights > 0 else None
+
+def parse_price(price_text, nights=None):
+    """
+    Normalise a scraped price_text into numbers.
+
+    Handles the variants Airbnb renders, e.g. "$120 night", "$150 $120 night"
+    (struck-through original then discounted), "$480 total", "$480 for 4 nights",
+    "$120 night · $480 total before taxes" and other currency symbols.
+
+    Args:
+        price_text (str): Raw price text from a listing card
+        nights (int, optional): Length of stay, used to derive nightly from total and back;
+            an explicit "for N nights" in the text takes precedence
+
+    Returns:
+        dict: nightly, total, original_nightly, original_total (floats or None),
+            currency, nights, discounted, and derived (True if nightly or total was computed)
+    """
+    parsed = {
+        "nightly": None,
+        "total": None,
+        "original_nightly": None,
+        "original_total": None,
+        "currency": None,
+        "nights": nights,
+        "discounted": False,
+        "derived": False
+    }
+    if not price_text or price_text == "No price":
+        return parsed
+
+    text = " ".join(price_text.split())
+    lowered = text.lower()
+    matches = list(AMOUNT_PATTERN.finditer(text))
+    if not matches:
+        return parsed
+
+    amounts = []
+    for i, match in enumerate(matches):
+        symbol = match.group("pre") or match.group("post")
+        try:
+            value = _to_number(match.group("amount") or match.group("amount2"))
+        except ValueError:
+            continue
+        label_end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        label = lowered[match.end():label_end]
+        before = lowered[matches[i - 1].end() if i else 0:match.start()]
+
+        for_nights = FOR_NIGHTS_PATTERN.search(label)
+        if for_nights:
+            kind = "total"
+            # The stay the site priced beats the one the caller assumed
+            parsed["nights"] = int(for_nights.group(1))
+        elif "total" in label:
+            kind = "total"
+        elif "night" in label:
+            kind = "nightly"
+        else:
+            kind = None
+        original = bool(ORIGINAL_PATTERN.search(before))
+        amounts.append({"value": value, "kind": kind, "original": original, "symbol": symbol})
+
+    if not amounts:
+        return parsed
+    parsed["currency"] = CURRENCY_SYMBOLS.get(amounts[0]["symbol"])
+
+    # "originally $X" after a labeled amount is that amount's original ("$480 total, originally $600")
+    for previous, current in zip(amounts, amounts[1:]):
+        if current["kind"] is None and current["original"] and previous["kind"] is not None:
+            current["kind"] = previous["kind"]
+
+    # An unlabeled amount right before a labeled one is its struck-through original
+    for current, following in zip(amounts, amounts[1:]):
+        if current["kind"] is None and following["kind"] is not None:
+            current["kind"] = following["kind"]
+            current["original"] = True
+
+    for amount in amounts:
+        kind = amount["kind"] or "nightly"
+        key = f"original_{kind}" if amount["original"] else kind
+        if parsed[key] is None:
+            parsed[key] = amount["value"]
+
+    for kind in ("nightly", "total"):
+        original = parsed[f"original_{kind}"]
+        if original is not None and parsed[kind] is not None and parsed[kind] < original:
+            parsed["discounted"] = True
+
+    stay = parsed["nights"]
+    if stay:
+        if parsed["nightly"] is None and parsed["total"] is not None:
+            parsed["nightly"] = round(parsed["total"] / stay, 2)
+            parsed["derived"] = True
+        elif parsed["total"] is None and parsed["nightly"] is not None:
+            parsed["total"] = round(parsed["nightly"] * stay, 2)
+            parsed["derived"] = True
+    return parsed
+
+def annotate_prices(result):
+    """
+    Parse every listing's price_text in a snapshot, adding a "price_details" dict to each listing.
+
+    Args:
+        result (dict): Scrape result with metadata and listings (modified in place)
+
+    Returns:
+        array: Nightly prices as a float column aligned with result["listings"]
+            (NaN where no price could be parsed)
+    """
+    metadata = result.get("metadata") or {}
+    nights = nights_between(metadata.get("checkin"), metadata.get("checkout"))
+    nightly = array('d')
+    for listing in result.get("listings", []):
+        parsed = listing.get("price_details")
+        if not isinstance(parsed, dict):
+            parsed = listing["price_details"] = parse_price(listing.get("price_text"), nights)
+        nightly.append(parsed["nightly"] if parsed["nightly"] is not None else float("nan"))
+    return nightly
+
+def apply_budget_window(result, budget, window=None):
+    """
+    Filter a scrape result to a budget locally instead of through the site's price filter.
+
+    Uses the same +/- window as the Filters modal path (see search_query.budget_window),
+    so one unfiltered scrape can answer any number of budget requests.
+
+    Args:
+        result (dict): Unfiltered scrape result
+        budget (int): Nightly budget
+        window (tuple, optional): Explicit (min_price, max_price) instead of the budget window
+
+    Returns:
+        dict: A new result containing only listings whose nightly price is in the window
+    """
+    low, high = window or budget_window(budget)
+    nightly = annotate_prices(result)
+    # NaN compares false, so listings without a parsable price drop out here
+    listings = [
+        listing for listing, price in zip(result.get("listings", []), nightly)
+        if low <= price <= high
+    ]
+    metadata = dict(result.get("metadata") or {})
+    metadata["budget_window"] = {"budget": budget, "min_price": low, "max_price": high}
+    metadata["unfiltered_listings"] = len(nightly)
+    metadata["total_listings"] = len(listings)
+    return {"metadata": metadata, "listings": listings}
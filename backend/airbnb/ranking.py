@@ -0,0 +1,339 @@
+import glob
+import heapq
+import math
+from array import array
+
+from filter_listings import iter_records, listing_rating
+from listing_batch import listing_key
+from prices import nights_between, parse_price
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; scores fall back to a plain loop
+    np = None
+
+# Bayesian prior: a listing starts as if it had PRIOR_REVIEWS reviews at PRIOR_RATING,
+# so a 5.0 from 3 reviews does not outrank a 4.9 from 300
+DEFAULT_PRIOR_RATING = 4.7
+DEFAULT_PRIOR_REVIEWS = 20
+# Airbnb ratings cluster between 4 and 5, so that range is spread over the rating score
+RATING_FLOOR = 4.0
+# Over budget the price score falls from 0.5 to 0 at this fraction above the budget
+OVER_BUDGET_TOLERANCE = 0.25
+DEFAULT_WEIGHTS = {"rating": 0.6, "price": 0.3, "feature": 0.1}
+DEFAULT_CHUNK_SIZE = 4096
+
+def _clip(value):
+    return 0.0 if value < 0.0 else 1.0 if value > 1.0 else value
+
+def _rating_parts(rating, reviews, prior_rating, prior_reviews):
+    smoothed = (prior_rating * prior_reviews + rating * reviews) / (prior_reviews + reviews)
+    return smoothed, _clip((smoothed - RATING_FLOOR) / (5.0 - RATING_FLOOR))
+
+def _price_score(nightly, budget):
+    # Cheaper is better inside the budget (1.0 free, 0.5 at the budget), and the
+    # score drops to 0 quickly above it. No parsable price scores 0.
+    if nightly is None or math.isnan(nightly):
+        return 0.0
+    ratio = nightly / budget
+    if ratio <= 1.0:
+        return 1.0 - 0.5 * ratio
+    return 0.5 * _clip(1.0 - (ratio - 1.0) / OVER_BUDGET_TOLERANCE)
+
+def active_weights(weights=None, budget=None, feature=None):
+    """Component weights in use, normalised to sum to 1 (price needs a budget, feature a feature)."""
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    if not budget:
+        weights.pop("price")
+    if not feature:
+        weights.pop("feature")
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()} if total else {}
+
+def score_columns(ratings, reviews, nightly, feature_match, budget=None, weights=None,
+                  prior_rating=DEFAULT_PRIOR_RATING, prior_reviews=DEFAULT_PRIOR_REVIEWS):
+    """
+    Composite scores for typed columns of one chunk of listings.
+
+    Args:
+        ratings (array): Ratings as doubles
+        reviews (array): Review counts as int64
+        nightly (array): Nightly prices as doubles (NaN when unknown)
+        feature_match (array): 1.0 where the listing matches the wanted feature
+        budget (float, optional): Nightly budget; enables the price component
+        weights (dict): Normalised component weights, see active_weights
+
+    Returns:
+        tuple: (scores, components) where components maps "rating", "price" and
+            "feature" to per-listing component scores; all are lists of floats
+    """
+    weights = weights if weights is not None else active_weights(budget=budget)
+    if np is not None and len(ratings):
+        rating_col = np.frombuffer(ratings, dtype=np.float64)
+        review_col = np.frombuffer(reviews, dtype=np.int64).astype(np.float64)
+        smoothed = (prior_rating * prior_reviews + rating_col * review_col) / (prior_reviews + review_col)
+        components = {"rating": np.clip((smoothed - RATING_FLOOR) / (5.0 - RATING_FLOOR), 0.0, 1.0)}
+        if "price" in weights:
+            ratio = np.frombuffer(nightly, dtype=np.float64) / budget
+            over = 0.5 * np.clip(1.0 - (ratio - 1.0) / OVER_BUDGET_TOLERANCE, 0.0, 1.0)
+            price = np.where(ratio <= 1.0, 1.0 - 0.5 * ratio, over)
+            components["price"] = np.nan_to_num(price, nan=0.0)
+        if "feature" in weights:
+            components["feature"] = np.frombuffer(feature_match, dtype=np.float64)
+        scores = sum(weights[name] * column for name, column in components.items())
+        return scores.tolist(), {name: column.tolist() for name, column in components.items()}
+
+    components = {"rating": [
+        _rating_parts(r, n, prior_rating, prior_reviews)[1] for r, n in zip(ratings, reviews)
+    ]}
+    if "price" in weights:
+        components["price"] = [_price_score(p, budget) for p in nightly]
+    if "feature" in weights:
+        components["feature"] = list(feature_match)
+    scores = [
+        sum(weights[name] * components[name][i] for name in components)
+        for i in range(len(ratings))
+    ]
+    return scores, components
+
+def _feature_match(listing, metadata, feature):
+    """1.0 if the listing came from a search filtered by the feature or mentions it in its title."""
+    if not feature:
+        return 0.0
+    if (metadata.get("feature") or "").lower() == feature.lower():
+        return 1.0
+    return 1.0 if feature.lower() in (listing.get("title") or "").lower() else 0.0
+
+class TopK:
+    """
+    Bounded min-heap keeping the k best-scoring listings seen so far.
+
+    Each push is O(log k), so ranking n listings costs O(n log k) time and O(k)
+    memory. With unique=True a room seen again (e.g. in another snapshot) only
+    replaces its entry when it scores higher.
+    """
+
+    def __init__(self, k, unique=True):
+        self.k = k
+        self.unique = unique
+        self.heap = []
+        self._counter = 0
+        self._members = {}
+
+    def threshold(self):
+        """Score a candidate has to beat to enter a full heap."""
+        return self.heap[0][0] if len(self.heap) >= self.k else float("-inf")
+
+    def push(self, score, item, key=None):
+        if self.k <= 0 or score <= self.threshold():
+            return
+        if self.unique and key is not None:
+            previous = self._members.get(key)
+            if previous is not None:
+                if score <= previous[0]:
+                    return
+                # O(k), but repeats are rare next to the n pushes
+                self.heap.remove(previous)
+                heapq.heapify(self.heap)
+        self._counter += 1
+        # The counter breaks score ties without comparing the items
+        entry = (score, -self._counter, key, item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        else:
+            evicted = heapq.heappushpop(self.heap, entry)
+            self._members.pop(evicted[2], None)
+        if self.unique and key is not None:
+            self._members[key] = entry
+
+    def results(self):
+        """Items from best to worst."""
+        return [entry[3] for entry in sorted(self.heap, reverse=True)]
+
+class Ranker:
+    """
+    Streams listings through vectorized scoring into a bounded top-k heap.
+
+    Listings are buffered in chunks of chunk_size; each chunk is scored as
+    columns in one pass and only candidates that beat the current k-th best
+    score reach the heap, so memory stays at one chunk plus k results however
+    many snapshots are ranked.
+    """
+
+    def __init__(self, k=10, budget=None, feature=None, weights=None, prior_rating=DEFAULT_PRIOR_RATING,
+                 prior_reviews=DEFAULT_PRIOR_REVIEWS, chunk_size=DEFAULT_CHUNK_SIZE, unique=True):
+        """
+        Args:
+            k (int): Number of results to keep
+            budget (float, optional): Nightly budget for the price component
+            feature (str, optional): Feature name for the feature component
+            weights (dict, optional): Overrides for DEFAULT_WEIGHTS
+            prior_rating (float), prior_reviews (int): Bayesian prior for the rating
+            chunk_size (int): Listings scored per vectorized batch
+            unique (bool): Keep only the best entry per room id
+        """
+        self.budget = budget
+        self.feature = feature
+        self.weights = active_weights(weights, budget, feature)
+        self.prior_rating = prior_rating
+        self.prior_reviews = prior_reviews
+        self.chunk_size = chunk_size
+        self.top = TopK(k, unique)
+        self.scored = 0
+        self._reset_chunk()
+
+    def _reset_chunk(self):
+        self._listings = []
+        self._sources = []
+        self._ratings = array('d')
+        self._reviews = array('q')
+        self._nightly = array('d')
+        self._features = array('d')
+
+    def add(self, listing, metadata=None, source=None):
+        """Queue one listing; metadata is its snapshot's (for the length of stay and feature)."""
+        metadata = metadata or {}
+        rating, reviews = listing_rating(listing)
+        details = listing.get("price_details")
+        if not isinstance(details, dict):
+            details = parse_price(listing.get("price_text"), nights_between(metadata.get("checkin"),
+                                                                            metadata.get("checkout")))
+        nightly = details["nightly"]
+        self._listings.append(listing)
+        self._sources.append(source)
+        self._ratings.append(rating)
+        self._reviews.append(reviews)
+        self._nightly.append(nightly if nightly is not None else float("nan"))
+        self._features.append(_feature_match(listing, metadata, self.feature))
+        if len(self._listings) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Score the queued chunk and push its best candidates into the heap."""
+        if not self._listings:
+            return
+        scores, components = score_columns(
+            self._ratings, self._reviews, self._nightly, self._features, self.budget, self.weights,
+            self.prior_rating, self.prior_reviews
+        )
+        threshold = self.top.threshold()
+        for i, score in enumerate(scores):
+            if score <= threshold:
+                continue
+            self.top.push(score, (i, score, {name: column[i] for name, column in components.items()},
+                                  self._ratings[i], self._reviews[i], self._nightly[i],
+                                  self._listings[i], self._sources[i]),
+                          listing_key(self._listings[i]))
+            threshold = self.top.threshold()
+        self.scored += len(scores)
+        self._reset_chunk()
+
+    def add_snapshot(self, path):
+        """Stream one snapshot file or delta store directory into the ranking."""
+        metadata = {}
+        for kind, value in iter_records(path):
+            if kind == "metadata":
+                metadata = value
+            elif kind == "listing":
+                self.add(value, metadata, path)
+
+    def results(self):
+        """
+        Returns:
+            list: The top k as dicts with rank, score, the breakdown per component
+                (value, score and weight) and the listing, best first
+        """
+        self.flush()
+        ranked = []
+        for rank, (_, score, parts, rating, reviews, nightly, listing, source) in enumerate(self.top.results(), 1):
+            smoothed, _ = _rating_parts(rating, reviews, self.prior_rating, self.prior_reviews)
+            breakdown = {"rating": {
+                "rating": rating,
+                "reviews": reviews,
+                "smoothed": round(smoothed, 4),
+                "score": round(parts["rating"], 4),
+                "weight": round(self.weights["rating"], 4)
+            }}
+            if "price" in parts:
+                breakdown["price"] = {
+                    "nightly": None if math.isnan(nightly) else nightly,
+                    "budget": self.budget,
+                    "score": round(parts["price"], 4),
+                    "weight": round(self.weights["price"], 4)
+                }
+            if "feature" in parts:
+                breakdown["feature"] = {
+                    "feature": self.feature,
+                    "match": bool(parts["feature"]),
+                    "score": parts["feature"],
+                    "weight": round(self.weights["feature"], 4)
+                }
+            ranked.append({
+                "rank": rank,
+                "score": round(score, 4),
+                "breakdown": breakdown,
+                "source": source,
+                "listing": listing
+            })
+        return ranked
+
+def rank_listings(listings, k=10, budget=None, feature=None, metadata=None, **options):
+    """
+    Best k listings from an iterable (a scrape result's listings, a generator, ...).
+
+    Args:
+        listings (iterable): Listing dicts, consumed once
+        k (int): Number of results
+        budget (float, optional), feature (str, optional): Enable the price and feature components
+        metadata (dict, optional): Snapshot metadata for the length of stay and searched feature
+        **options: Further Ranker arguments (weights, prior_rating, prior_reviews, chunk_size, unique)
+
+    Returns:
+        list: See Ranker.results
+    """
+    ranker = Ranker(k, budget, feature, **options)
+    for listing in listings:
+        ranker.add(listing, metadata)
+    return ranker.results()
+
+def rank_snapshots(pattern="airbnb_listings_*.json", k=10, budget=None, feature=None, **options):
+    """
+    Best k listings across many snapshots, streaming each file.
+
+    Args:
+        pattern (str or list): Glob pattern or explicit list of snapshot files and
+            delta store directories
+        k, budget, feature, **options: As for rank_listings
+
+    Returns:
+        list: See Ranker.results; each result names its source snapshot
+    """
+    paths = sorted(glob.glob(pattern)) if isinstance(pattern, str) else list(pattern)
+    ranker = Ranker(k, budget, feature, **options)
+    for path in paths:
+        ranker.add_snapshot(path)
+    return ranker.results()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rank scraped Airbnb listings and show the best stays.")
+    parser.add_argument("pattern", nargs="?", default="airbnb_listings_*.json",
+                        help="Snapshot glob pattern or delta store directory")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=None, help="Nightly budget")
+    parser.add_argument("--feature", default=None)
+    parser.add_argument("--prior-rating", type=float, default=DEFAULT_PRIOR_RATING)
+    parser.add_argument("--prior-reviews", type=int, default=DEFAULT_PRIOR_REVIEWS)
+    args = parser.parse_args()
+
+    results = rank_snapshots(args.pattern, args.top, args.budget, args.feature,
+                             prior_rating=args.prior_rating, prior_reviews=args.prior_reviews)
+    if not results:
+        print("No listings found!")
+        exit(1)
+    for result in results:
+        listing = result["listing"]
+        parts = ", ".join(f"{name} {part['score']:.2f}" for name, part in result["breakdown"].items())
+        print(f"{result['rank']:>3}. {result['score']:.3f}  {listing.get('title')} - {listing.get('price_text')}")
+        print(f"      {parts}  {listing.get('url')}")
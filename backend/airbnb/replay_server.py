@@ -0,0 +1,343 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+import base64
+import hashlib
+import html
+import json
+import struct
+import threading
+import zlib
+import logging
+
+from network_capture import load_responses
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 18
+DEFAULT_TOTAL_RESULTS = 90
+# Size of the stand-in listing pictures
+IMAGE_SIZE = (480, 320)
+# Like the real site, a search stops at this many result pages however many listings match
+DEFAULT_MAX_RESULT_PAGES = 15
+# Area the synthetic map listings are spread over: (sw_lat, sw_lng, ne_lat, ne_lng)
+DEFAULT_MAP_BOUNDS = (38.69, -9.23, 38.80, -9.09)
+MAP_BOUNDS_PARAMS = ("sw_lat", "sw_lng", "ne_lat", "ne_lng")
+
+# Search page served at /s/<destination>/homes. Like the real site it embeds the
+# first results page as server-rendered JSON state and renders the cards from a
+# StaysSearch XHR, so the HTTP fast path and both the network and the DOM
+# extraction paths can be exercised against it.
+SEARCH_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<div role="dialog" id="consent"><button onclick="this.parentNode.remove()">Got it</button></div>
+<main id="results"></main>
+<nav aria-label="Search results pagination" id="pagination"></nav>
+<script id="data-deferred-state-0" data-deferred-state-0="true" type="application/json">{state}</script>
+<script>
+const esc = (s) => String(s == null ? '' : s).replace(/[&<>"]/g, c => ({{'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}}[c]));
+fetch('/api/v3/StaysSearch?operationName=StaysSearch&' + location.search.slice(1))
+  .then(r => r.json())
+  .then(payload => {{
+    const results = payload.data.presentation.staysSearch.results;
+    const html = results.searchResults.map(r => {{
+      const rawId = String((r.demandStayListing || r.listing || {{}}).id);
+      const id = /^[0-9]+$/.test(rawId) ? rawId : atob(rawId).split(':').pop();
+      const display = r.structuredDisplayPrice || (r.pricingQuote || {{}}).structuredStayDisplayPrice || {{}};
+      const line = display.primaryLine || {{}};
+      const price = [line.originalPrice, line.discountedPrice || line.price, line.qualifier].filter(Boolean).join(' ');
+      const pic = ((r.contextualPictures || [])[0] || {{}}).picture || '';
+      return '<div data-testid="card-container">' +
+        '<a href="/rooms/' + id + '">' +
+        '<img data-testid="card-image" decoding="async" src="' + esc(pic) + '">' +
+        '<div data-testid="listing-card-title">' + esc(r.title) + '</div></a>' +
+        '<div data-testid="price-availability-row">' + esc(price) + '</div>' +
+        (r.avgRatingA11yLabel ? '<span>' + esc(r.avgRatingA11yLabel) + '</span>' : '') +
+        '</div>';
+    }}).join('');
+    document.getElementById('results').innerHTML = html;
+    const info = results.paginationInfo;
+    document.getElementById('pagination').innerHTML = info.pageCursors.map((c, i) => {{
+      const params = new URLSearchParams(location.search);
+      params.set('cursor', c);
+      return '<a href="?' + params.toString() + '">' + (i + 1) + '</a>';
+    }}).join(' ');
+  }});
+</script>
+</body></html>
+"""
+
+def solid_png(width, height, rgb):
+    """A single-colour PNG, built without an imaging library."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    row = b"\x00" + bytes(rgb) * width
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height, 9))
+            + chunk(b"IEND", b""))
+
+def _encode_cursor(offset):
+    payload = json.dumps({"section_offset": 0, "items_offset": offset, "version": 1}, separators=(",", ":"))
+    return base64.b64encode(payload.encode("utf-8")).decode("ascii")
+
+def _offset_from_query(query):
+    if "cursor" in query:
+        cursor = query["cursor"][0]
+        try:
+            decoded = base64.b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+            return int(json.loads(decoded).get("items_offset", 0))
+        except (ValueError, UnicodeDecodeError):
+            return 0
+    if "items_offset" in query:
+        try:
+            return int(query["items_offset"][0])
+        except ValueError:
+            return 0
+    return 0
+
+def _synthetic_result(destination, position, image_base, coordinate=None):
+    digest = hashlib.sha1(f"{destination.lower()}|{position}".encode()).hexdigest()
+    room_id = int(digest[:8], 16)
+    rating = 4.0 + (int(digest[8:10], 16) % 100) / 100
+    reviews = int(digest[10:13], 16) % 400
+    price = 50 + int(digest[13:16], 16) % 300
+    discounted = int(digest[16:18], 16) % 5 == 0
+    line = {"price": f"${price}", "qualifier": "night"}
+    if discounted:
+        line = {"originalPrice": f"${price + 30}", "discountedPrice": f"${price}", "qualifier": "night"}
+    result = {
+        "__typename": "StaySearchResult",
+        "demandStayListing": {
+            "id": base64.b64encode(f"DemandStayListing:{room_id}".encode()).decode("ascii")
+        },
+        "title": f"Stay {position + 1} in {destination}",
+        "structuredDisplayPrice": {"primaryLine": line},
+        "contextualPictures": [{"picture": f"{image_base}{room_id}.jpg"}]
+    }
+    if coordinate is not None:
+        result["demandStayListing"]["location"] = {
+            "coordinate": {"latitude": coordinate[0], "longitude": coordinate[1]}
+        }
+    if reviews:
+        result["avgRatingA11yLabel"] = f"{rating:.2f} out of 5 average rating, {reviews} reviews"
+        result["avgRatingLocalized"] = f"{rating:.2f} ({reviews})"
+    else:
+        result["avgRatingLocalized"] = "New"
+    return result
+
+def _search_payload(results, offset, page_size, total, **extra):
+    pages = (total + page_size - 1) // page_size
+    next_offset = offset + page_size
+    return {
+        "data": {
+            "presentation": {
+                "staysSearch": {
+                    "results": {
+                        "searchResults": results,
+                        "paginationInfo": {
+                            "nextPageCursor": _encode_cursor(next_offset) if next_offset < total else None,
+                            "pageCursors": [_encode_cursor(page * page_size) for page in range(pages)]
+                        },
+                        **extra
+                    }
+                }
+            }
+        }
+    }
+
+def synthetic_search_payload(destination, offset=0, page_size=DEFAULT_PAGE_SIZE,
+                             total=DEFAULT_TOTAL_RESULTS, image_base="/im/pictures/"):
+    """
+    Build a deterministic StaysSearch-shaped response for one results page.
+
+    Listings depend only on destination and position, so repeated runs see the
+    same data, which is what the replay benchmarks need.
+    """
+    results = [_synthetic_result(destination, position, image_base)
+               for position in range(offset, min(offset + page_size, total))]
+    return _search_payload(results, offset, page_size, total)
+
+def synthetic_coordinates(destination, count, bounds=DEFAULT_MAP_BOUNDS):
+    """
+    Deterministic (lat, lng) for each of `count` synthetic map listings.
+
+    Listings cluster toward the middle of `bounds`, as they do around a city
+    centre, so a quadtree crawl has to split the centre deeper than the edges.
+    """
+    sw_lat, sw_lng, ne_lat, ne_lng = bounds
+    mid_lat, mid_lng = (sw_lat + ne_lat) / 2, (sw_lng + ne_lng) / 2
+    coordinates = []
+    for position in range(count):
+        digest = hashlib.sha1(f"{destination.lower()}|map|{position}".encode()).digest()
+        u, v = (int.from_bytes(digest[i:i + 4], "big") / 2 ** 32 * 2 - 1 for i in (0, 4))
+        # Cubing keeps the sign and pulls most points toward the centre
+        coordinates.append((round(mid_lat + u ** 3 * (ne_lat - mid_lat), 6),
+                            round(mid_lng + v ** 3 * (ne_lng - mid_lng), 6)))
+    return coordinates
+
+def _query_bounds(query):
+    try:
+        return tuple(float(query[name][0]) for name in MAP_BOUNDS_PARAMS)
+    except (KeyError, ValueError):
+        return None
+
+def synthetic_map_payload(destination, coordinates, query, page_size=DEFAULT_PAGE_SIZE,
+                          max_pages=DEFAULT_MAX_RESULT_PAGES, bounds=DEFAULT_MAP_BOUNDS,
+                          image_base="/im/pictures/"):
+    """
+    StaysSearch-shaped response for a map search over synthetic listings with coordinates.
+
+    A query with ne_lat/ne_lng/sw_lat/sw_lng only matches listings inside that
+    box; either way at most max_pages pages are served, like the real site's
+    result cap. The whole area is reported as mapBounds.
+    """
+    box = _query_bounds(query)
+    inside = [
+        position for position, (lat, lng) in enumerate(coordinates)
+        if box is None or (box[0] <= lat < box[2] and box[1] <= lng < box[3])
+    ]
+    total = min(len(inside), max_pages * page_size)
+    offset = _offset_from_query(query)
+    results = [_synthetic_result(destination, position, image_base, coordinates[position])
+               for position in inside[offset:min(offset + page_size, total)]]
+    map_bounds = dict(zip(MAP_BOUNDS_PARAMS, bounds))
+    return _search_payload(results, offset, page_size, total, mapBounds=map_bounds)
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    server_version = "AirbnbReplay/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = urlparse(self.path)
+        query = parse_qs(parts.query)
+        replay = self.server.replay
+        replay.count(parts.path)
+
+        if parts.path.startswith("/api/v3/"):
+            payload = replay.payload_for(query)
+            self._send(200, json.dumps(payload), "application/json")
+        elif parts.path.startswith("/s/") and parts.path.endswith("/homes"):
+            destination = unquote(parts.path[len("/s/"):-len("/homes")])
+            state = {"niobeMinimalClientData": [[f"StaysSearch:{parts.query}", replay.payload_for(query)]]}
+            # "</" would end the script element early
+            state_json = json.dumps(state, ensure_ascii=False).replace("</", "<\\/")
+            page = SEARCH_PAGE_TEMPLATE.format(title=html.escape(destination), state=state_json)
+            self._send(200, page, "text/html; charset=utf-8")
+        elif parts.path.startswith("/im/pictures/"):
+            # A distinct solid-colour picture per path, so image caches see real content
+            rgb = hashlib.sha1(parts.path.encode("utf-8")).digest()[:3]
+            self._send(200, solid_png(*IMAGE_SIZE, rgb), "image/png")
+        else:
+            self._send(404, "Not found", "text/plain")
+
+class ReplayServer:
+    """
+    Local stand-in for the Airbnb search page and search API.
+
+    Serves responses recorded with network_capture.save_responses (page N of a
+    search gets the Nth recording, repeating the last one), or synthetic
+    StaysSearch payloads when no recordings are given. With map_total set it
+    instead serves that many synthetic listings placed on a map, answering
+    bounding-box searches (see synthetic_map_payload). Point the scraper at it
+    with base_url=server.base_url.
+    """
+
+    def __init__(self, recordings_dir=None, destination="Replay", page_size=DEFAULT_PAGE_SIZE,
+                 total=DEFAULT_TOTAL_RESULTS, host="127.0.0.1", port=0, map_total=0,
+                 map_bounds=DEFAULT_MAP_BOUNDS, max_result_pages=DEFAULT_MAX_RESULT_PAGES):
+        """
+        Args:
+            recordings_dir (str, optional): Directory of recorded search responses
+            destination (str): Destination used for synthetic listings
+            page_size (int): Results per synthetic page
+            total (int): Total synthetic results across all pages
+            host (str), port (int): Bind address; port 0 picks a free port
+            map_total (int): Synthetic listings placed inside map_bounds; 0 disables map searches
+            map_bounds (tuple): (sw_lat, sw_lng, ne_lat, ne_lng) of the synthetic map
+            max_result_pages (int): Result pages served per map search
+        """
+        self.recorded = load_responses(recordings_dir) if recordings_dir else []
+        self.destination = destination
+        self.page_size = page_size
+        self.total = total
+        self.map_bounds = map_bounds
+        self.max_result_pages = max_result_pages
+        self.coordinates = synthetic_coordinates(destination, map_total, map_bounds) if map_total else []
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _ReplayHandler)
+        self._server.daemon_threads = True
+        self._server.replay = self
+        self._thread = None
+
+    @property
+    def origin(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self):
+        """Search root to pass as base_url to the scraper and build_search_url."""
+        return f"{self.origin}/s/"
+
+    def count(self, path):
+        kind = "api" if path.startswith("/api/") else "image" if path.startswith("/im/") else "page"
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def payload_for(self, query):
+        offset = _offset_from_query(query)
+        if self.recorded:
+            index = min(offset // self.page_size, len(self.recorded) - 1)
+            return self.recorded[index][1]
+        if self.coordinates:
+            return synthetic_map_payload(
+                self.destination, self.coordinates, query, self.page_size, self.max_result_pages,
+                self.map_bounds, image_base=f"{self.origin}/im/pictures/"
+            )
+        return synthetic_search_payload(
+            self.destination, offset, self.page_size, self.total, image_base=f"{self.origin}/im/pictures/"
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Replay server listening on {self.origin}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    recordings = sys.argv[1] if len(sys.argv) > 1 else None
+    with ReplayServer(recordings, port=8765) as server:
+        print(f"Serving search pages at {server.base_url}<destination>/homes (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
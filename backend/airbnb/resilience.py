@@ -0,0 +1,308 @@
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failed scrapes that open the circuit...
+DEFAULT_FAILURE_THRESHOLD = 5
+# ...and how long it stays open before one trial scrape is let through
+DEFAULT_RESET_SECONDS = 60
+
+metrics.describe("airbnb_circuit_rejections_total", "Scrapes refused while the circuit breaker was open")
+metrics.describe("airbnb_hedged_attempts_total", "Second scrape attempts started because the first was slow")
+metrics.describe("airbnb_partial_results_total", "Scrapes that ran out of time and returned partial results")
+
+class Deadline:
+    """
+    Time budget for one scrape, shared by every phase.
+
+    Waits clamp their timeouts to what is left, and optional phases (scrolling
+    for more cards, the Filters modal, the category bar) are skipped once it
+    runs out, so the scrape returns what it already has instead of an error.
+    Skipped phases are recorded for the result's metadata. A deadline without
+    seconds never expires, so code can always take one.
+    """
+
+    def __init__(self, seconds=None, parent=None):
+        """
+        Args:
+            seconds (float, optional): Budget from now; None for no limit
+            parent (Deadline, optional): Expires (or is cancelled) together with this one
+        """
+        self.seconds = seconds if parent is None else parent.seconds
+        self.started = time.monotonic() if parent is None else parent.started
+        if parent is not None:
+            self.expires = parent.expires
+        else:
+            self.expires = None if seconds is None else self.started + seconds
+        self.parent = parent
+        self.skipped = []
+        self._cancelled = threading.Event()
+
+    @property
+    def bounded(self):
+        return self.expires is not None or self.cancelled
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self):
+        """Seconds left (infinity without a limit, 0 once expired or cancelled)."""
+        if self.cancelled:
+            return 0.0
+        if self.expires is None:
+            return float("inf")
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def clamp(self, timeout):
+        """The smaller of a step timeout and the time left."""
+        return min(timeout, self.remaining())
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def child(self):
+        """Deadline with the same expiry that can be cancelled on its own, e.g. for a hedged attempt."""
+        return Deadline(parent=self)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def skip(self, phase):
+        """Record that a phase was cut short or left out because time ran out."""
+        if phase not in self.skipped:
+            logger.info(f"Deadline reached after {self.elapsed():.2f}s, skipping {phase}")
+            self.skipped.append(phase)
+
+    def check(self, phase):
+        """
+        Returns:
+            bool: True if there is time left for `phase`; otherwise the phase is recorded as skipped
+        """
+        if self.expired():
+            self.skip(phase)
+            return False
+        return True
+
+    def report(self):
+        return {
+            "seconds": self.seconds,
+            "elapsed": round(self.elapsed(), 3),
+            "expired": self.expired(),
+            "cancelled": self.cancelled,
+            "skipped_phases": list(self.skipped)
+        }
+
+    def mark(self, metadata):
+        """
+        Flag a result's metadata as partial if any phase was skipped.
+
+        Returns:
+            dict: The same metadata, with partial and (for bounded deadlines) deadline set
+        """
+        partial = bool(self.skipped)
+        metadata["partial"] = partial
+        if self.bounded:
+            metadata["deadline"] = self.report()
+        if partial and not self.cancelled:
+            metrics.inc("airbnb_partial_results_total")
+        return metadata
+
+def as_deadline(value):
+    """A Deadline from seconds, an existing Deadline, or None (no limit)."""
+    if isinstance(value, Deadline):
+        return value
+    return Deadline(value)
+
+class CircuitOpenError(Exception):
+    """Raised instead of scraping while the circuit breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Scraping paused after repeated failures; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Fails scrapes fast while the site is blocking us.
+
+    After failure_threshold consecutive failed scrapes (an exception, or a page
+    that never showed listing cards, see record) the circuit opens and scrapes are refused with CircuitOpenError
+    for reset_seconds. Then one trial scrape is let through (half open): a
+    success closes the circuit, a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_seconds=DEFAULT_RESET_SECONDS):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_seconds (float): How long the circuit stays open before a trial scrape
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self):
+        """
+        Claim permission to scrape.
+
+        Raises:
+            CircuitOpenError: While the circuit is open, or a trial scrape is already running
+        """
+        with self._lock:
+            if self._state == "open":
+                retry_after = self._opened_at + self.reset_seconds - time.monotonic()
+                if retry_after > 0:
+                    self._reject()
+                    raise CircuitOpenError(retry_after)
+                self._state = "half_open"
+            if self._state == "half_open":
+                if self._trial_running:
+                    self._reject()
+                    raise CircuitOpenError(self.reset_seconds)
+                self._trial_running = True
+
+    def _reject(self):
+        """Caller holds the lock."""
+        self._stats["rejected"] += 1
+        metrics.inc("airbnb_circuit_rejections_total")
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            self._trial_running = False
+            if self._state != "closed":
+                logger.info("Circuit breaker closed")
+            self._state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            trial = self._trial_running
+            self._trial_running = False
+            if trial or (self._state == "closed" and self._failures >= self.failure_threshold):
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+                logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures; "
+                               f"pausing scrapes for {self.reset_seconds}s")
+
+    def release(self):
+        """
+        End a scrape that says nothing about blocking (it ran out of time, the client
+        stopped early, or the search has no listings). Only frees the trial slot.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record(self, result):
+        """
+        Count a finished scrape.
+
+        Listings are a success and a result flagged metadata["blocked"] a failure.
+        Partial results and empty searches are not counted, so short deadlines
+        cannot open the circuit for every client.
+        """
+        metadata = result.get("metadata") or {}
+        if metadata.get("partial"):
+            self.release()
+        elif result.get("listings"):
+            self.record_success()
+        elif metadata.get("blocked"):
+            self.record_failure()
+        else:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self._state
+            stats["consecutive_failures"] = self._failures
+        return stats
+
+_default_breaker = None
+_default_breaker_lock = threading.Lock()
+
+def default_breaker():
+    """Process-wide CircuitBreaker shared by every scrape of the site."""
+    global _default_breaker
+    with _default_breaker_lock:
+        if _default_breaker is None:
+            _default_breaker = CircuitBreaker()
+        return _default_breaker
+
+def _complete(result):
+    return bool(result.get("listings")) and not (result.get("metadata") or {}).get("partial")
+
+def hedged(attempt, hedge_after, deadline):
+    """
+    Run `attempt`, starting a second copy if the first is still running after hedge_after seconds.
+
+    Each attempt gets its own child of `deadline`. The first complete result
+    (listings and not partial) wins and the other attempt is cancelled, which
+    makes its remaining waits return at once so it releases its driver. If
+    neither completes, the result with the most listings is returned.
+
+    Args:
+        attempt (callable): attempt(deadline, index) -> result dict; index is 0 for the
+            primary and 1 for the hedge
+        hedge_after (float): Seconds to wait for the primary before hedging
+        deadline (Deadline): Overall budget
+
+    Returns:
+        tuple: (result, info) where info has hedged, winner and attempts
+
+    Raises:
+        Exception: What the attempts raised, if neither returned a result
+    """
+    deadlines = [deadline.child(), deadline.child()]
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+    try:
+        futures = {executor.submit(attempt, deadlines[0], 0): 0}
+        done, _ = wait(futures, timeout=min(hedge_after, deadline.remaining()))
+        if not done and not deadline.expired():
+            logger.info(f"First attempt still running after {hedge_after}s, hedging on a second driver")
+            metrics.inc("airbnb_hedged_attempts_total")
+            futures[executor.submit(attempt, deadlines[1], 1)] = 1
+
+        results = {}
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.warning(f"{'Hedged' if index else 'Primary'} attempt failed: {e}")
+                    errors.append(e)
+                    continue
+                if _complete(results[index]):
+                    for other in deadlines:
+                        if other is not deadlines[index]:
+                            other.cancel()
+                    pending = set()
+                    break
+    finally:
+        executor.shutdown(wait=False)
+
+    if not results:
+        raise errors[0]
+    winner = max(results, key=lambda i: (_complete(results[i]), len(results[i].get("listings") or [])))
+    info = {"hedged": len(futures) > 1, "winner": "hedge" if winner else "primary", "attempts": len(futures)}
+    return results[winner], info
@@ -0,0 +1,175 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PATTERNS = ["*.jpg*", "*.jpeg*", "*.png*", "*.webp*", "*.gif*", "*.avif*", "*.ico*", "*/im/pictures/*"]
+FONT_PATTERNS = ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"]
+MEDIA_PATTERNS = ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*", "*.mov*"]
+TRACKER_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*facebook.net*",
+    "*facebook.com/tr*",
+    "*bat.bing.com*",
+    "*hotjar.com*",
+    "*sentry.io*",
+    "*criteo.com*",
+    "*tiktok.com*",
+    "*snapchat.com*",
+    "*pinterest.com/ct*",
+    "*branch.io*",
+    "*adnxs.com*",
+    "*scorecardresearch.com*"
+]
+
+# Named blocking profiles. "default" keeps only what the DOM needs (image src
+# attributes are still set, the bytes are just never fetched); "thumbnails"
+# lets images through for when the pictures themselves are needed.
+BLOCK_PROFILES = {
+    "default": IMAGE_PATTERNS + FONT_PATTERNS + MEDIA_PATTERNS + TRACKER_PATTERNS,
+    "thumbnails": FONT_PATTERNS + MEDIA_PATTERNS + TRACKER_PATTERNS,
+    "trackers": TRACKER_PATTERNS,
+    "none": []
+}
+
+# Typical transfer sizes per CDP resource type, used to estimate bytes saved by
+# requests that were never made
+ESTIMATED_BYTES_BY_TYPE = {
+    "Image": 60 * 1024,
+    "Font": 45 * 1024,
+    "Media": 750 * 1024,
+    "Script": 30 * 1024,
+    "XHR": 4 * 1024,
+    "Fetch": 4 * 1024,
+    "Ping": 512,
+    "Other": 4 * 1024
+}
+
+class ResourceBlocker:
+    """
+    Blocks unneeded resources in headless Chrome via CDP and reports what it saved.
+
+    Blocking uses Network.setBlockedURLs, which stays in effect for the browser tab,
+    so apply() must be called on every scrape when drivers are pooled. The report
+    is built from Chrome's performance log (enabled in build_chrome_options).
+    Reading the log drains it, so other readers (e.g. network_capture) should go
+    through collect() to keep the report complete.
+    """
+
+    def __init__(self, profile="default", allow_thumbnails=False, extra_patterns=None):
+        """
+        Args:
+            profile (str): Name from BLOCK_PROFILES (None or "none" disables blocking)
+            allow_thumbnails (bool): Let images through even if the profile blocks them
+            extra_patterns (list, optional): Additional URL wildcard patterns to block
+        """
+        self.profile = profile or "none"
+        patterns = list(BLOCK_PROFILES[self.profile])
+        if allow_thumbnails:
+            patterns = [p for p in patterns if p not in IMAGE_PATTERNS]
+        if extra_patterns:
+            patterns.extend(extra_patterns)
+        self.patterns = patterns
+        self.events = []
+
+    def apply(self, driver):
+        """Install the block list on the driver (an empty list clears a previous profile)."""
+        # Drop performance log entries left over from whatever the driver did before
+        drain_performance_log(driver)
+        self.events = []
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.patterns})
+        except Exception as e:
+            logger.warning(f"Could not apply resource blocking: {e}")
+            return False
+        if self.patterns:
+            logger.info(f"Blocking {len(self.patterns)} URL patterns (profile '{self.profile}')")
+        return True
+
+    def collect(self, driver):
+        """
+        Drain new Network events from the performance log into this blocker's history.
+
+        Returns:
+            list: All (method, params) events seen since apply()
+        """
+        self.events.extend(network_events(driver))
+        return self.events
+
+    def report(self, driver):
+        """
+        Summarise requests and bytes for the scrape so far.
+
+        Returns:
+            dict: profile, requests_total, requests_blocked, blocked_by_type,
+                bytes_transferred and estimated_bytes_saved
+        """
+        return summarise_network(self.collect(driver), self.profile)
+
+def drain_performance_log(driver):
+    """Read and discard buffered performance log entries."""
+    try:
+        driver.get_log("performance")
+    except Exception:
+        pass
+
+def network_events(driver):
+    """
+    Pull buffered Network.* events from Chrome's performance log.
+
+    Returns:
+        list: (method, params) tuples in log order
+    """
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logger.info(f"Performance log unavailable: {e}")
+        return []
+    events = []
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError, TypeError):
+            continue
+        method = message.get("method", "")
+        if method.startswith("Network."):
+            events.append((method, message.get("params", {})))
+    return events
+
+def summarise_network(events, profile):
+    """Aggregate Network events into request and byte counts."""
+    types = {}
+    transferred = 0
+    finished = 0
+    blocked_by_type = {}
+    for method, params in events:
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            types[request_id] = params.get("type", "Other")
+        elif method == "Network.loadingFinished":
+            finished += 1
+            transferred += int(params.get("encodedDataLength", 0))
+        elif method == "Network.loadingFailed":
+            if params.get("blockedReason") or "BLOCKED_BY_CLIENT" in params.get("errorText", ""):
+                resource_type = params.get("type") or types.get(request_id, "Other")
+                blocked_by_type[resource_type] = blocked_by_type.get(resource_type, 0) + 1
+
+    blocked = sum(blocked_by_type.values())
+    saved = sum(
+        count * ESTIMATED_BYTES_BY_TYPE.get(resource_type, ESTIMATED_BYTES_BY_TYPE["Other"])
+        for resource_type, count in blocked_by_type.items()
+    )
+    return {
+        "profile": profile,
+        "requests_total": len(types),
+        "requests_finished": finished,
+        "requests_blocked": blocked,
+        "blocked_by_type": blocked_by_type,
+        "bytes_transferred": transferred,
+        "estimated_bytes_saved": saved
+    }
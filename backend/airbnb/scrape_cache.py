@@ -0,0 +1,265 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+import logging
+
+try:
+    import diskcache
+except ImportError:  # Disk tier is optional; the memory tier works on its own
+    diskcache = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 15 * 60  # seconds
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_DISK_SIZE_LIMIT = 512 * 1024 * 1024  # bytes
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scrape_cache")
+# scrape_airbnb_with_got_it arguments that change which listings come back, so
+# they are part of the cache key (a replay server must not share entries with airbnb.com)
+KEYED_SCRAPE_KWARGS = ("base_url", "extraction_mode")
+
+def search_key(destination, checkin, checkout, guests, feature=None, **extra):
+    """
+    Normalised cache key for a search.
+
+    Extra keyword arguments that change what is scraped (e.g. budget) are folded
+    into the key; anything that is None is ignored.
+    """
+    parts = [
+        destination.strip().lower(),
+        str(checkin),
+        str(checkout),
+        str(guests),
+        feature or ""
+    ]
+    for name in sorted(extra):
+        if extra[name] is not None:
+            parts.append(f"{name}={extra[name]}")
+    return "|".join(parts)
+
+class _Flight:
+    """One in-progress computation that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class ScrapeCache:
+    """
+    Two-tier TTL cache for scrape results with single-flight request coalescing.
+
+    Results live in an in-memory LRU and, when diskcache is installed, in a
+    size-bounded disk cache that survives restarts. Entries older than `ttl`
+    are treated as stale and re-scraped. Concurrent requests for the same key
+    share one in-flight scrape instead of each launching a browser.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 directory=DEFAULT_CACHE_DIR, disk_size_limit=DEFAULT_DISK_SIZE_LIMIT,
+                 use_disk=True):
+        """
+        Args:
+            ttl (float): Seconds a result stays fresh
+            max_memory_entries (int): Results kept in memory before LRU eviction
+            directory (str): Disk cache location
+            disk_size_limit (int): Disk cache size in bytes before LRU eviction
+            use_disk (bool): Set False to keep the cache memory-only
+        """
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {
+            "hits_memory": 0,
+            "hits_disk": 0,
+            "misses": 0,
+            "stale": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "evictions": 0,
+            "stores": 0
+        }
+
+        self._disk = None
+        if use_disk and diskcache is not None:
+            self._disk = diskcache.Cache(
+                directory, size_limit=disk_size_limit, eviction_policy="least-recently-used"
+            )
+        elif use_disk:
+            logger.info("diskcache is not installed; scrape cache is memory-only")
+
+    def _fresh(self, entry):
+        return time.time() - entry["stored_at"] < self.ttl
+
+    def _remember(self, key, entry):
+        """Insert into the memory tier, evicting least recently used entries. Caller holds the lock."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key):
+        """
+        Return a fresh cached result, or None.
+
+        Stale entries count toward the `stale` counter and are dropped.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._fresh(entry):
+                    self._memory.move_to_end(key)
+                    self._stats["hits_memory"] += 1
+                    return entry["value"]
+                del self._memory[key]
+                self._stats["stale"] += 1
+                return None
+
+        if self._disk is not None:
+            entry = self._disk.get(key)
+            if entry is not None:
+                with self._lock:
+                    if self._fresh(entry):
+                        self._stats["hits_disk"] += 1
+                        self._remember(key, entry)
+                        return entry["value"]
+                    self._stats["stale"] += 1
+                self._disk.delete(key)
+        return None
+
+    def set(self, key, value):
+        """Store a result in both tiers."""
+        entry = {"stored_at": time.time(), "value": value}
+        with self._lock:
+            self._remember(key, entry)
+            self._stats["stores"] += 1
+        if self._disk is not None:
+            self._disk.set(key, entry)
+
+    def get_or_compute(self, key, compute, should_store=None):
+        """
+        Return the cached result for `key`, or run `compute()` once for all concurrent callers.
+
+        Args:
+            key (str): Cache key, usually from search_key()
+            compute (callable): Produces the result on a miss
+            should_store (callable, optional): Predicate deciding whether a computed
+                result is cacheable (e.g. skip empty results from a blocked scrape)
+
+        Returns:
+            The cached or freshly computed result
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = compute()
+            flight.value = value
+            if should_store is None or should_store(value):
+                self.set(key, value)
+            return value
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key):
+        """Drop one key from both tiers."""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self._disk is not None:
+            self._disk.delete(key)
+
+    def stats(self):
+        """Hit/miss/stale counters plus current sizes, for tuning the TTL."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["in_flight"] = len(self._flights)
+        hits = stats["hits_memory"] + stats["hits_disk"]
+        lookups = hits + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        if self._disk is not None:
+            stats["disk_bytes"] = self._disk.volume()
+        return stats
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+
+def _has_listings(result):
+    """Only complete results are cached; a partial one would be served for the whole TTL."""
+    return bool(result and result.get("listings")) and not (result.get("metadata") or {}).get("partial")
+
+def cached_scrape(destination, checkin, checkout, guests, feature=None, cache=None, budget=None,
+                  **kwargs):
+    """
+    scrape_airbnb_with_got_it behind a ScrapeCache.
+
+    The browser always scrapes without a price filter and the budget window is
+    applied locally, so every budget for the same search is served from one
+    cached result with no browser work.
+
+    Args:
+        cache (ScrapeCache, optional): Cache to use (the module-level default if omitted)
+        budget (int, optional): Nightly budget, applied with prices.apply_budget_window
+        **kwargs: Passed through to scrape_airbnb_with_got_it; those in
+            KEYED_SCRAPE_KWARGS are also part of the cache key
+
+    Returns:
+        dict: Dictionary containing listings and metadata. Empty and partial
+            results are returned but not cached
+    """
+    from scraper import DEFAULT_FEATURE, scrape_airbnb_with_got_it
+    from prices import annotate_prices, apply_budget_window
+
+    def scrape():
+        result = scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature, **kwargs)
+        # Parse prices once, before caching, so budget lookups only compare numbers
+        annotate_prices(result)
+        return result
+
+    cache = cache or default_cache()
+    feature = feature if feature is not None else DEFAULT_FEATURE
+    key = search_key(destination, checkin, checkout, guests, feature,
+                     **{name: kwargs.get(name) for name in KEYED_SCRAPE_KWARGS})
+    result = cache.get_or_compute(key, scrape, should_store=_has_listings)
+    if budget:
+        return apply_budget_window(result, budget)
+    return result
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def default_cache():
+    """Process-wide ScrapeCache, created on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ScrapeCache()
+        return _default_cache
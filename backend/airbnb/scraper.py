@@ -1,10 +1,21 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
+from driver_pool import standalone_driver
+from waits import WaitEngine
+from resource_blocking import ResourceBlocker
+from network_capture import capture_search_responses, listings_from_responses
+from http_fetch import fetch_listings_http, path_stats
+from listing_batch import room_id_from_url
+from resilience import as_deadline, default_breaker, hedged
+from tracing import new_trace
+from selector_registry import default_registry
+from search_query import (
+    BASE_URL, build_search_url, budget_window, category_tag_from_url, discover_category_tags,
+    save_category_tags, url_filters_applied
+)
+import os
+import re
 import time
 import json
 from datetime import datetime
@@ -17,177 +28,123 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def scroll_page(driver, pause_time=1):
-    """Scroll the page to load all listings."""
+# Chrome's own page load timeout, restored after a navigation limited by a deadline
+PAGE_LOAD_TIMEOUT = 300
+
+def scroll_page(driver, waits=None):
+    """Scroll the page to load all listings, stopping early if the scrape's deadline passes."""
+    waits = waits or WaitEngine(driver)
     last_height = driver.execute_script("return document.body.scrollHeight")
     
-    while True:
+    while waits.deadline.check("scroll_page"):
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(pause_time)
+        # Lazy-loaded cards arrive over the network and then render; once both
+        # have gone quiet an unchanged height means we reached the end
+        waits.network_idle("scroll_step")
+        waits.dom_settled("scroll_step")
         new_height = driver.execute_script("return document.body.scrollHeight")
         if new_height == last_height:
             break
         last_height = new_height
 
-def click_got_it(driver):
+def click_got_it(driver, waits=None):
     """Attempt to click the 'Got it'/'Accept' button if it appears."""
+    waits = waits or WaitEngine(driver)
     try:
-        selectors = [
-            '//button[contains(text(), "Got it")]',
-            '//button[contains(text(), "Accept")]',
-            '//button[contains(@aria-label, "Got it")]'
-        ]
-        for selector in selectors:
-            try:
-                got_it_button = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, selector))
-                )
-                got_it_button.click()
-                logger.info("Clicked 'Got it' button.")
-                return
-            except:
-                continue
+        # Every candidate is probed at once, so a missing popup costs one timeout
+        got_it_button, _ = default_registry().find(waits, "got_it")
+        got_it_button.click()
+        logger.info("Clicked 'Got it' button.")
     except Exception as e:
         logger.info(f"No 'Got it' button found or couldn't click: {e}")
 
-def clear_and_set_value(input_element, value):
+def clear_and_set_value(input_element, value, waits=None):
     """
     Clear an input field completely and set the given value.
     This uses Ctrl + A (or Command + A on Mac) followed by Backspace,
     then types the desired value.
     """
+    waits = waits or WaitEngine(input_element.parent)
     input_element.click()
-    time.sleep(0.5)
     
     # Try CTRL + A first:
     input_element.send_keys(Keys.CONTROL + "a")
-    time.sleep(0.2)
     input_element.send_keys(Keys.BACKSPACE)
-    time.sleep(0.2)
+    waits.value_equals(input_element, "")
     
     # Type new value
     input_element.send_keys(str(value))
-    time.sleep(0.5)
+    waits.value_equals(input_element, value)
+
+def _wait_for_price_value(waits, input_element, value):
+    """Wait for a price input to hold `value`, ignoring currency symbols and separators."""
+    try:
+        waits.until(
+            "input_value",
+            lambda d: re.sub(r"\D", "", input_element.get_attribute("value") or "") == str(value)
+        )
+    except TimeoutException:
+        logger.info(f"Price input did not show {value} in time; continuing")
 
-def click_filter_and_set_budget(driver, budget):
+def click_filter_and_set_budget(driver, budget, waits=None):
     """Click filter button and set price range based on budget."""
+    waits = waits or WaitEngine(driver)
+    registry = default_registry()
     try:
-        # Find and click filter button (keeping existing filter button logic)
-        filter_selectors = [
-            'button[data-testid="searchbar-filter-button"]',
-            'button[aria-label*="filter"]',
-            'button[aria-label*="Filter"]',
-            '//button[.//span[contains(text(), "Filters")]]',
-            '//button[contains(., "Filters")]',
-            'button[data-testid="filter-bar-filter-button"]',
-            'button[role="button"][tabindex="0"]'
-        ]
-        
         logger.info("Looking for filter button...")
-        filter_button = None
         
-        time.sleep(5)
+        # Let the search page finish its initial render before probing selectors
+        waits.dom_settled("filter_button")
         
-        for selector in filter_selectors:
-            try:
-                logger.info(f"Trying selector: {selector}")
-                if selector.startswith('//'):
-                    filter_button = WebDriverWait(driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, selector))
-                    )
-                else:
-                    filter_button = WebDriverWait(driver, 5).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                logger.info(f"Found filter button with selector: {selector}")
-                break
-            except Exception as e:
-                logger.info(f"Selector {selector} failed: {str(e)}")
-                continue
-        
-        if not filter_button:
+        try:
+            filter_button, selector = registry.find(waits, "filter_button")
+        except TimeoutException:
             raise Exception("Could not find filter button")
+        logger.info(f"Found filter button with selector: {selector}")
             
         driver.execute_script("arguments[0].scrollIntoView(true);", filter_button)
-        time.sleep(2)
+        waits.in_viewport(filter_button)
         
         filter_button.click()
         logger.info("Clicked filter button")
         
         # Wait for filter modal to appear
-        time.sleep(3)
-        
-        # Updated price input selectors
-        price_selectors = [
-            'input[id="price_filter_min"]',
-            'input[data-testid="price-filter-min"]',
-            'input[placeholder="min price"]',
-            'input[placeholder="Minimum"]',
-            'input[aria-label="Minimum price"]'
-        ]
+        waits.dom_settled("filter_modal")
         
         logger.info("Looking for price input fields...")
-        min_price = None
-        max_price = None
-        
-        for selector in price_selectors:
-            try:
-                logger.info(f"Trying price selector: {selector}")
-                min_price = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                # Try corresponding max price input
-                max_selectors = [
-                    selector.replace("min", "max"),
-                    selector.replace("Minimum", "Maximum"),
-                    selector.replace("minimum", "maximum")
-                ]
-                for max_selector in max_selectors:
-                    try:
-                        max_price = driver.find_element(By.CSS_SELECTOR, max_selector)
-                        break
-                    except:
-                        continue
-                if min_price and max_price:
-                    logger.info("Found both price input fields")
-                    break
-            except Exception as e:
-                logger.info(f"Price selector {selector} failed: {str(e)}")
-                continue
-                
-        if not min_price or not max_price:
+        try:
+            min_price, _ = registry.find(waits, "price_min", step="price_input", clickable=False)
+            max_price, _ = registry.find(waits, "price_max", step="price_input", clickable=False)
+        except TimeoutException:
             raise Exception("Could not find price input fields")
+        logger.info("Found both price input fields")
         
         # Calculate price range
-        budget = int(budget)
-        min_budget = max(0, budget - 100)
-        max_budget = budget + 100
+        min_budget, max_budget = budget_window(budget)
         
         logger.info(f"Setting price range: ${min_budget} - ${max_budget}")
         
         # Clear and set minimum price
         min_price.click()
-        time.sleep(1)
         min_price.send_keys(Keys.COMMAND + "a")  # For Mac
         min_price.send_keys(Keys.CONTROL + "a")  # For Windows
         min_price.send_keys(Keys.DELETE)
         min_price.send_keys(Keys.BACKSPACE)
-        time.sleep(1)
         min_price.send_keys(str(min_budget))
         min_price.send_keys(Keys.TAB)  # Tab out to trigger value update
-        time.sleep(1)
+        _wait_for_price_value(waits, min_price, min_budget)
         
         # Clear and set maximum price
         max_price.click()
-        time.sleep(1)
         max_price.send_keys(Keys.COMMAND + "a")  # For Mac
         max_price.send_keys(Keys.CONTROL + "a")  # For Windows
         max_price.send_keys(Keys.DELETE)
         max_price.send_keys(Keys.BACKSPACE)
-        time.sleep(1)
         max_price.send_keys(str(max_budget))
         max_price.send_keys(Keys.TAB)  # Tab out to trigger value update
-        time.sleep(2)
+        _wait_for_price_value(waits, max_price, max_budget)
+        # The "Show N places" count refreshes after a price change
+        waits.network_idle("filter_modal")
         
         # Verify the values were set correctly
         min_value = min_price.get_attribute('value')
@@ -195,34 +152,21 @@ def click_filter_and_set_budget(driver, budget):
         logger.info(f"Verified values - Min: {min_value}, Max: {max_value}")
         
         # --- UPDATED: Clicking the "Show 1,000+ places" element ---
-        # Try multiple selectors (for both <button> and <a>) similar to the 'Got it' logic.
-        show_selectors = [
-            '//button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "show") and contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "places")]',
-            '//a[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "show") and contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "places")]'
-        ]
-        show_button = None
-        for selector in show_selectors:
-            try:
-                show_button = WebDriverWait(driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, selector))
-                )
-                logger.info(f"Found show element using selector: {selector} with text: '{show_button.text}'")
-                break
-            except Exception as e:
-                logger.info(f"Selector {selector} failed: {e}")
-                continue
-        
-        if not show_button:
+        # Candidates cover both <button> and <a> variants
+        try:
+            show_button, selector = registry.find(waits, "show_button")
+        except TimeoutException:
             raise Exception("Could not find 'Show 1,000+ places' element")
+        logger.info(f"Found show element using selector: {selector} with text: '{show_button.text}'")
         
         driver.execute_script("arguments[0].scrollIntoView(true);", show_button)
-        time.sleep(1)
+        waits.in_viewport(show_button)
         show_button.click()
         logger.info("Clicked show places element")
         # --- END UPDATED ---
         
         # Wait for results to update
-        time.sleep(5)
+        waits.page_ready("results_update")
         
     except Exception as e:
         logger.error(f"Error setting budget filter: {e}")
@@ -256,153 +200,105 @@ AIRBNB_FEATURES = {
 # Default feature to select
 DEFAULT_FEATURE = "Amazing views"
 
-def select_feature(driver, feature_name=DEFAULT_FEATURE):
+def select_feature(driver, feature_name=DEFAULT_FEATURE, waits=None):
     """
     Select a specific feature/category in the Airbnb search.
     
     Args:
         driver: Selenium WebDriver instance
         feature_name: Name of the feature to select (default is "Amazing views")
+        waits: WaitEngine to use (a fresh one is created if omitted)
     
     Returns:
         bool: True if selection was successful, False otherwise
     """
+    waits = waits or WaitEngine(driver)
     try:
         logger.info(f"Attempting to select feature: {feature_name}")
         
         # Wait for the category scroller to be visible
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "categoryScroller"))
-        )
+        waits.element("category_bar", By.ID, "categoryScroller", clickable=False)
         
-        # Try to find the feature by its data-testid
-        feature_selector = f"//div[@data-testid='category-item--{feature_name}--unchecked']"
+        registry = default_registry()
         
         # Wait for the elements to be loaded
-        time.sleep(3)
+        waits.dom_settled("category_bar")
         
-        # Try to find the feature element
+        # Try to find the feature element (by data-testid or by its label text, in one probe)
         try:
-            feature_element = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, feature_selector))
-            )
+            feature_element, _ = registry.find(waits, "feature_item", feature=feature_name)
             logger.info(f"Found feature element: {feature_name}")
-        except:
+        except TimeoutException:
             # If not found, we might need to scroll through the categories
             logger.info("Feature not visible in current view, attempting to scroll categories")
             
             # Find and click the next button to scroll through categories
-            next_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='Next categories page']"))
-            )
+            next_button, _ = registry.find(waits, "feature_next")
             
             # Try clicking next button up to 5 times to find our feature
             for _ in range(5):
                 next_button.click()
-                time.sleep(1)
                 try:
-                    feature_element = WebDriverWait(driver, 3).until(
-                        EC.element_to_be_clickable((By.XPATH, feature_selector))
+                    feature_element, _ = registry.find(
+                        waits, "feature_item", step="feature_after_next", feature=feature_name
                     )
                     logger.info(f"Found feature element after scrolling: {feature_name}")
                     break
-                except:
+                except TimeoutException:
                     continue
             else:
-                # If we still can't find it, try one more approach - look for the label containing the feature name
-                try:
-                    feature_element = WebDriverWait(driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, f"//span[contains(text(), '{feature_name}')]/ancestor::label"))
-                    )
-                    logger.info(f"Found feature element by text: {feature_name}")
-                except:
-                    logger.error(f"Could not find feature: {feature_name}")
-                    return False
+                logger.error(f"Could not find feature: {feature_name}")
+                return False
         
         # Click the feature to select it
         driver.execute_script("arguments[0].scrollIntoView(true);", feature_element)
-        time.sleep(1)
+        waits.in_viewport(feature_element)
         feature_element.click()
         logger.info(f"Successfully selected feature: {feature_name}")
         
         # Wait for the page to update
-        time.sleep(3)
+        waits.page_ready("results_update")
         return True
         
     except Exception as e:
         logger.error(f"Error selecting feature {feature_name}: {str(e)}")
         return False
 
-def scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=DEFAULT_FEATURE):
+LISTING_CARD_SELECTOR = '[data-testid="card-container"]'
+
+def _listing_record(title, price_text, rating, listing_url, image_url):
+    """Build the output dict for one card, or None if the card has no usable data."""
+    # Only add listings that have some data
+    if any(x != "No " + y for x, y in zip([title, price_text, listing_url], ["title", "price", "URL"])):
+        return {
+            "title": title,
+            "price_text": price_text,
+            "rating": rating,
+            "url": listing_url,
+            "thumbnail": image_url if image_url != "No image" else None
+        }
+    return None
+
+def extract_listings_loop(driver):
     """
-    Scrape Airbnb listings using Selenium with handling for the "Got it" popup.
-    
+    Extract listing cards one WebDriver call at a time.
+
+    This is the original extraction path. Every find_element/text/get_attribute
+    is a separate round-trip to the driver, so it is slow on large pages, but it
+    is kept as a fallback and as the reference for compare_extraction_modes.
+
     Args:
-        destination (str): The destination to search for
-        checkin (str): Check-in date in YYYY-MM-DD format
-        checkout (str): Check-out date in YYYY-MM-DD format
-        guests (int): Number of guests
-        feature (str, optional): Property feature to filter by (default is "Amazing views")
-        
+        driver: Selenium WebDriver instance
+
     Returns:
-        dict: Dictionary containing listings and metadata
+        list: Listing dicts
     """
-    logger.info(f"Starting scraper for {destination}")
-    
-    base_url = "https://www.airbnb.com/s/"
-    search_url = (
-        f"{base_url}{destination.replace(' ', '%20')}/homes"
-        f"?checkin={checkin}&checkout={checkout}"
-        f"&adults={guests}"
-    )
-
-    # Set up Chrome options for headless mode
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")  # Use new headless mode
-    chrome_options.add_argument("--disable-gpu")  # Disable GPU acceleration
-    chrome_options.add_argument("--window-size=1920,1080")  # Set window size
-    chrome_options.add_argument("--no-sandbox")  # Bypass OS security model
-    chrome_options.add_argument("--disable-dev-shm-usage")  # Overcome limited resource problems
-    chrome_options.add_argument("--disable-extensions")  # Disable extensions
-    chrome_options.add_argument("--disable-notifications")  # Disable notifications
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")  # Set user agent
-    
-    logger.info("Starting Chrome in headless mode")
-    driver = webdriver.Chrome(options=chrome_options)
-    driver.get(search_url)
-    
-    # Wait for initial page load
-    WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.TAG_NAME, 'body'))
-    )
-    
-    # Try clicking 'Got it'
-    click_got_it(driver)
-    
-    # Select the specified feature
-    if feature and feature in AIRBNB_FEATURES:
-        logger.info(f"Selecting feature: {feature}")
-        select_feature(driver, feature)
-    
-    # Scroll to load all listings
-    scroll_page(driver)
-    
-    # Wait for listings to appear or time out
-    try:
-        WebDriverWait(driver, 15).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="card-container"]'))
-        )
-    except:
-        logger.warning("Listing cards did not appear. Possibly blocked or wrong URL/selectors.")
-        driver.quit()
-        return {"metadata": {}, "listings": []}
-    
     # Grab all listing cards
-    listings = driver.find_elements(By.CSS_SELECTOR, '[data-testid="card-container"]')
+    listings = driver.find_elements(By.CSS_SELECTOR, LISTING_CARD_SELECTOR)
     logger.info(f"Found {len(listings)} listings with [data-testid='card-container'].")
-    
+
     scraped_data = []
-    
+
     for listing in listings:
         try:
             # Title
@@ -416,7 +312,7 @@ def scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=DE
                     title = title_elem.text.strip()
                 except:
                     pass
-            
+
             # Price
             price_text = "No price"
             try:
@@ -428,7 +324,7 @@ def scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=DE
                     price_text = price_elem.text.strip()
                 except:
                     pass
-            
+
             # Rating
             rating = "No rating"
             try:
@@ -436,7 +332,7 @@ def scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=DE
                 rating = rating_elem.text.strip()
             except:
                 pass
-            
+
             # URL
             listing_url = "No URL"
             try:
@@ -444,7 +340,7 @@ def scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=DE
                 listing_url = link_elem.get_attribute('href')
             except:
                 pass
-            
+
             # Image URL
             image_url = "No image"
             try:
@@ -457,40 +353,626 @@ def scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=DE
                     image_url = img_elem.get_attribute('src')
                 except:
                     pass
-            
-            # Only add listings that have some data
-            if any(x != "No " + y for x, y in zip([title, price_text, listing_url], ["title", "price", "URL"])):
-                data = {
-                    "title": title,
-                    "price_text": price_text,
-                    "rating": rating,
-                    "url": listing_url,
-                    "thumbnail": image_url if image_url != "No image" else None
-                }
+
+            data = _listing_record(title, price_text, rating, listing_url, image_url)
+            if data:
                 scraped_data.append(data)
-        
+
         except Exception as e:
             logger.error(f"Error parsing a listing: {e}")
             continue
+
+    return scraped_data
+
+# Runs in the page and reads every card (or only cards not seen before) in one pass. The selector fallbacks
+# mirror extract_listings_loop exactly: first match wins, even if its text is
+# empty, and innerText/href/src match what Selenium's .text/get_attribute return.
+EXTRACT_CARDS_JS = """
+const onlyNew = arguments[1];
+const cards = document.querySelectorAll(arguments[0]);
+const text = (el) => (el.innerText || '').trim();
+const first = (card, selectors) => {
+    for (const sel of selectors) {
+        const el = card.querySelector(sel);
+        if (el) return el;
+    }
+    return null;
+};
+const out = [];
+for (const card of cards) {
+    if (onlyNew) {
+        // Incremental mode: skip cards already returned by an earlier call
+        if (card.hasAttribute('data-scraper-seen')) continue;
+        card.setAttribute('data-scraper-seen', '1');
+    }
+    const titleEl = first(card, ['[data-testid="listing-card-title"]', 'div[style*="--title"]']);
+    const priceEl = first(card, ['[data-testid="price-availability-row"]', 'span[style*="--pricing"]']);
+    const ratingEl = document.evaluate(
+        ".//span[contains(text(),'out of 5')]", card, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+    const linkEl = card.querySelector('a[href*="/rooms/"]');
+    const imgEl = first(card, ['img[data-testid="card-image"], img[decoding="async"]', 'picture img']);
+    out.push([
+        titleEl ? text(titleEl) : null,
+        priceEl ? text(priceEl) : null,
+        ratingEl ? text(ratingEl) : null,
+        linkEl ? linkEl.href : null,
+        imgEl ? imgEl.src : null
+    ]);
+}
+return out;
+"""
+
+def extract_listings_batch(driver, only_new=False):
+    """
+    Extract all listing cards with a single execute_script round-trip.
+
+    Args:
+        driver: Selenium WebDriver instance
+        only_new (bool): Return only cards not returned by a previous only_new call
+            on this page (cards are marked in the DOM as they are read)
+
+    Returns:
+        list: Listing dicts, in the same shape as extract_listings_loop
+    """
+    rows = driver.execute_script(EXTRACT_CARDS_JS, LISTING_CARD_SELECTOR, only_new) or []
+    if not only_new:
+        logger.info(f"Found {len(rows)} listings with [data-testid='card-container'].")
+
+    scraped_data = []
+    for title, price_text, rating, listing_url, image_url in rows:
+        data = _listing_record(
+            title if title is not None else "No title",
+            price_text if price_text is not None else "No price",
+            rating if rating is not None else "No rating",
+            listing_url if listing_url is not None else "No URL",
+            image_url if image_url is not None else "No image"
+        )
+        if data:
+            scraped_data.append(data)
+    return scraped_data
+
+def compare_extraction_modes(driver):
+    """
+    Time the per-card loop against the batch script on the current page.
+
+    Args:
+        driver: Selenium WebDriver instance with listing cards loaded
+
+    Returns:
+        dict: Timings in seconds, whether both paths agreed, and the batch listings
+    """
+    start = time.perf_counter()
+    loop_listings = extract_listings_loop(driver)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_listings = extract_listings_batch(driver)
+    batch_seconds = time.perf_counter() - start
+
+    speedup = loop_seconds / batch_seconds if batch_seconds else float("inf")
+    logger.info(
+        f"Extraction timing: loop {loop_seconds:.3f}s, batch {batch_seconds:.3f}s "
+        f"({speedup:.1f}x) for {len(batch_listings)} listings"
+    )
+    if loop_listings != batch_listings:
+        logger.warning("Loop and batch extraction returned different listings")
+
+    return {
+        "loop_seconds": round(loop_seconds, 4),
+        "batch_seconds": round(batch_seconds, 4),
+        "speedup": round(speedup, 2),
+        "identical": loop_listings == batch_listings,
+        "listings": batch_listings
+    }
+
+def extract_listings_network(driver, waits, search, blocker=None, since=0):
+    """
+    Decode listings from the search API responses the page fetched, without touching the DOM.
+
+    Args:
+        driver: Selenium WebDriver instance with the performance log enabled
+        waits (WaitEngine): Used to let in-flight search requests finish
+        search (dict): The search being scraped (for the length of stay)
+        blocker (ResourceBlocker, optional): Shares the performance log with the
+            resource report, which would otherwise lose the drained events
+        since (int): Index into blocker.events where this page load's events start,
+            when the blocker has been collecting over several page loads
+
+    Returns:
+        tuple: (listings, info) where info has the source used, the number of
+            search responses seen, the decode time and the pagination cursors
+    """
+    waits.network_idle("results_update")
+    start = time.perf_counter()
+    events = blocker.collect(driver)[since:] if blocker is not None else None
+    responses = capture_search_responses(driver, events)
+    listings, pagination = listings_from_responses(responses, search)
+    info = {
+        "source": "network" if listings else "dom",
+        "search_responses": len(responses),
+        "seconds": round(time.perf_counter() - start, 4),
+        "pagination": pagination
+    }
+    if listings:
+        logger.info(f"Decoded {len(listings)} listings from {len(responses)} search responses")
+    else:
+        logger.info("No search API results captured, falling back to DOM extraction")
+    return listings, info
+
+# Extraction modes the HTTP fast path can stand in for
+FAST_PATH_MODES = ("batch", "network")
+
+def scrape_airbnb_with_got_it(destination, checkin, checkout, guests, feature=DEFAULT_FEATURE,
+                              extraction_mode="batch", pool=None, wait_timeouts=None, budget=None,
+                              block_profile="default", allow_thumbnails=False, base_url=None,
+                              tracing=False, fast_path=True, deadline=None, hedge_after=None, breaker=None):
+    """
+    Scrape Airbnb listings using Selenium with handling for the "Got it" popup.
     
-    driver.quit()
+    Args:
+        destination (str): The destination to search for
+        checkin (str): Check-in date in YYYY-MM-DD format
+        checkout (str): Check-out date in YYYY-MM-DD format
+        guests (int): Number of guests
+        feature (str, optional): Property feature to filter by (default is "Amazing views")
+        extraction_mode (str, optional): "batch" reads every card in one script call,
+            "loop" uses the per-card WebDriver calls, "compare" runs both and
+            records the timings in metadata, "network" decodes the search API
+            responses and falls back to "batch" if none were captured (default is "batch")
+        pool (DriverPool, optional): Pool to borrow a warm driver from; a one-off
+            driver is launched and quit when omitted
+        wait_timeouts (dict, optional): Per-step timeout overrides for the WaitEngine,
+            keyed like waits.WAIT_TIMEOUTS
+        budget (int, optional): Nightly budget; filtered through the search URL, with the
+            Filters modal only used if the site drops the price parameters
+        block_profile (str, optional): Resource blocking profile from
+            resource_blocking.BLOCK_PROFILES; None downloads everything (default is "default")
+        allow_thumbnails (bool, optional): Let images load even if the profile blocks them
+        base_url (str, optional): Search root, e.g. a local replay server (default is airbnb.com)
+        tracing (bool, optional): Record a span per phase plus selector, wait and listing
+            counters in metadata["trace"] (default is False)
+        fast_path (bool, optional): Read the listings from the server-rendered search page
+            over plain HTTP first, and only use a browser if that fails. Applies to the
+            "batch" and "network" modes; "loop" and "compare" always measure the DOM
+            (default is True)
+        deadline (float or Deadline, optional): Seconds the whole scrape may take. Every
+            wait is capped at the time left, and once it runs out the remaining optional
+            phases are skipped and the listings found so far are returned with
+            metadata["partial"] set (default is no limit)
+        hedge_after (float, optional): Start a second attempt on another driver if the
+            browser scrape has not finished after this many seconds; the first complete
+            result wins (default is no hedging)
+        breaker (CircuitBreaker, optional): Refuses the scrape with CircuitOpenError after
+            repeated failures (defaults to the process-wide breaker)
+        
+    Returns:
+        dict: Dictionary containing listings and metadata
+
+    Raises:
+        CircuitOpenError: While the circuit breaker is open
+    """
+    logger.info(f"Starting scraper for {destination}")
     
-    # When creating the metadata, don't include budget-related fields
-    metadata = {
+    search = {
         "destination": destination,
         "checkin": checkin,
         "checkout": checkout,
         "guests": guests,
         "feature": feature,
-        "timestamp": datetime.now().isoformat(),
-        "total_listings": len(scraped_data)
+        "budget": budget,
+        "base_url": base_url
     }
     
+    deadline = as_deadline(deadline)
+    breaker = breaker or default_breaker()
+    breaker.allow()
+    try:
+        result = _scrape_search(search, extraction_mode, pool, wait_timeouts, block_profile, allow_thumbnails,
+                                tracing, fast_path, deadline, hedge_after)
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record(result)
+    return result
+
+def _scrape_search(search, extraction_mode, pool, wait_timeouts, block_profile, allow_thumbnails,
+                   tracing, fast_path, deadline, hedge_after):
+    trace = new_trace(tracing)
+    fast_path_info = None
+    if fast_path and extraction_mode in FAST_PATH_MODES:
+        result, fast_path_info = scrape_via_http(search, trace, deadline)
+        if result is not None:
+            return result
+    if not deadline.check("browser_scrape"):
+        metadata = _build_metadata(search, 0, {})
+        if fast_path_info:
+            metadata["fast_path"] = fast_path_info
+        return {"metadata": deadline.mark(metadata), "listings": []}
+
+    def attempt(attempt_deadline, index):
+        # Spans nest per thread, so a hedged attempt records into its own trace
+        attempt_trace = trace if index == 0 else new_trace(tracing)
+        return _scrape_with_new_driver(search, extraction_mode, pool, wait_timeouts, block_profile,
+                                       allow_thumbnails, attempt_trace, attempt_deadline, fast_path_info)
+
+    if hedge_after is None:
+        return attempt(deadline, 0)
+    result, hedge_info = hedged(attempt, hedge_after, deadline)
+    if result["metadata"]:
+        result["metadata"]["hedge"] = hedge_info
+    return result
+
+def _scrape_with_new_driver(search, extraction_mode, pool, wait_timeouts, block_profile, allow_thumbnails,
+                            trace, deadline, fast_path_info):
+    """Borrow (or launch) a driver and run one browser scrape of the search on it."""
+    if pool is not None:
+        driver_context = pool.driver(deadline.clamp(pool.checkout_timeout))
+    else:
+        driver_context = standalone_driver()
+    
+    acquire_started = time.perf_counter()
+    # The context manager quits (or recycles) the driver on every exit path,
+    # including exceptions raised by click_got_it or select_feature
+    with driver_context as driver:
+        trace.record("driver_acquire", acquire_started, time.perf_counter())
+        waits = WaitEngine(driver, timeouts=wait_timeouts, trace=trace, deadline=deadline)
+        blocker = ResourceBlocker(block_profile, allow_thumbnails=allow_thumbnails)
+        with trace.span("resource_blocking"):
+            blocker.apply(driver)
+        result = _scrape_with_driver(driver, waits, search, extraction_mode, blocker)
+        path_stats.record("selenium", fast_path_info and fast_path_info["fallback_reason"])
+        if result["metadata"]:
+            result["metadata"]["resources"] = blocker.report(driver)
+            if fast_path_info:
+                result["metadata"]["fast_path"] = fast_path_info
+                if _empty_search(fast_path_info):
+                    result["metadata"]["blocked"] = False
+            if trace.enabled:
+                result["metadata"]["trace"] = trace.report()
+        return result
+
+def _empty_search(fast_path_info):
+    """True if the server-rendered page decoded fine but held no listings: the search is empty, not blocked."""
+    return bool(fast_path_info) and fast_path_info.get("fallback_reason") == "no_listings"
+
+def scrape_via_http(search, trace, deadline=None):
+    """
+    Scrape a search from the server-rendered page without a browser (see http_fetch).
+
+    Returns:
+        tuple: (result, info) where result is None if the page could not be
+            used and the search has to go through Selenium
+    """
+    feature = search["feature"] if search["feature"] in AIRBNB_FEATURES else None
+    with trace.span("http_fetch"):
+        listings, info = fetch_listings_http(dict(search, feature=feature), deadline=deadline)
+    if not listings:
+        return None, info
+    path_stats.record("http")
+    trace.add("listings_extracted", value=len(listings))
+    filter_path = {}
+    if feature:
+        filter_path["feature"] = "url"
+    if search["budget"]:
+        filter_path["price"] = "url"
+    metadata = _build_metadata(search, len(listings), filter_path)
+    metadata["extraction"] = info
+    if deadline is not None:
+        deadline.mark(metadata)
+    if trace.enabled:
+        metadata["trace"] = trace.report()
+    return {"metadata": metadata, "listings": listings}, info
+
+def load_filtered_search(driver, waits, search):
+    """
+    Open the search results with every filter applied, preferring a single URL navigation.
+
+    Price range, guests, dates and the feature category are encoded in the search URL.
+    The Filters modal and the category bar are only driven when the site drops a
+    parameter or the feature's category tag has not been learned yet, and only
+    while the scrape's deadline has time left (a skipped filter is reported as None).
+
+    Returns:
+        dict: How each filter was applied, e.g. {"feature": "url", "price": "ui"}
+    """
+    feature = search["feature"] if search["feature"] in AIRBNB_FEATURES else None
+    budget = search["budget"]
+    search_url, feature_in_url = build_search_url(
+        search["destination"], search["checkin"], search["checkout"], search["guests"],
+        budget=budget, feature=feature, base_url=search.get("base_url") or BASE_URL
+    )
+    trace = waits.trace
+    deadline = waits.deadline
+    with trace.span("driver_get"):
+        _get_within_deadline(driver, search_url, deadline)
+        
+        # Wait for initial page load
+        waits.element("page_load", By.TAG_NAME, 'body', clickable=False)
+    
+    # Try clicking 'Got it'
+    if deadline.check("click_got_it"):
+        with trace.span("click_got_it"):
+            click_got_it(driver, waits)
+    
+    # Learn category tags from the bar so later searches can skip the UI entirely
+    if deadline.check("discover_category_tags"):
+        with trace.span("discover_category_tags"):
+            discover_category_tags(driver)
+    price_applied, feature_applied = url_filters_applied(driver.current_url)
+    filter_path = {}
+    
+    # Select the specified feature
+    if feature:
+        if feature_in_url and feature_applied:
+            filter_path["feature"] = "url"
+        elif not deadline.check("select_feature"):
+            filter_path["feature"] = None
+        else:
+            logger.info(f"Selecting feature: {feature}")
+            with trace.span("select_feature"):
+                selected = select_feature(driver, feature, waits)
+            if selected:
+                filter_path["feature"] = "ui"
+                tag = category_tag_from_url(driver.current_url)
+                if tag:
+                    save_category_tags({feature: tag})
+            else:
+                filter_path["feature"] = None
+    
+    if budget:
+        if price_applied:
+            filter_path["price"] = "url"
+        elif not deadline.check("click_filter_and_set_budget"):
+            filter_path["price"] = None
+        else:
+            logger.info("Price filter missing from URL, falling back to the Filters modal")
+            with trace.span("click_filter_and_set_budget"):
+                click_filter_and_set_budget(driver, budget, waits)
+            filter_path["price"] = "ui"
+    
+    return filter_path
+
+def _get_within_deadline(driver, url, deadline):
+    """Navigate, giving up on the page load (and keeping what has rendered) when the deadline passes."""
+    if not deadline.bounded:
+        driver.get(url)
+        return
+    driver.set_page_load_timeout(max(1, deadline.remaining()))
+    try:
+        driver.get(url)
+    except TimeoutException:
+        deadline.skip("page_load")
+        driver.execute_script("window.stop();")
+    finally:
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+
+def _scrape_with_driver(driver, waits, search, extraction_mode, blocker=None):
+    """Run one search on an already launched driver and build the result dict."""
+    trace = waits.trace
+    filter_path = load_filtered_search(driver, waits, search)
+    
+    network_info = None
+    if extraction_mode == "network":
+        with trace.span("extract_network"):
+            scraped_data, network_info = extract_listings_network(driver, waits, search, blocker)
+        if scraped_data:
+            trace.add("listings_extracted", value=len(scraped_data))
+            metadata = _build_metadata(search, len(scraped_data), filter_path, waits)
+            metadata["extraction"] = network_info
+            waits.deadline.mark(metadata)
+            return {"metadata": metadata, "listings": scraped_data}
+    
+    # Scroll to load all listings
+    with trace.span("scroll_page"):
+        scroll_page(driver, waits)
+    
+    # Wait for listings to appear or time out
+    try:
+        with trace.span("wait_for_cards"):
+            waits.element("listing_cards", By.CSS_SELECTOR, LISTING_CARD_SELECTOR, clickable=False)
+    except Exception:
+        if waits.deadline.expired():
+            # Out of time rather than blocked: keep whatever cards have rendered
+            waits.deadline.skip("listing_cards")
+        else:
+            logger.warning("Listing cards did not appear. Possibly blocked or wrong URL/selectors.")
+            metadata = _build_metadata(search, 0, filter_path, waits)
+            # A captured search response means the search really has no listings
+            metadata["blocked"] = not (network_info and network_info["search_responses"])
+            if network_info:
+                metadata["extraction"] = network_info
+            return {"metadata": waits.deadline.mark(metadata), "listings": []}
+    
+    extraction_timing = None
+    with trace.span(f"extract_{extraction_mode}"):
+        if extraction_mode == "compare":
+            extraction_timing = compare_extraction_modes(driver)
+            scraped_data = extraction_timing.pop("listings")
+        elif extraction_mode == "loop":
+            scraped_data = extract_listings_loop(driver)
+        else:
+            scraped_data = extract_listings_batch(driver)
+    trace.add("listings_extracted", value=len(scraped_data))
+    
+    metadata = _build_metadata(search, len(scraped_data), filter_path, waits)
+    if extraction_timing:
+        metadata["extraction_timing"] = extraction_timing
+    if network_info:
+        metadata["extraction"] = network_info
+    waits.deadline.mark(metadata)
+    
     return {
         "metadata": metadata,
         "listings": scraped_data
     }
 
+def _build_metadata(search, total_listings, filter_path, waits=None):
+    # When creating the metadata, don't include budget-related fields
+    metadata = {
+        "destination": search["destination"],
+        "checkin": search["checkin"],
+        "checkout": search["checkout"],
+        "guests": search["guests"],
+        "feature": search["feature"],
+        "timestamp": datetime.now().isoformat(),
+        "total_listings": total_listings,
+        "filter_path": filter_path
+    }
+    if waits is not None:
+        metadata["waits"] = waits.report()
+    return metadata
+
+def iter_airbnb_listings(destination, checkin, checkout, guests, feature=DEFAULT_FEATURE,
+                         max_listings=None, ndjson_path=None, pool=None, wait_timeouts=None,
+                         budget=None, block_profile="default", allow_thumbnails=False,
+                         base_url=None, tracing=False, fast_path=True, deadline=None, breaker=None):
+    """
+    Scrape Airbnb listings incrementally, yielding each one as soon as it renders.
+
+    New cards are extracted after every scroll step instead of after the whole
+    page has been scrolled, so the first results arrive after the first page load.
+    Listings are deduplicated by /rooms/<id>. Stop iterating (or pass max_listings)
+    to end the scrape early; the driver is released either way.
+
+    Args:
+        destination, checkin, checkout, guests, feature, pool, wait_timeouts, budget,
+        block_profile, allow_thumbnails, base_url, tracing, fast_path, deadline, breaker: Same as
+            scrape_airbnb_with_got_it; a fast path hit yields the whole page at once, and
+            when the deadline passes scrolling stops and the metadata is marked partial
+        max_listings (int, optional): Stop after this many unique listings
+        ndjson_path (str, optional): Also append each listing as one JSON line to this file
+
+    Yields:
+        dict: Listing dicts, in the same shape as scrape_airbnb_with_got_it output
+
+    Returns:
+        dict: Metadata for the scrape (as the generator's return value)
+    """
+    logger.info(f"Starting streaming scraper for {destination}")
+    search = {
+        "destination": destination,
+        "checkin": checkin,
+        "checkout": checkout,
+        "guests": guests,
+        "feature": feature,
+        "budget": budget,
+        "base_url": base_url
+    }
+    deadline = as_deadline(deadline)
+    breaker = breaker or default_breaker()
+    breaker.allow()
+    ndjson_file = open(ndjson_path, 'a', encoding='utf-8') if ndjson_path else None
+    seen = set()
+    fast_path_count = 0
+    failed = blocked = False
+    trace = new_trace(tracing)
+    
+    try:
+        fast_path_info = None
+        if fast_path:
+            result, fast_path_info = scrape_via_http(search, trace, deadline)
+            if result is not None:
+                listings = result["listings"][:max_listings] if max_listings else result["listings"]
+                fast_path_count = len(listings)
+                for listing in listings:
+                    if ndjson_file:
+                        ndjson_file.write(json.dumps(listing, ensure_ascii=False) + "\n")
+                        ndjson_file.flush()
+                    yield listing
+                result["metadata"]["total_listings"] = len(listings)
+                return result["metadata"]
+        if not deadline.check("browser_scrape"):
+            metadata = _build_metadata(search, 0, {})
+            if fast_path_info:
+                metadata["fast_path"] = fast_path_info
+            return deadline.mark(metadata)
+        
+        if pool is not None:
+            driver_context = pool.driver(deadline.clamp(pool.checkout_timeout))
+        else:
+            driver_context = standalone_driver()
+        acquire_started = time.perf_counter()
+        with driver_context as driver:
+            trace.record("driver_acquire", acquire_started, time.perf_counter())
+            waits = WaitEngine(driver, timeouts=wait_timeouts, trace=trace, deadline=deadline)
+            blocker = ResourceBlocker(block_profile, allow_thumbnails=allow_thumbnails)
+            with trace.span("resource_blocking"):
+                blocker.apply(driver)
+            filter_path = load_filtered_search(driver, waits, search)
+            
+            def finish(count):
+                path_stats.record("selenium", fast_path_info and fast_path_info["fallback_reason"])
+                metadata = _build_metadata(search, count, filter_path, waits)
+                metadata["resources"] = blocker.report(driver)
+                if fast_path_info:
+                    metadata["fast_path"] = fast_path_info
+                deadline.mark(metadata)
+                if trace.enabled:
+                    metadata["trace"] = trace.report()
+                return metadata
+            
+            try:
+                with trace.span("wait_for_cards"):
+                    waits.element("listing_cards", By.CSS_SELECTOR, LISTING_CARD_SELECTOR, clickable=False)
+            except TimeoutException:
+                if not deadline.expired():
+                    logger.warning("Listing cards did not appear. Possibly blocked or wrong URL/selectors.")
+                    blocked = not _empty_search(fast_path_info)
+                    metadata = finish(0)
+                    metadata["blocked"] = blocked
+                    return metadata
+                # Out of time rather than blocked: keep whatever cards have rendered
+                deadline.skip("listing_cards")
+            
+            last_height = driver.execute_script("return document.body.scrollHeight")
+            reached_end = False
+            while True:
+                with trace.span("extract_batch"):
+                    new_listings = extract_listings_batch(driver, only_new=True)
+                for listing in new_listings:
+                    key = room_id_from_url(listing["url"]) or listing["url"]
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    trace.add("listings_extracted")
+                    if ndjson_file:
+                        ndjson_file.write(json.dumps(listing, ensure_ascii=False) + "\n")
+                        ndjson_file.flush()
+                    yield listing
+                    if max_listings and len(seen) >= max_listings:
+                        logger.info(f"Reached max_listings={max_listings}, stopping early")
+                        return finish(len(seen))
+                
+                if reached_end or not deadline.check("scroll_page"):
+                    break
+                with trace.span("scroll_step"):
+                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                    waits.network_idle("scroll_step")
+                    waits.dom_settled("scroll_step")
+                    new_height = driver.execute_script("return document.body.scrollHeight")
+                # One more extraction pass picks up cards rendered by the last scroll
+                reached_end = new_height == last_height
+                last_height = new_height
+            
+            logger.info(f"Streamed {len(seen)} unique listings")
+            return finish(len(seen))
+    except Exception:
+        failed = True
+        raise
+    finally:
+        # Also runs when the scrape raises or the consumer stops early (GeneratorExit)
+        if failed or blocked:
+            breaker.record_failure()
+        elif (seen or fast_path_count) and not deadline.skipped:
+            breaker.record_success()
+        else:
+            # Out of time, closed before the first listing, or a search without listings
+            breaker.release()
+        if ndjson_file:
+            ndjson_file.close()
+
 if __name__ == "__main__":
     destination_input = input("What's the destination? : ")
     checkin_input = input("What's the check-in date (YYYY-MM-DD)? : ")
@@ -515,21 +997,45 @@ if __name__ == "__main__":
             if feature_input in AIRBNB_FEATURES:
                 selected_feature = feature_input
     
-    logger.info(f"Starting scraper in headless mode with feature: {selected_feature}...")
-    results = scrape_airbnb_with_got_it(
-        destination=destination_input, 
-        checkin=checkin_input, 
-        checkout=checkout_input, 
-        guests=guests_input,
-        feature=selected_feature
-    )
+    stream_input = input("Stream listings to an NDJSON file as they are found? (y/N): ")
     
     # Create filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"airbnb_listings_{destination_input.lower().replace(' ', '_')}_{timestamp}.json"
-    
-    # Save to JSON
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    base_name = f"airbnb_listings_{destination_input.lower().replace(' ', '_')}_{timestamp}"
     
-    logger.info(f"Data saved to {filename}")
\ No newline at end of file
+    logger.info(f"Starting scraper in headless mode with feature: {selected_feature}...")
+    if stream_input.strip().lower().startswith("y"):
+        filename = f"{base_name}.ndjson"
+        count = 0
+        for listing in iter_airbnb_listings(
+            destination=destination_input,
+            checkin=checkin_input,
+            checkout=checkout_input,
+            guests=guests_input,
+            feature=selected_feature,
+            ndjson_path=filename
+        ):
+            count += 1
+            logger.info(f"[{count}] {listing['title']} - {listing['price_text']}")
+        logger.info(f"Data saved to {filename}")
+    else:
+        results = scrape_airbnb_with_got_it(
+            destination=destination_input, 
+            checkin=checkin_input, 
+            checkout=checkout_input, 
+            guests=guests_input,
+            feature=selected_feature
+        )
+        
+        filename = f"{base_name}.json"
+        
+        # Save to JSON
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        
+        logger.info(f"Data saved to {filename}")
+        
+        # Index the snapshot so filter queries don't have to rescan JSON files
+        from listing_store import ListingStore
+        with ListingStore() as store:
+            store.add_result(results, source_file=os.path.abspath(filename))
@@ -0,0 +1,136 @@
+from urllib.parse import quote, urlencode, urlparse, parse_qs
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://www.airbnb.com/s/"
+
+# Budget requests are turned into a price window of +/- this many dollars
+BUDGET_WINDOW = 100
+
+# Category tags (e.g. "Tag:8678") learned from the live site, keyed by feature name.
+# Airbnb does not document these ids, so they are discovered from the category bar
+# or from the URL after a UI selection and persisted here for later searches.
+CATEGORY_TAGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_tags.json")
+
+# Reads every category link in the category bar and returns {label: category_tag}
+DISCOVER_CATEGORY_TAGS_JS = """
+const tags = {};
+const bar = document.getElementById('categoryScroller') || document;
+for (const el of bar.querySelectorAll('a[href*="category_tag"], [data-testid^="category-item--"]')) {
+    const link = el.tagName === 'A' ? el : el.closest('a') || el.querySelector('a[href*="category_tag"]');
+    if (!link) continue;
+    const tag = new URL(link.href, location.href).searchParams.get('category_tag');
+    if (!tag) continue;
+    let label = (el.innerText || link.innerText || '').trim();
+    const testid = el.getAttribute('data-testid') || '';
+    const m = testid.match(/^category-item--(.+)--(un)?checked$/);
+    if (m) label = m[1];
+    if (label) tags[label] = tag;
+}
+return tags;
+"""
+
+def budget_window(budget):
+    """
+    Price range searched for a nightly budget.
+
+    Returns:
+        tuple: (min_price, max_price) in whole dollars
+    """
+    budget = int(budget)
+    return max(0, budget - BUDGET_WINDOW), budget + BUDGET_WINDOW
+
+def load_category_tags(path=CATEGORY_TAGS_FILE):
+    """Load the learned feature -> category_tag mapping."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_category_tags(tags, path=CATEGORY_TAGS_FILE):
+    """Merge newly learned category tags into the persisted mapping."""
+    if not tags:
+        return
+    known = load_category_tags(path)
+    if all(known.get(name) == tag for name, tag in tags.items()):
+        return
+    known.update(tags)
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(known, f, indent=2, ensure_ascii=False)
+        logger.info(f"Saved {len(tags)} category tags to {path}")
+    except OSError as e:
+        logger.warning(f"Could not save category tags: {e}")
+
+def discover_category_tags(driver):
+    """Read the category bar of the loaded search page and persist any tags it links to."""
+    try:
+        tags = driver.execute_script(DISCOVER_CATEGORY_TAGS_JS) or {}
+    except Exception as e:
+        logger.info(f"Could not read category tags from page: {e}")
+        return {}
+    save_category_tags(tags)
+    return tags
+
+def category_tag_from_url(url):
+    """Return the category_tag query parameter of a search URL, if any."""
+    values = parse_qs(urlparse(url).query).get("category_tag")
+    return values[0] if values else None
+
+def build_search_url(destination, checkin, checkout, guests, budget=None, feature=None,
+                     category_tags=None, base_url=BASE_URL, extra_params=None):
+    """
+    Build a /s/<destination>/homes search URL with every filter encoded as query parameters.
+
+    Args:
+        destination (str): The destination to search for
+        checkin (str): Check-in date in YYYY-MM-DD format
+        checkout (str): Check-out date in YYYY-MM-DD format
+        guests (int): Number of guests
+        budget (int, optional): Nightly budget; encoded as a price_min/price_max window
+        feature (str, optional): Feature name from AIRBNB_FEATURES
+        category_tags (dict, optional): Feature -> category_tag mapping (loaded from disk if omitted)
+        base_url (str, optional): Search root, overridable for local stand-in servers
+        extra_params (dict, optional): Additional query parameters (e.g. pagination cursors)
+
+    Returns:
+        tuple: (url, feature_in_url) where feature_in_url is False if the feature
+            has no known category tag and must be selected through the UI
+    """
+    params = {
+        "checkin": checkin,
+        "checkout": checkout,
+        "adults": guests
+    }
+    if budget:
+        params["price_min"], params["price_max"] = budget_window(budget)
+
+    feature_in_url = not feature
+    if feature:
+        tags = category_tags if category_tags is not None else load_category_tags()
+        tag = tags.get(feature)
+        if tag:
+            params["category_tag"] = tag
+            feature_in_url = True
+
+    if extra_params:
+        params.update(extra_params)
+
+    url = f"{base_url}{quote(destination)}/homes?{urlencode(params)}"
+    return url, feature_in_url
+
+def url_filters_applied(url):
+    """
+    Check which filters the page kept after loading; the site may redirect some away.
+
+    Returns:
+        tuple: (price_applied, feature_applied)
+    """
+    params = parse_qs(urlparse(url).query)
+    price_applied = "price_min" in params or "price_max" in params
+    feature_applied = "category_tag" in params
+    return price_applied, feature_applied
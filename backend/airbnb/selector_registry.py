@@ -0,0 +1,349 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+
+from selenium.common.exceptions import TimeoutException
+
+logger = logging.getLogger(__name__)
+
+SELECTOR_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "selector_cache.json")
+
+# Candidate selectors per UI element, in preference order. Strings starting with
+# "//" or "(" are XPath, everything else is CSS. "{feature}" is filled in per call;
+# in XPath candidates it stands for a whole string literal (see xpath_literal).
+SELECTOR_CANDIDATES = {
+    "got_it": [
+        '//button[contains(text(), "Got it")]',
+        '//button[contains(text(), "Accept")]',
+        '//button[contains(@aria-label, "Got it")]'
+    ],
+    "filter_button": [
+        'button[data-testid="searchbar-filter-button"]',
+        'button[aria-label*="filter"]',
+        'button[aria-label*="Filter"]',
+        '//button[.//span[contains(text(), "Filters")]]',
+        '//button[contains(., "Filters")]',
+        'button[data-testid="filter-bar-filter-button"]',
+        'button[role="button"][tabindex="0"]'
+    ],
+    "price_min": [
+        'input[id="price_filter_min"]',
+        'input[data-testid="price-filter-min"]',
+        'input[placeholder="min price"]',
+        'input[placeholder="Minimum"]',
+        'input[aria-label="Minimum price"]'
+    ],
+    "price_max": [
+        'input[id="price_filter_max"]',
+        'input[data-testid="price-filter-max"]',
+        'input[placeholder="max price"]',
+        'input[placeholder="Maximum"]',
+        'input[aria-label="Maximum price"]'
+    ],
+    "show_button": [
+        '//button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "show") and contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "places")]',
+        '//a[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "show") and contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "places")]'
+    ],
+    "feature_item": [
+        "//div[@data-testid=concat('category-item--', {feature}, '--unchecked')]",
+        # Exact label text: contains() would let "Lake" pick "Lakefront" and be learned as the winner
+        "//span[normalize-space(.)={feature}]/ancestor::label"
+    ],
+    "feature_next": [
+        "//button[@aria-label='Next categories page']"
+    ]
+}
+
+# A candidate that matched nothing in this many consecutive probes is reported as stale
+STALE_AFTER_PROBES = 5
+# Site versions kept in the cache file
+MAX_CACHED_VERSIONS = 10
+
+# Evaluates every candidate in one round-trip. Returns [winner index, winner element,
+# per-candidate status] where status is -1 invalid, 0 absent, 1 present, 2 visible and enabled.
+PROBE_SELECTORS_JS = """
+const candidates = arguments[0];
+const mustBeVisible = arguments[1];
+const statuses = [];
+let winner = -1, element = null;
+for (let i = 0; i < candidates.length; i++) {
+    const [kind, selector] = candidates[i];
+    let el = null;
+    try {
+        el = kind === 'xpath'
+            ? document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+            : document.querySelector(selector);
+    } catch (e) {
+        statuses.push(-1);
+        continue;
+    }
+    if (!el) {
+        statuses.push(0);
+        continue;
+    }
+    const rect = el.getBoundingClientRect();
+    const style = getComputedStyle(el);
+    const usable = rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' &&
+                   style.display !== 'none' && !el.disabled;
+    statuses.push(usable ? 2 : 1);
+    if (winner < 0 && (usable || !mustBeVisible)) {
+        winner = i;
+        element = el;
+    }
+}
+return [winner, element, statuses];
+"""
+
+# Fingerprint of the deployed frontend: an explicit version meta tag if there is
+# one, otherwise the file names of the bundled scripts (they carry content hashes)
+SITE_VERSION_JS = """
+const meta = document.querySelector('meta[name="version"], meta[name="app-version"], meta[name="build-version"]');
+if (meta && meta.content) return meta.content;
+const names = Array.from(document.scripts)
+    .map(s => s.src)
+    .filter(src => src && /\\.js(\\?|$)/.test(src))
+    .map(src => src.split('?')[0].split('/').pop())
+    .sort();
+return names.length ? names.join('|') : null;
+"""
+
+def xpath_literal(value):
+    """
+    XPath 1.0 string literal for any text.
+
+    XPath has no escapes, so a value with both quote kinds ("Chef's kitchens" is
+    fine with double quotes) is assembled with concat().
+    """
+    value = str(value)
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in value.split("'")) + ")"
+
+def _fill(template, fmt):
+    if not fmt:
+        return template
+    if selector_kind(template) == "xpath":
+        return template.format(**{name: xpath_literal(value) for name, value in fmt.items()})
+    return template.format(**fmt)
+
+def selector_kind(selector):
+    """"xpath" or "css", inferred the same way the scraper always has."""
+    return "xpath" if selector.startswith(("//", "(")) else "css"
+
+class SelectorRegistry:
+    """
+    Resolves UI elements from lists of candidate selectors with a single in-page probe.
+
+    Instead of one WebDriverWait per candidate (each paying its full timeout when
+    the markup changed), every candidate is evaluated in one script call that is
+    polled until something matches, so a lookup costs at most one step timeout.
+    The selector that won is remembered per site version in a JSON cache and
+    preferred next time; each probe also shows which other candidates still
+    match, so dead candidates are found without waiting on them.
+    """
+
+    def __init__(self, path=SELECTOR_CACHE_FILE, candidates=None, stale_after=STALE_AFTER_PROBES):
+        """
+        Args:
+            path (str, optional): Cache file (None keeps the cache in memory only)
+            candidates (dict, optional): Role -> candidate list, overriding SELECTOR_CANDIDATES
+            stale_after (int): Consecutive non-matching probes before a candidate is stale
+        """
+        self.path = path
+        self.candidates = dict(SELECTOR_CANDIDATES)
+        if candidates:
+            self.candidates.update(candidates)
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._session_versions = {}
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._versions = json.load(f).get("versions", {})
+        except (OSError, ValueError):
+            self._versions = {}
+
+    def save(self):
+        """Write the cache atomically, keeping the most recently used site versions."""
+        if not self.path:
+            return
+        with self._lock:
+            recent = sorted(self._versions.items(), key=lambda item: item[1].get("seen", 0), reverse=True)
+            self._versions = dict(recent[:MAX_CACHED_VERSIONS])
+            data = json.dumps({"versions": self._versions}, indent=2, ensure_ascii=False)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save selector cache: {e}")
+
+    def site_version(self, driver):
+        """Short fingerprint of the frontend build the driver has loaded (cached per page URL)."""
+        key = (getattr(driver, "session_id", None), driver.current_url)
+        version = self._session_versions.get(key)
+        if version is None:
+            try:
+                raw = driver.execute_script(SITE_VERSION_JS)
+            except Exception:
+                raw = None
+            version = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12] if raw else "unknown"
+            if len(self._session_versions) > 64:
+                self._session_versions.clear()
+            self._session_versions[key] = version
+        return version
+
+    def _role_state(self, version, role):
+        """Caller holds the lock."""
+        entry = self._versions.setdefault(version, {"seen": 0, "roles": {}})
+        entry["seen"] = time.time()
+        return entry["roles"].setdefault(role, {
+            "winner": None, "lookups": 0, "hits": 0, "fallbacks": 0, "failures": 0, "misses": {}
+        })
+
+    def _previous_winner(self, role):
+        """Caller holds the lock. Winner from the most recently seen version, for a new build."""
+        best = None
+        for entry in self._versions.values():
+            state = entry["roles"].get(role)
+            if state and state.get("winner") and (best is None or entry["seen"] > best[0]):
+                best = (entry["seen"], state["winner"])
+        return best[1] if best else None
+
+    def ordered_candidates(self, role, version):
+        """Candidates for a role with the remembered winner first."""
+        candidates = list(self.candidates[role])
+        with self._lock:
+            state = self._versions.get(version, {}).get("roles", {}).get(role)
+            winner = state["winner"] if state and state.get("winner") else self._previous_winner(role)
+        if winner in candidates:
+            candidates.remove(winner)
+            candidates.insert(0, winner)
+        return candidates
+
+    def find(self, waits, role, step=None, clickable=True, timeout=None, **fmt):
+        """
+        Wait until any candidate for `role` matches and return its element.
+
+        Args:
+            waits (WaitEngine): Supplies the driver, step timeouts and trace
+            role (str): Key into the candidate table
+            step (str, optional): Wait step for the timeout (defaults to the role)
+            clickable (bool): Require the element to be visible and enabled
+            timeout (float, optional): Explicit timeout instead of the step's
+            **fmt: Values for placeholders in the candidates, e.g. feature="Lake"
+
+        Returns:
+            tuple: (element, winning selector template)
+
+        Raises:
+            TimeoutException: If no candidate matched within the step timeout
+        """
+        driver = waits.driver
+        step = step or role
+        version = self.site_version(driver)
+        templates = self.ordered_candidates(role, version)
+        probe = [[selector_kind(t), _fill(t, fmt)] for t in templates]
+        last = {}
+
+        def condition(d):
+            winner, element, statuses = d.execute_script(PROBE_SELECTORS_JS, probe, clickable)
+            last["statuses"] = statuses
+            return (templates[winner], element) if winner >= 0 else False
+
+        waits.trace.add("selector_attempts", step)
+        try:
+            winner, element = waits.until(step, condition, timeout)
+        except TimeoutException:
+            waits.trace.add("selector_failures", step)
+            self._record(version, role, templates, None, last.get("statuses"))
+            raise
+        self._record(version, role, templates, winner, last.get("statuses"))
+        return element, winner
+
+    def _record(self, version, role, templates, winner, statuses):
+        """Update the role's counters; the cache file is only rewritten when its winner changes."""
+        changed = False
+        with self._lock:
+            state = self._role_state(version, role)
+            state["lookups"] += 1
+            if winner is None:
+                state["failures"] += 1
+            else:
+                # A hit means the selector tried first (the remembered winner) won
+                if winner == templates[0]:
+                    state["hits"] += 1
+                else:
+                    state["fallbacks"] += 1
+                if winner != state["winner"]:
+                    if state["winner"]:
+                        logger.info(f"Selector for '{role}' changed: {state['winner']} -> {winner}")
+                    state["winner"] = winner
+                    changed = True
+            for template, status in zip(templates, statuses or []):
+                if status <= 0:
+                    state["misses"][template] = state["misses"].get(template, 0) + 1
+                else:
+                    state["misses"].pop(template, None)
+        if changed:
+            self.save()
+
+    def stale_candidates(self, version=None):
+        """
+        Candidates that matched nothing in the last `stale_after` probes.
+
+        Returns:
+            dict: role -> list of selectors
+        """
+        stale = {}
+        with self._lock:
+            versions = [self._versions[version]] if version in self._versions else list(self._versions.values())
+            for entry in versions:
+                for role, state in entry["roles"].items():
+                    for template, misses in state["misses"].items():
+                        if misses >= self.stale_after and template not in stale.get(role, []):
+                            stale.setdefault(role, []).append(template)
+        return stale
+
+    def stats(self):
+        """
+        Per-role lookup counters across cached site versions.
+
+        hit_rate is the share of successful lookups won by the selector tried first.
+        """
+        totals = {}
+        with self._lock:
+            for entry in self._versions.values():
+                for role, state in entry["roles"].items():
+                    role_totals = totals.setdefault(role, {"lookups": 0, "hits": 0, "fallbacks": 0, "failures": 0})
+                    for name in role_totals:
+                        role_totals[name] += state[name]
+                    role_totals["winner"] = state["winner"] or role_totals.get("winner")
+        stale = self.stale_candidates()
+        for role, role_totals in totals.items():
+            found = role_totals["hits"] + role_totals["fallbacks"]
+            role_totals["hit_rate"] = round(role_totals["hits"] / found, 3) if found else 0.0
+            role_totals["stale_candidates"] = stale.get(role, [])
+        return totals
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+def default_registry():
+    """Process-wide SelectorRegistry backed by SELECTOR_CACHE_FILE, created on first use."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = SelectorRegistry()
+        return _default_registry
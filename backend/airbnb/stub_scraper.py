@@ -0,0 +1,46 @@
+import hashlib
+import time
+from datetime import datetime
+
+def stub_listings(destination, checkin, checkout, guests, feature=None, count=20, delay=0.05, **kwargs):
+    """
+    Yield deterministic fake listings, pausing between them like a scrolling scrape.
+
+    Used to exercise the service locally without launching Chrome. The listing
+    dicts have the same shape as scrape_airbnb_with_got_it output, and the
+    metadata is the generator's return value, like iter_airbnb_listings.
+    """
+    seed = f"{destination}|{checkin}|{checkout}|{guests}|{feature}"
+    for i in range(count):
+        digest = hashlib.sha1(f"{seed}|{i}".encode()).hexdigest()
+        room_id = int(digest[:8], 16)
+        rating = 4.0 + (int(digest[8:10], 16) % 100) / 100
+        reviews = int(digest[10:13], 16) % 400
+        price = 50 + int(digest[13:16], 16) % 300
+        time.sleep(delay)
+        yield {
+            "title": f"Stub stay {i + 1} in {destination}",
+            "price_text": f"${price} night",
+            "rating": f"{rating:.2f} out of 5 average rating, {reviews} reviews",
+            "url": f"https://www.airbnb.com/rooms/{room_id}",
+            "thumbnail": None
+        }
+    return {
+        "destination": destination,
+        "checkin": checkin,
+        "checkout": checkout,
+        "guests": guests,
+        "feature": feature,
+        "timestamp": datetime.now().isoformat(),
+        "total_listings": count
+    }
+
+def stub_scrape(destination, checkin, checkout, guests, feature=None, **kwargs):
+    """Drop-in replacement for scrape_airbnb_with_got_it that returns stub listings."""
+    listings = []
+    generator = stub_listings(destination, checkin, checkout, guests, feature, **kwargs)
+    while True:
+        try:
+            listings.append(next(generator))
+        except StopIteration as stop:
+            return {"metadata": stop.value, "listings": listings}
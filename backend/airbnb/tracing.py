@@ -0,0 +1,228 @@
+from collections import defaultdict
+import bisect
+import threading
+import time
+
+class _Span:
+    """One timed phase of a Trace, used as a context manager."""
+
+    __slots__ = ("trace", "name", "start", "parent")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.start = None
+        self.parent = None
+
+    def __enter__(self):
+        stack = self.trace._stack
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace._stack.pop()
+        self.trace.record(self.name, self.start, time.perf_counter(), self.parent, exc_type is not None)
+        return False
+
+class Trace:
+    """
+    Per-scrape record of timed phases (spans) and labelled counters.
+
+    One Trace belongs to one scrape and is only touched by the thread running it.
+    It travels with the WaitEngine, so every function that already takes `waits`
+    can open a span with `waits.trace.span(...)`.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = defaultdict(float)
+        self._stack = []
+
+    def span(self, name):
+        """Time a phase: `with trace.span("scroll_page"): ...`. Spans nest."""
+        return _Span(self, name)
+
+    def record(self, name, start, end, parent=None, failed=False):
+        """Add a span measured by the caller (perf_counter timestamps)."""
+        self.spans.append({
+            "name": name,
+            "parent": parent,
+            "start": round(start - self.started, 4),
+            "seconds": round(end - start, 4),
+            "failed": failed
+        })
+
+    def add(self, name, label=None, value=1):
+        """Increment a counter, optionally per label (e.g. a wait step)."""
+        self.counters[(name, label)] += value
+
+    def report(self):
+        """
+        Returns:
+            dict: total_seconds, per-phase totals, the span list and counters
+                grouped as {name: total} or {name: {label: total}}
+        """
+        phases = {}
+        for span in self.spans:
+            phases[span["name"]] = round(phases.get(span["name"], 0.0) + span["seconds"], 4)
+        counters = {}
+        for (name, label), value in sorted(self.counters.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            value = round(value, 4) if isinstance(value, float) and not value.is_integer() else int(value)
+            if label is None:
+                counters[name] = value
+            else:
+                counters.setdefault(name, {})[label] = value
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "phases": phases,
+            "spans": self.spans,
+            "counters": counters
+        }
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _NullTrace:
+    """Tracing turned off: every call is a no-op returning shared objects."""
+
+    enabled = False
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def record(self, name, start, end, parent=None, failed=False):
+        pass
+
+    def add(self, name, label=None, value=1):
+        pass
+
+    def report(self):
+        return None
+
+NULL_TRACE = _NullTrace()
+
+def new_trace(enabled=True):
+    """A fresh Trace, or the shared no-op trace when tracing is off."""
+    return Trace() if enabled else NULL_TRACE
+
+# Histogram buckets in seconds, from a quick DOM wait up to a full blocked scrape
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + inner + "}"
+
+def _format_value(value):
+    # Full precision: "%g" would turn a counter of 1234567 into 1.23457e+06
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms rendered in the Prometheus text format.
+
+    Kept dependency-free; the service exposes render() at /metrics for scraping.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = histogram[0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def record_trace(self, report):
+        """Fold one scrape's trace report into the service metrics."""
+        if not report:
+            return
+        self.observe("airbnb_scrape_duration_seconds", report["total_seconds"])
+        for span in report["spans"]:
+            self.observe("airbnb_scrape_phase_seconds", span["seconds"], phase=span["name"])
+        counters = report["counters"]
+        for step, count in counters.get("selector_attempts", {}).items():
+            self.inc("airbnb_selector_attempts_total", count, step=step)
+        for step, count in counters.get("selector_failures", {}).items():
+            self.inc("airbnb_selector_failures_total", count, step=step)
+        for step, seconds in counters.get("wait_seconds", {}).items():
+            self.inc("airbnb_wait_seconds_total", seconds, step=step)
+        self.inc("airbnb_listings_extracted_total", counters.get("listings_extracted", 0))
+
+    def render(self):
+        """Prometheus text exposition of every metric."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, ([*h[0]], h[1], h[2])) for key, h in self._histograms.items())
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (counts, total, count) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.describe("airbnb_scrapes_total", "Scrape jobs finished, by status")
+metrics.describe("airbnb_scrape_duration_seconds", "Wall time of traced scrapes")
+metrics.describe("airbnb_scrape_phase_seconds", "Wall time per scrape phase")
+metrics.describe("airbnb_selector_attempts_total", "Element waits attempted, by wait step")
+metrics.describe("airbnb_selector_failures_total", "Element waits that timed out, by wait step")
+metrics.describe("airbnb_wait_seconds_total", "Seconds spent blocked in waits, by wait step")
+metrics.describe("airbnb_listings_extracted_total", "Listings extracted by traced scrapes")
@@ -0,0 +1,253 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+import time
+import logging
+
+from resilience import Deadline
+from tracing import NULL_TRACE
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds for each named step. A wait returns as soon as its
+# condition holds, so these only matter on slow or broken pages.
+WAIT_TIMEOUTS = {
+    "page_load": 10,
+    "got_it": 5,
+    "filter_button": 5,
+    "filter_modal": 10,
+    "price_input": 10,
+    "input_value": 3,
+    "show_button": 10,
+    "results_update": 15,
+    "category_bar": 10,
+    "feature_item": 10,
+    "feature_next": 5,
+    "feature_after_next": 3,
+    "scroll_into_view": 3,
+    "scroll_step": 5,
+    "listing_cards": 15,
+    "dom_settled": 5,
+    "network_idle": 10
+}
+
+# Quiet periods in milliseconds used by the DOM-settled and network-idle signals
+DOM_QUIET_MS = 300
+NETWORK_IDLE_MS = 500
+
+# Resolves once no DOM mutation has been seen for `quiet` ms, or with false at `timeout`.
+DOM_SETTLED_JS = """
+const quiet = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+let quietTimer = null, hardTimer = null;
+const observer = new MutationObserver(() => {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => finish(true), quiet);
+});
+function finish(settled) {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(hardTimer);
+    done(settled);
+}
+observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+quietTimer = setTimeout(() => finish(true), quiet);
+hardTimer = setTimeout(() => finish(false), timeout);
+"""
+
+# Tracks in-flight fetch/XHR calls (installed once per document) and resolves once
+# none are pending and no resource has finished loading for `idle` ms.
+NETWORK_IDLE_JS = """
+const idle = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+if (!window.__scraperNet) {
+    const net = window.__scraperNet = {inflight: 0, last: performance.now()};
+    const settle = () => { net.inflight = Math.max(0, net.inflight - 1); net.last = performance.now(); };
+    const origFetch = window.fetch;
+    if (origFetch) {
+        window.fetch = function() {
+            net.inflight++;
+            return origFetch.apply(this, arguments).finally(settle);
+        };
+    }
+    const origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        net.inflight++;
+        this.addEventListener('loadend', settle, {once: true});
+        return origSend.apply(this, arguments);
+    };
+}
+const net = window.__scraperNet;
+const lastResource = () => {
+    const entries = performance.getEntriesByType('resource');
+    return entries.length ? entries[entries.length - 1].responseEnd : 0;
+};
+const start = performance.now();
+const poll = () => {
+    const now = performance.now();
+    const last = Math.max(net.last, lastResource());
+    if (net.inflight === 0 && now - last >= idle) return done(true);
+    if (now - start >= timeout) return done(false);
+    setTimeout(poll, 50);
+};
+poll();
+"""
+
+IN_VIEWPORT_JS = """
+const r = arguments[0].getBoundingClientRect();
+return r.bottom > 0 && r.right > 0 && r.top < window.innerHeight && r.left < window.innerWidth;
+"""
+
+class WaitEngine:
+    """
+    Condition-driven waits for one driver, with per-step timeouts and timing records.
+
+    Every wait is named after the scraping step it belongs to. Timeouts come from
+    WAIT_TIMEOUTS, overridden per engine by the `timeouts` dict, and the time each
+    step actually spent waiting is available from report(). The engine also
+    carries the scrape's Trace, so callers can open phase spans on waits.trace,
+    and its Deadline, which caps every timeout at the time the scrape has left.
+    """
+
+    def __init__(self, driver, timeouts=None, poll_frequency=0.1, trace=None, deadline=None):
+        """
+        Args:
+            driver: Selenium WebDriver instance
+            timeouts (dict, optional): Step name -> timeout in seconds, overriding WAIT_TIMEOUTS
+            poll_frequency (float): Seconds between condition checks
+            trace (Trace, optional): Receives wait time and selector counters (tracing off if omitted)
+            deadline (Deadline, optional): Overall budget of the scrape (no limit if omitted)
+        """
+        self.driver = driver
+        self.timeouts = dict(WAIT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.poll_frequency = poll_frequency
+        self.records = []
+        self.trace = trace or NULL_TRACE
+        self.deadline = deadline or Deadline()
+
+    def timeout_for(self, step, timeout=None):
+        """
+        Resolve the timeout for a step: explicit argument, then configured value, then
+        dom_settled, capped at the time left before the deadline.
+        """
+        if timeout is None:
+            timeout = self.timeouts.get(step, self.timeouts["dom_settled"])
+        return self.deadline.clamp(timeout)
+
+    def _record(self, step, started, ok):
+        waited = time.perf_counter() - started
+        self.records.append({"step": step, "waited": waited, "ok": ok})
+        self.trace.add("wait_seconds", step, waited)
+        return waited
+
+    def until(self, step, condition, timeout=None):
+        """
+        Poll `condition(driver)` until it returns something truthy.
+
+        Returns:
+            The condition's return value
+
+        Raises:
+            TimeoutException: If the condition does not hold within the step timeout
+        """
+        started = time.perf_counter()
+        try:
+            result = WebDriverWait(
+                self.driver, self.timeout_for(step, timeout), poll_frequency=self.poll_frequency
+            ).until(condition)
+        except TimeoutException:
+            self._record(step, started, False)
+            raise
+        self._record(step, started, True)
+        return result
+
+    def element(self, step, by, selector, clickable=True, timeout=None):
+        """Wait for an element to be clickable (or just present) and return it."""
+        if clickable:
+            condition = EC.element_to_be_clickable((by, selector))
+        else:
+            condition = EC.presence_of_element_located((by, selector))
+        self.trace.add("selector_attempts", step)
+        try:
+            return self.until(step, condition, timeout)
+        except TimeoutException:
+            self.trace.add("selector_failures", step)
+            raise
+
+    def in_viewport(self, element, step="scroll_into_view", timeout=None):
+        """Wait until a scrolled-to element is actually inside the viewport."""
+        return self.until(
+            step, lambda d: d.execute_script(IN_VIEWPORT_JS, element), timeout
+        )
+
+    def value_equals(self, element, value, step="input_value", timeout=None):
+        """Wait until an input's value matches what was typed (or cleared)."""
+        expected = str(value)
+        return self.until(
+            step, lambda d: element.get_attribute("value") == expected, timeout
+        )
+
+    def staleness_of(self, element, step="results_update", timeout=None):
+        """Wait until an element has been detached, e.g. a result card replaced by a re-render."""
+        return self.until(step, EC.staleness_of(element), timeout)
+
+    def _async_signal(self, step, script, quiet_ms, timeout):
+        timeout = self.timeout_for(step, timeout)
+        started = time.perf_counter()
+        self.driver.set_script_timeout(timeout + 2)
+        try:
+            ok = bool(self.driver.execute_async_script(script, quiet_ms, int(timeout * 1000)))
+        except TimeoutException:
+            ok = False
+        waited = self._record(step, started, ok)
+        if not ok:
+            logger.info(f"Step '{step}' did not settle within {timeout}s (waited {waited:.2f}s)")
+        return ok
+
+    def dom_settled(self, step="dom_settled", quiet_ms=DOM_QUIET_MS, timeout=None):
+        """
+        Wait until the DOM has gone `quiet_ms` without a mutation.
+
+        Returns:
+            bool: True if it settled, False if the step timed out (never raises)
+        """
+        return self._async_signal(step, DOM_SETTLED_JS, quiet_ms, timeout)
+
+    def network_idle(self, step="network_idle", idle_ms=NETWORK_IDLE_MS, timeout=None):
+        """
+        Wait until no fetch/XHR is in flight and no resource has finished for `idle_ms`.
+
+        Returns:
+            bool: True if the network went idle, False if the step timed out (never raises)
+        """
+        return self._async_signal(step, NETWORK_IDLE_JS, idle_ms, timeout)
+
+    def page_ready(self, step="results_update", timeout=None):
+        """Network idle followed by a settled DOM: the page has finished reacting to an action."""
+        idle = self.network_idle(step, timeout=timeout)
+        settled = self.dom_settled(step, timeout=timeout)
+        return idle and settled
+
+    def report(self):
+        """
+        Summarise how long each step actually waited.
+
+        Returns:
+            dict: total_seconds plus per-step calls, timeouts, total and max seconds
+        """
+        steps = {}
+        for record in self.records:
+            entry = steps.setdefault(
+                record["step"], {"calls": 0, "timeouts": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            entry["calls"] += 1
+            entry["timeouts"] += 0 if record["ok"] else 1
+            entry["total_seconds"] += record["waited"]
+            entry["max_seconds"] = max(entry["max_seconds"], record["waited"])
+        for entry in steps.values():
+            entry["total_seconds"] = round(entry["total_seconds"], 3)
+            entry["max_seconds"] = round(entry["max_seconds"], 3)
+        return {
+            "total_seconds": round(sum(r["waited"] for r in self.records), 3),
+            "steps": steps
+        }
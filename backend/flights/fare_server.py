@@ -0,0 +1,181 @@
+from collections import deque
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import hashlib
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CARRIERS = ["BA", "AA", "VS", "DL", "UA", "IB", "AF", "KL"]
+
+def synthetic_fares(origin, destination, depart, return_date=None, adults=1, children=0, count=5):
+    """
+    Deterministic fare options for one date combination.
+
+    Prices depend on the route, the dates and the weekday (Friday and Sunday
+    departures cost more), so a calendar over them has a clear cheapest day.
+    """
+    seed = f"{origin}|{destination}|{depart}|{return_date or ''}"
+    depart_day = date.fromisoformat(depart)
+    weekday_factor = {4: 1.25, 6: 1.2, 1: 0.9, 2: 0.9}.get(depart_day.weekday(), 1.0)
+    passengers = adults + children * 0.75
+    options = []
+    for i in range(count):
+        digest = hashlib.sha1(f"{seed}|{i}".encode()).hexdigest()
+        base = 120 + int(digest[:4], 16) % 380
+        if return_date:
+            base *= 1.8
+        stops = int(digest[4], 16) % 3
+        price = round(base * weekday_factor * passengers * (1 - 0.08 * stops), 2)
+        departure_minutes = int(digest[5:8], 16) % (24 * 60)
+        duration = 420 + stops * 95 + int(digest[8:10], 16) % 60
+        options.append({
+            "price": price,
+            "carrier": CARRIERS[int(digest[10:12], 16) % len(CARRIERS)],
+            "flight_number": f"{100 + int(digest[12:15], 16) % 900}",
+            "stops": stops,
+            "departure_time": f"{departure_minutes // 60:02d}:{departure_minutes % 60:02d}",
+            "duration_minutes": duration
+        })
+    return options
+
+class _FareHandler(BaseHTTPRequestHandler):
+    server_version = "FareStandIn/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = urlparse(self.path)
+        if parts.path != "/fares":
+            self._send_json(404, {"error": "not found"})
+            return
+        fares = self.server.fares
+        if not fares.admit():
+            self._send_json(429, {"error": "rate limited"}, {"Retry-After": "1"})
+            return
+        try:
+            query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            with fares.in_flight():
+                if fares.latency:
+                    time.sleep(fares.latency)
+                options = synthetic_fares(
+                    query["origin"], query["destination"], query["depart"], query.get("return"),
+                    int(query.get("adults", 1)), int(query.get("children", 0))
+                )
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": f"bad query: {e}"})
+            return
+        self._send_json(200, {"currency": "USD", "options": options})
+
+class FareServer:
+    """
+    Local stand-in for a fare API, serving GET /fares with synthetic fares.
+
+    It simulates per-request latency and enforces its own requests-per-second
+    limit (answering 429 with Retry-After), and records the request count and
+    the peak number of concurrent requests, so concurrency and rate limiting
+    can be checked end to end.
+    """
+
+    def __init__(self, latency=0.05, max_requests_per_second=None, host="127.0.0.1", port=0):
+        """
+        Args:
+            latency (float): Seconds each fare request takes
+            max_requests_per_second (float, optional): Rate above which requests get 429
+            host (str), port (int): Bind address; port 0 picks a free port
+        """
+        self.latency = latency
+        self.max_requests_per_second = max_requests_per_second
+        self.requests = 0
+        self.rejected = 0
+        self.peak_concurrency = 0
+        self._active = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _FareHandler)
+        self._server.daemon_threads = True
+        self._server.fares = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self):
+        """Count a request and decide whether it is inside the rate limit."""
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            if self.max_requests_per_second is None:
+                return True
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.max_requests_per_second:
+                self.rejected += 1
+                return False
+            self._recent.append(now)
+            return True
+
+    class _InFlight:
+        def __init__(self, server):
+            self.server = server
+
+        def __enter__(self):
+            with self.server._lock:
+                self.server._active += 1
+                self.server.peak_concurrency = max(self.server.peak_concurrency, self.server._active)
+
+        def __exit__(self, exc_type, exc, tb):
+            with self.server._lock:
+                self.server._active -= 1
+            return False
+
+    def in_flight(self):
+        return self._InFlight(self)
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "rejected": self.rejected, "peak_concurrency": self.peak_concurrency}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Fare stand-in listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+if __name__ == "__main__":
+    with FareServer(port=8766) as server:
+        print(f"Serving fares at {server.base_url}/fares (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,421 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlparse
+from urllib.request import Request, urlopen
+import json
+import threading
+import time
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 4.0
+DEFAULT_FARE_TTL = 30 * 60  # seconds
+DEFAULT_CACHE_ENTRIES = 4096
+MAX_RETRIES = 3
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+class FlightQuery:
+    """
+    A flexible-date flight search.
+
+    Departure dates span depart_from..depart_to. Return trips try every stay
+    length from min_stay to max_stay nights after each departure.
+    """
+
+    def __init__(self, origin, destination, depart_from, depart_to=None, trip="oneway",
+                 min_stay=None, max_stay=None, adults=1, children=0, cabin="economy"):
+        """
+        Args:
+            origin, destination (str): IATA airport or city codes, e.g. "NYC", "LON"
+            depart_from (str or date): First departure date (YYYY-MM-DD)
+            depart_to (str or date, optional): Last departure date (defaults to depart_from)
+            trip (str): "oneway" or "return"
+            min_stay, max_stay (int, optional): Nights between departure and return for return trips
+            adults, children (int): Passengers
+            cabin (str): Cabin class
+        """
+        if trip not in ("oneway", "return"):
+            raise ValueError(f"trip must be 'oneway' or 'return', not {trip!r}")
+        self.origin = origin.strip().upper()
+        self.destination = destination.strip().upper()
+        self.depart_from = _as_date(depart_from)
+        self.depart_to = _as_date(depart_to) if depart_to else self.depart_from
+        if self.depart_to < self.depart_from:
+            raise ValueError("depart_to is before depart_from")
+        self.trip = trip
+        if trip == "return":
+            self.min_stay = int(min_stay if min_stay is not None else 1)
+            self.max_stay = int(max_stay if max_stay is not None else self.min_stay)
+            if self.min_stay < 0 or self.max_stay < self.min_stay:
+                raise ValueError("Stay must satisfy 0 <= min_stay <= max_stay")
+        else:
+            self.min_stay = self.max_stay = None
+        self.adults = int(adults)
+        self.children = int(children)
+        if self.adults < 1:
+            raise ValueError("At least one adult is required")
+        self.cabin = cabin
+
+    @property
+    def passengers(self):
+        return self.adults + self.children
+
+    def departure_dates(self):
+        days = (self.depart_to - self.depart_from).days
+        return [self.depart_from + timedelta(days=i) for i in range(days + 1)]
+
+    def return_dates(self):
+        if self.trip != "return":
+            return []
+        first = self.depart_from + timedelta(days=self.min_stay)
+        last = self.depart_to + timedelta(days=self.max_stay)
+        return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+    def date_combinations(self):
+        """
+        Every (depart, return) pair the search covers; return is None for one-way trips.
+
+        Returns:
+            list: (date, date or None) tuples
+        """
+        combinations = []
+        for depart in self.departure_dates():
+            if self.trip == "oneway":
+                combinations.append((depart, None))
+                continue
+            for stay in range(self.min_stay, self.max_stay + 1):
+                combinations.append((depart, depart + timedelta(days=stay)))
+        return combinations
+
+    def leg_key(self, depart, return_date):
+        """Cache key for one date combination of this query."""
+        return "|".join([
+            self.origin, self.destination, depart.isoformat(),
+            return_date.isoformat() if return_date else "",
+            str(self.adults), str(self.children), self.cabin
+        ])
+
+    def to_dict(self):
+        return {
+            "origin": self.origin,
+            "destination": self.destination,
+            "depart_from": self.depart_from.isoformat(),
+            "depart_to": self.depart_to.isoformat(),
+            "trip": self.trip,
+            "min_stay": self.min_stay,
+            "max_stay": self.max_stay,
+            "adults": self.adults,
+            "children": self.children,
+            "cabin": self.cabin
+        }
+
+class RateLimiter:
+    """Token bucket per host, shared by every worker thread."""
+
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=1):
+        self.rate = float(requests_per_second)
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def acquire(self, host):
+        """Block until a request to `host` is allowed. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, updated = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return waited
+                self._buckets[host] = (tokens, now)
+                delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class FareCache:
+    """In-memory LRU of fare lookups that expire after `ttl` seconds."""
+
+    def __init__(self, ttl=DEFAULT_FARE_TTL, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+class HttpFareSource:
+    """
+    Fetches fares for one date combination from a JSON fare endpoint.
+
+    Expects GET {base_url}/fares?origin=&destination=&depart=&return=&adults=&children=&cabin=
+    to answer {"currency": "...", "options": [{"price": ..., "carrier": ..., ...}]}.
+    429/503 responses are retried after their Retry-After delay.
+    """
+
+    def __init__(self, base_url, timeout=15):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    @property
+    def host(self):
+        return urlparse(self.base_url).netloc
+
+    def url_for(self, query, depart, return_date):
+        params = {
+            "origin": query.origin,
+            "destination": query.destination,
+            "depart": depart.isoformat(),
+            "adults": query.adults,
+            "children": query.children,
+            "cabin": query.cabin
+        }
+        if return_date:
+            params["return"] = return_date.isoformat()
+        return f"{self.base_url}/fares?{urlencode(params)}"
+
+    def fetch(self, query, depart, return_date, before_request=None):
+        """
+        Args:
+            before_request (callable, optional): Called before every HTTP attempt
+                (the search uses it for per-host rate limiting)
+
+        Returns:
+            list: Fare option dicts with at least price and currency
+        """
+        url = self.url_for(query, depart, return_date)
+        for attempt in range(MAX_RETRIES + 1):
+            if before_request:
+                before_request(self.host)
+            try:
+                with urlopen(Request(url, headers={"Accept": "application/json"}), timeout=self.timeout) as response:
+                    payload = json.loads(response.read().decode("utf-8"))
+                break
+            except HTTPError as e:
+                if e.code in (429, 503) and attempt < MAX_RETRIES:
+                    delay = float(e.headers.get("Retry-After") or 2 ** attempt)
+                    logger.info(f"{self.host} answered {e.code}, retrying in {delay}s")
+                    time.sleep(delay)
+                    continue
+                raise
+        currency = payload.get("currency")
+        options = []
+        for option in payload.get("options", []):
+            if option.get("price") is None:
+                continue
+            option = dict(option)
+            option["price"] = float(option["price"])
+            option.setdefault("currency", currency)
+            options.append(option)
+        return options
+
+class FlightSearch:
+    """
+    Fans a FlightQuery out over its date combinations on a bounded thread pool.
+
+    Every request goes through a per-host rate limiter, and results are cached
+    per date combination for `cache.ttl` seconds, so overlapping searches only
+    fetch the dates they have not seen recently.
+    """
+
+    def __init__(self, source, max_workers=DEFAULT_MAX_WORKERS,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND, cache=None):
+        """
+        Args:
+            source: Object with fetch(query, depart, return_date, before_request) -> options
+            max_workers (int): Concurrent requests in flight
+            requests_per_second (float): Per-host request rate (0 disables limiting)
+            cache (FareCache, optional): Shared fare cache (a private one if omitted)
+        """
+        self.source = source
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second)
+        self.cache = cache or FareCache()
+
+    def _lookup(self, query, depart, return_date):
+        key = query.leg_key(depart, return_date)
+        options = self.cache.get(key)
+        cached = options is not None
+        error = None
+        if not cached:
+            try:
+                options = self.source.fetch(query, depart, return_date, before_request=self.limiter.acquire)
+                self.cache.set(key, options)
+            except (HTTPError, URLError, OSError, ValueError) as e:
+                logger.warning(f"Fare lookup {key} failed: {e}")
+                options, error = [], str(e)
+        options = sorted(options, key=lambda o: o["price"])
+        return {
+            "depart": depart.isoformat(),
+            "return": return_date.isoformat() if return_date else None,
+            "cheapest": options[0] if options else None,
+            "options": options,
+            "cached": cached,
+            "error": error
+        }
+
+    def search(self, query):
+        """
+        Look up every date combination of the query.
+
+        Returns:
+            dict: query, per-combination results (sorted by date), the fare calendar,
+                the overall cheapest result and timing/cache stats
+        """
+        started = time.perf_counter()
+        combinations = query.date_combinations()
+        results = []
+        workers = max(1, min(self.max_workers, len(combinations)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fares") as executor:
+            futures = [executor.submit(self._lookup, query, depart, ret) for depart, ret in combinations]
+            for future in as_completed(futures):
+                results.append(future.result())
+        results.sort(key=lambda r: (r["depart"], r["return"] or ""))
+
+        priced = [r for r in results if r["cheapest"]]
+        cheapest = min(priced, key=lambda r: r["cheapest"]["price"]) if priced else None
+        return {
+            "query": query.to_dict(),
+            "results": results,
+            "calendar": fare_calendar(query, results),
+            "cheapest": cheapest,
+            "stats": {
+                "combinations": len(combinations),
+                "fetched": sum(1 for r in results if not r["cached"]),
+                "cached": sum(1 for r in results if r["cached"]),
+                "errors": sum(1 for r in results if r["error"]),
+                "workers": workers,
+                "seconds": round(time.perf_counter() - started, 3),
+                "cache": self.cache.stats()
+            }
+        }
+
+def fare_calendar(query, results):
+    """
+    Arrange results as a departure x return price matrix.
+
+    One-way searches have a single "return" column (None). cheapest_by_day maps
+    each departure date to its cheapest option across all return dates.
+
+    Returns:
+        dict: depart_dates, return_dates, prices (rows follow depart_dates, None
+            where no fare was found), currency and cheapest_by_day
+    """
+    depart_dates = [d.isoformat() for d in query.departure_dates()]
+    return_dates = [d.isoformat() for d in query.return_dates()] or [None]
+    row_index = {d: i for i, d in enumerate(depart_dates)}
+    column_index = {d: i for i, d in enumerate(return_dates)}
+    prices = [[None] * len(return_dates) for _ in depart_dates]
+    cheapest_by_day = {d: None for d in depart_dates}
+    currency = None
+
+    for result in results:
+        option = result["cheapest"]
+        if option is None:
+            continue
+        currency = currency or option.get("currency")
+        prices[row_index[result["depart"]]][column_index[result["return"]]] = option["price"]
+        best = cheapest_by_day[result["depart"]]
+        if best is None or option["price"] < best["price"]:
+            cheapest_by_day[result["depart"]] = dict(option, depart=result["depart"], **{"return": result["return"]})
+
+    return {
+        "depart_dates": depart_dates,
+        "return_dates": return_dates,
+        "prices": prices,
+        "currency": currency,
+        "cheapest_by_day": cheapest_by_day
+    }
+
+def print_calendar(calendar):
+    """Print the fare matrix with departures as rows."""
+    columns = calendar["return_dates"]
+    header = "depart \\ return" if columns != [None] else "depart"
+    print(f"{header:<16}" + "".join(f"{c[5:] if c else 'one-way':>9}" for c in columns))
+    for depart, row in zip(calendar["depart_dates"], calendar["prices"]):
+        cells = "".join(f"{price:>9.0f}" if price is not None else f"{'-':>9}" for price in row)
+        print(f"{depart:<16}{cells}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search flexible-date flight fares.")
+    parser.add_argument("origin")
+    parser.add_argument("destination")
+    parser.add_argument("depart_from")
+    parser.add_argument("depart_to", nargs="?")
+    parser.add_argument("--return-trip", action="store_true")
+    parser.add_argument("--min-stay", type=int, default=None)
+    parser.add_argument("--max-stay", type=int, default=None)
+    parser.add_argument("--adults", type=int, default=1)
+    parser.add_argument("--children", type=int, default=0)
+    parser.add_argument("--fare-api", default=None,
+                        help="Base URL of the fare endpoint (a local stand-in server is started if omitted)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_REQUESTS_PER_SECOND)
+    args = parser.parse_args()
+
+    flight_query = FlightQuery(
+        args.origin, args.destination, args.depart_from, args.depart_to,
+        trip="return" if args.return_trip else "oneway", min_stay=args.min_stay,
+        max_stay=args.max_stay, adults=args.adults, children=args.children
+    )
+
+    def run(base_url):
+        search = FlightSearch(HttpFareSource(base_url), max_workers=args.workers, requests_per_second=args.rate)
+        result = search.search(flight_query)
+        print_calendar(result["calendar"])
+        if result["cheapest"]:
+            best = result["cheapest"]
+            print(f"\nCheapest: {best['cheapest']['price']:.0f} {best['cheapest'].get('currency') or ''} "
+                  f"departing {best['depart']}" + (f", returning {best['return']}" if best["return"] else ""))
+        print(result["stats"])
+
+    if args.fare_api:
+        run(args.fare_api)
+    else:
+        from fare_server import FareServer
+        with FareServer() as server:
+            run(server.base_url)
@@ -0,0 +1,335 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+# The scraper modules import each other by plain module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "airbnb"))
+
+from stub_scraper import stub_listings
+from tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+# Service settings, overridable through the environment
+SCRAPER_BACKEND = os.getenv("SCRAPER_BACKEND", "selenium")  # "selenium" or "stub"
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "2"))
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "20"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+SCRAPE_TRACING = os.getenv("SCRAPE_TRACING", "1") != "0"
+SCRAPE_FAST_PATH = os.getenv("SCRAPE_FAST_PATH", "1") != "0"  # try plain HTTP before a browser
+PREFETCH_THUMBNAILS = os.getenv("PREFETCH_THUMBNAILS", "1") != "0"
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "/images")  # public URL of the /images route
+# Time budget per scrape; when it runs out the job finishes with the listings found so far
+SCRAPE_DEADLINE_SECONDS = float(os.getenv("SCRAPE_DEADLINE_SECONDS", "90")) or None
+SSE_KEEPALIVE_SECONDS = 15
+
+@asynccontextmanager
+async def lifespan(app):
+    global driver_pool
+    if SCRAPER_BACKEND != "stub":
+        from driver_pool import DriverPool
+        driver_pool = DriverPool(size=SCRAPE_CONCURRENCY, prelaunch=False)
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+    if driver_pool is not None:
+        driver_pool.close()
+
+app = FastAPI(title="AI Travel Agent API", lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"]
+)
+
+class ScrapeRequest(BaseModel):
+    destination: str
+    checkin: str
+    checkout: str
+    guests: int = 1
+    feature: Optional[str] = None
+    budget: Optional[int] = None
+    deadline_seconds: Optional[float] = None  # overrides SCRAPE_DEADLINE_SECONDS
+
+class Job:
+    """State of one scrape job, shared between its worker thread and the event loop."""
+
+    def __init__(self, job_id, request, loop):
+        self.id = job_id
+        self.request = request
+        self.status = "queued"
+        self.listings = []
+        self.metadata = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Wake every stream waiting on this job and arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, listing=None, **fields):
+        """Record progress from the worker thread and wake any streaming clients."""
+        def apply():
+            if listing is not None:
+                self.listings.append(listing)
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._notify()
+        self._loop.call_soon_threadsafe(apply)
+
+    async def wait_for_change(self, timeout):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def summary(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "request": self.request.dict(),
+            "listings_found": len(self.listings),
+            "metadata": self.metadata,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+jobs = {}
+executor = ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY, thread_name_prefix="scrape")
+scrape_slots = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+driver_pool = None
+
+def _pending_count():
+    return sum(1 for job in jobs.values() if not job.finished)
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for job_id in [j.id for j in jobs.values() if j.finished and j.finished_at < cutoff]:
+        del jobs[job_id]
+
+def _drain(listings, job, keep=None):
+    """
+    Publish every listing from a streaming scraper as it arrives.
+
+    Args:
+        keep (callable, optional): Only listings it accepts are published
+
+    Returns:
+        tuple: (metadata returned by the generator, list of all listings)
+    """
+    found = []
+    while True:
+        try:
+            listing = next(listings)
+        except StopIteration as stop:
+            return stop.value or {}, found
+        found.append(listing)
+        if keep is None or keep(listing):
+            job.publish(listing)
+
+def _run_scrape(job):
+    """Blocking scrape, run on the worker pool. Listings are published as they are found."""
+    params = job.request.dict()
+    budget = params.pop("budget")
+    deadline = params.pop("deadline_seconds") or SCRAPE_DEADLINE_SECONDS
+    if SCRAPER_BACKEND == "stub":
+        metadata, _ = _drain(stub_listings(**params), job, _budget_filter(params, budget))
+        return metadata
+
+    from scraper import iter_airbnb_listings
+    from scrape_cache import _has_listings, default_cache, search_key
+
+    # The budget is not part of the key: one unfiltered scrape serves every budget
+    cache = default_cache()
+    key = search_key(params["destination"], params["checkin"], params["checkout"],
+                     params["guests"], params["feature"])
+    keep = _budget_filter(params, budget)
+    streamed = False
+
+    def scrape():
+        # Stream from the site (plain HTTP first, then the browser); identical jobs
+        # submitted meanwhile wait on this flight instead of launching their own browser
+        nonlocal streamed
+        streamed = True
+        metadata, found = _drain(
+            iter_airbnb_listings(pool=driver_pool, tracing=SCRAPE_TRACING, fast_path=SCRAPE_FAST_PATH,
+                                 deadline=deadline, **params),
+            job, keep
+        )
+        metrics.record_trace(metadata.get("trace"))
+        if found and PREFETCH_THUMBNAILS:
+            # Rewrites the listing dicts in place, so /listings and later cache hits serve
+            # the cached copies (listings already streamed keep their CDN URLs)
+            from image_cache import prefetch_result
+            try:
+                prefetch_result({"metadata": metadata, "listings": found}, public_base=IMAGE_BASE_URL)
+            except Exception as e:
+                logger.warning(f"Thumbnail prefetch for job {job.id} failed: {e}")
+        return {"metadata": metadata, "listings": found}
+
+    # A partial result would hide the rest of the listings from every later request,
+    # so only complete ones are stored
+    result = cache.get_or_compute(key, scrape, should_store=_has_listings)
+    if not streamed:
+        # Cache hit, or another job's scrape that this one waited on
+        for listing in result["listings"]:
+            if keep is None or keep(listing):
+                job.publish(listing)
+    return result["metadata"]
+
+def _budget_filter(params, budget):
+    """Predicate keeping listings whose parsed nightly price is inside the budget window."""
+    if not budget:
+        return None
+    from prices import nights_between, parse_price
+    from search_query import budget_window
+
+    low, high = budget_window(budget)
+    nights = nights_between(params["checkin"], params["checkout"])
+
+    def keep(listing):
+        details = listing.get("price_details")
+        if not isinstance(details, dict):
+            details = listing["price_details"] = parse_price(listing.get("price_text"), nights)
+        return details["nightly"] is not None and low <= details["nightly"] <= high
+    return keep
+
+async def _execute(job):
+    async with scrape_slots:
+        job.publish(status="running", started_at=time.time())
+        loop = asyncio.get_running_loop()
+        try:
+            metadata = await loop.run_in_executor(executor, _run_scrape, job)
+            job.publish(status="done", metadata=metadata, finished_at=time.time())
+            metrics.inc("airbnb_scrapes_total", status="done")
+        except Exception as e:
+            logger.exception(f"Scrape job {job.id} failed")
+            metrics.inc("airbnb_scrapes_total", status="failed")
+            job.publish(status="failed", error=str(e), finished_at=time.time())
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "backend": SCRAPER_BACKEND}
+
+@app.post("/scrape", status_code=202)
+async def submit_scrape(request: ScrapeRequest):
+    """Queue a scrape job and return its id immediately."""
+    _prune_jobs()
+    if _pending_count() >= MAX_PENDING_JOBS:
+        raise HTTPException(status_code=429, detail="Too many scrape jobs queued, try again later")
+
+    job = Job(uuid.uuid4().hex, request, asyncio.get_running_loop())
+    jobs[job.id] = job
+    asyncio.create_task(_execute(job))
+    return {"job_id": job.id, "status": job.status}
+
+def _get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id).summary()
+
+@app.get("/jobs/{job_id}/listings")
+async def job_listings(job_id: str):
+    job = _get_job(job_id)
+    return {"job_id": job.id, "status": job.status, "metadata": job.metadata, "listings": job.listings}
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """Stream listings as Server-Sent Events while the job runs, then a final status event."""
+    job = _get_job(job_id)
+
+    async def events():
+        sent = 0
+        status = None
+        while True:
+            while sent < len(job.listings):
+                yield _sse("listing", job.listings[sent])
+                sent += 1
+            if job.status != status:
+                status = job.status
+                yield _sse("status", {"status": status, "listings_found": len(job.listings)})
+            if job.finished:
+                yield _sse("done", job.summary())
+                return
+            await job.wait_for_change(SSE_KEEPALIVE_SECONDS)
+            if sent == len(job.listings) and job.status == status:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/stats")
+async def stats():
+    counts = {}
+    for job in jobs.values():
+        counts[job.status] = counts.get(job.status, 0) + 1
+    result = {"jobs": counts, "concurrency": SCRAPE_CONCURRENCY, "max_pending": MAX_PENDING_JOBS}
+    if driver_pool is not None:
+        result["driver_pool"] = driver_pool.stats()
+        from scrape_cache import default_cache
+        result["cache"] = default_cache().stats()
+        from selector_registry import default_registry
+        result["selectors"] = default_registry().stats()
+        from http_fetch import path_stats
+        result["fetch_paths"] = path_stats.stats()
+        from resilience import default_breaker
+        result["circuit_breaker"] = default_breaker().stats()
+    return result
+
+@app.get("/images/{digest}")
+async def cached_image(digest: str, w: Optional[int] = None):
+    """A prefetched listing or feature image; w picks the smallest resized variant at least that wide."""
+    from image_cache import default_image_cache
+    found = default_image_cache().get(digest, w)
+    if found is None or not os.path.exists(found[0]):
+        raise HTTPException(status_code=404, detail="Image not cached")
+    path, content_type = found
+    # Content-addressed, so the bytes behind a URL never change
+    return FileResponse(path, media_type=content_type,
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/features")
+async def features():
+    """Feature categories with their images served from the image cache."""
+    from image_cache import prefetch_feature_images
+    return await asyncio.to_thread(prefetch_feature_images, public_base=IMAGE_BASE_URL)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Scrape phase histograms and selector/wait/listing counters in the Prometheus text format."""
+    return metrics.render()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+import unittest
+from contextlib import contextmanager
+
+from selenium.common.exceptions import NoSuchElementException
+
+# The scraper modules import each other by plain module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "airbnb"))
+
+from date_matrix import SearchSession
+from replay_server import synthetic_search_payload
+
+class FakeDriver:
+    """
+    Just enough of a Chrome WebDriver for SearchSession in URL-only mode.
+
+    Navigating to a stay listed in `payloads` appends a StaysSearch response to
+    the performance log; other stays load without one. The page has no listing
+    cards, so the DOM fallback finds nothing.
+    """
+
+    session_id = "fake"
+
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.log = []
+        self.bodies = {}
+        self.body_reads = 0
+        self.current_url = None
+
+    def _event(self, method, params):
+        self.log.append({"message": json.dumps({"message": {"method": method, "params": params}})})
+
+    def get(self, url):
+        self.current_url = url
+        for checkin, payload in self.payloads.items():
+            if f"checkin={checkin}" in url:
+                request_id = f"request-{len(self.bodies)}"
+                self.bodies[request_id] = json.dumps(payload)
+                self._event("Network.responseReceived", {
+                    "requestId": request_id,
+                    "response": {"url": "https://www.airbnb.com/api/v3/StaysSearch?operationName=StaysSearch"}
+                })
+                self._event("Network.loadingFinished", {"requestId": request_id, "encodedDataLength": 1000})
+
+    def get_log(self, kind):
+        entries, self.log = self.log, []
+        return entries
+
+    def execute_cdp_cmd(self, command, params):
+        if command == "Network.getResponseBody":
+            self.body_reads += 1
+            return {"body": self.bodies[params["requestId"]], "base64Encoded": False}
+        return {}
+
+    def execute_async_script(self, script, *args):
+        return True
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def find_element(self, by, selector):
+        raise NoSuchElementException(selector)
+
+class FakePool:
+    checkout_timeout = 0
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    @contextmanager
+    def driver(self, timeout=None):
+        yield self._driver
+
+def _search(checkin, checkout):
+    return {
+        "destination": "Lisbon",
+        "checkin": checkin,
+        "checkout": checkout,
+        "guests": 2,
+        "feature": None,
+        "budget": None
+    }
+
+class SearchSessionTest(unittest.TestCase):
+
+    def _session(self, driver):
+        session = SearchSession(FakePool(driver), wait_timeouts={"listing_cards": 0.2}, block_profile=None)
+        # Skip the first-search setup (popup, category discovery): every stay is a plain navigation
+        session._url_only = True
+        return session
+
+    def test_stay_without_search_response_gets_no_listings(self):
+        driver = FakeDriver({"2026-11-01": synthetic_search_payload("Lisbon", page_size=5, total=5)})
+        with self._session(driver) as session:
+            first, _ = session.search(_search("2026-11-01", "2026-11-03"))
+            second, _ = session.search(_search("2026-11-02", "2026-11-04"))
+        self.assertEqual(len(first), 5)
+        self.assertEqual(second, [])
+
+    def test_earlier_responses_are_not_read_again(self):
+        driver = FakeDriver({
+            "2026-11-01": synthetic_search_payload("Lisbon", page_size=5, total=5),
+            "2026-11-03": synthetic_search_payload("Porto", page_size=3, total=3)
+        })
+        with self._session(driver) as session:
+            counts = [len(session.search(_search(checkin, "2026-11-10"))[0])
+                      for checkin in ("2026-11-01", "2026-11-02", "2026-11-03")]
+        self.assertEqual(counts, [5, 0, 3])
+        self.assertEqual(driver.body_reads, 2)
+
+if __name__ == "__main__":
+    unittest.main()
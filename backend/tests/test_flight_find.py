@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+
+# The flight modules import each other by plain module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flights"))
+
+from fare_server import FareServer, synthetic_fares
+from flight_find import FlightQuery, FlightSearch, HttpFareSource
+
+SERVER_RATE = 10
+CLIENT_RATE = 8
+
+class FlightSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FareServer(latency=0.01, max_requests_per_second=SERVER_RATE)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.search = FlightSearch(HttpFareSource(self.server.base_url), requests_per_second=CLIENT_RATE)
+        # 3 departure days x 4 stay lengths = 12 date combinations
+        self.query = FlightQuery("NYC", "LON", "2026-11-02", "2026-11-04", trip="return", min_stay=2, max_stay=5)
+
+    def test_rate_limited_search_builds_calendar(self):
+        result = self.search.search(self.query)
+        stats = result["stats"]
+        self.assertEqual(stats["combinations"], 12)
+        self.assertEqual(stats["errors"], 0)
+        self.assertEqual(stats["fetched"], 12)
+        self.assertEqual(self.server.stats()["rejected"], 0)
+
+        calendar = result["calendar"]
+        self.assertEqual(calendar["depart_dates"], ["2026-11-02", "2026-11-03", "2026-11-04"])
+        self.assertEqual(calendar["return_dates"],
+                         ["2026-11-04", "2026-11-05", "2026-11-06", "2026-11-07", "2026-11-08", "2026-11-09"])
+        self.assertEqual(calendar["currency"], "USD")
+        for row, depart in zip(calendar["prices"], calendar["depart_dates"]):
+            self.assertEqual(len(row), len(calendar["return_dates"]))
+            self.assertEqual(sum(price is not None for price in row), 4, depart)
+
+        for depart, combinations in self._expected_cheapest().items():
+            best = calendar["cheapest_by_day"][depart]
+            self.assertEqual((best["price"], best["return"]), min(combinations))
+        self.assertEqual(result["cheapest"]["cheapest"]["price"],
+                         min(best["price"] for best in calendar["cheapest_by_day"].values()))
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.search.search(self.query)
+        requests = self.server.stats()["requests"]
+        stats = self.search.search(self.query)["stats"]
+        self.assertEqual((stats["fetched"], stats["cached"]), (0, 12))
+        self.assertEqual(self.server.stats()["requests"], requests)
+
+    def _expected_cheapest(self):
+        expected = {}
+        for depart, return_date in self.query.date_combinations():
+            options = synthetic_fares("NYC", "LON", depart.isoformat(), return_date.isoformat())
+            price = min(option["price"] for option in options)
+            expected.setdefault(depart.isoformat(), []).append((price, return_date.isoformat()))
+        return expected
+
+if __name__ == "__main__":
+    unittest.main()
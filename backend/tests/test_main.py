@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Serve jobs from the stub scraper: no Chrome, deterministic listings
+os.environ["SCRAPER_BACKEND"] = "stub"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+from prices import nights_between, parse_price
+from search_query import budget_window
+from stub_scraper import stub_listings
+
+SEARCH = {"destination": "Lisbon", "checkin": "2026-11-01", "checkout": "2026-11-04", "guests": 2}
+
+def _events(response):
+    """Parse a Server-Sent Events body into (event, data) pairs, skipping keepalives."""
+    events = []
+    event = None
+    for line in response.iter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+class ScrapeServiceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # One client for the module: leaving it runs the lifespan, which shuts the executor down
+        cls.client = TestClient(main.app)
+        cls.client.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+
+    def _submit(self, **fields):
+        response = self.client.post("/scrape", json=dict(SEARCH, **fields))
+        self.assertEqual(response.status_code, 202, response.text)
+        return response.json()["job_id"]
+
+    def _stream(self, job_id):
+        with self.client.stream("GET", f"/jobs/{job_id}/stream") as response:
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+            return _events(response)
+
+    def test_stream_sends_listings_then_done(self):
+        job_id = self._submit()
+        events = self._stream(job_id)
+        kinds = [event for event, _ in events]
+        self.assertEqual(kinds[-1], "done")
+        self.assertEqual(kinds.count("done"), 1)
+
+        listings = [data for event, data in events if event == "listing"]
+        self.assertEqual(len(listings), 20)
+        # Every listing arrives before the final summary
+        self.assertGreater(kinds.index("done"), max(i for i, kind in enumerate(kinds) if kind == "listing"))
+
+        summary = events[-1][1]
+        self.assertEqual(summary["job_id"], job_id)
+        self.assertEqual(summary["status"], "done")
+        self.assertEqual(summary["listings_found"], 20)
+        self.assertEqual(summary["metadata"]["total_listings"], 20)
+
+        stored = self.client.get(f"/jobs/{job_id}/listings").json()
+        self.assertEqual(stored["listings"], listings)
+
+    def test_budget_filters_streamed_listings(self):
+        budget = 150
+        low, high = budget_window(budget)
+        nights = nights_between(SEARCH["checkin"], SEARCH["checkout"])
+        expected = [listing["url"] for listing in stub_listings(delay=0, **SEARCH)
+                    if low <= parse_price(listing["price_text"], nights)["nightly"] <= high]
+        self.assertTrue(0 < len(expected) < 20)
+
+        events = self._stream(self._submit(budget=budget))
+        listings = [data for event, data in events if event == "listing"]
+        self.assertEqual([listing["url"] for listing in listings], expected)
+        for listing in listings:
+            self.assertTrue(low <= listing["price_details"]["nightly"] <= high)
+        self.assertEqual(events[-1][1]["listings_found"], len(expected))
+
+    def test_unknown_job_is_404(self):
+        for path in ("/jobs/missing", "/jobs/missing/listings", "/jobs/missing/stream"):
+            self.assertEqual(self.client.get(path).status_code, 404, path)
+
+    def test_full_queue_is_429(self):
+        with mock.patch.object(main, "MAX_PENDING_JOBS", 1):
+            job_id = self._submit()
+            response = self.client.post("/scrape", json=SEARCH)
+            self.assertEqual(response.status_code, 429)
+            # Once the queued job finishes there is room again
+            self._stream(job_id)
+            self._stream(self._submit())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# The scraper modules import each other by plain module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "airbnb"))
+
+from map_crawl import TileIndex, crawl_map
+from replay_server import ReplayServer
+
+MAP_TOTAL = 3000
+
+class CrawlMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ReplayServer(map_total=MAP_TOTAL)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        index_root = tempfile.TemporaryDirectory()
+        self.addCleanup(index_root.cleanup)
+        self.index_root = index_root.name
+
+    def _crawl(self):
+        return crawl_map("Replay", "2026-11-01", "2026-11-03", 2,
+                         base_url=self.server.base_url, index_root=self.index_root)
+
+    def _dense_bounds(self):
+        (name,) = os.listdir(self.index_root)
+        return {tuple(record["bounds"]) for record in TileIndex(os.path.join(self.index_root, name)).data["dense"]}
+
+    def test_first_crawl_splits_dense_tiles_and_finds_everything(self):
+        result = self._crawl()
+        metadata = result["metadata"]
+        self.assertEqual(metadata["total_listings"], MAP_TOTAL)
+        self.assertEqual(len(result["listings"]), MAP_TOTAL)
+        self.assertGreater(metadata["tiles_split"], 0)
+        self.assertFalse(metadata["reused_index"])
+        self.assertEqual(len(self._dense_bounds()), metadata["tiles_split"])
+
+    def test_rerun_reuses_index_and_keeps_dense_history(self):
+        self._crawl()
+        dense = self._dense_bounds()
+        metadata = self._crawl()["metadata"]
+        self.assertTrue(metadata["reused_index"])
+        self.assertEqual(metadata["total_listings"], MAP_TOTAL)
+        self.assertEqual(metadata["tiles_split"], 0)
+        self.assertEqual(self._dense_bounds(), dense)
+
+if __name__ == "__main__":
+    unittest.main()